@@ -0,0 +1,248 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+utils = lazy_import("utils")
+
+# dHash works on a 9x8 grayscale thumbnail: 8 horizontal gradients per row
+_DHASH_SIZE = 8
+# dHash sees luminance only, but skin tone is a colour measurement, so a near
+# match must also agree on the mean CIELAB colour of each cell of this grid
+_COLOR_GRID = 4
+
+
+def content_digest(image_bytes):
+    """Cheap exact key for an upload: BLAKE2b over the raw bytes."""
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def perceptual_hash(image_bytes):
+    """
+    (dhash, colours) for the image: a 64-bit difference hash, on which
+    re-encoded or slightly resized copies of the same photo land within a few
+    bits of each other, and a (16, 3) array of mean CIELAB colour per grid cell.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    # Only a thumbnail is needed, so let libjpeg decode at 1/8 scale
+    image.draft("RGB", (_DHASH_SIZE * 8, _DHASH_SIZE * 8))
+    image = image.convert("RGB")
+    pixels = np.asarray(image.convert("L").resize((_DHASH_SIZE + 1, _DHASH_SIZE), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    cells = np.asarray(image.resize((_COLOR_GRID, _COLOR_GRID), Image.BOX), dtype=np.float32)
+    return int(np.packbits(bits).view(">u8")[0]), utils.rgb_to_lab(cells).reshape(-1, 3)
+
+
+def cache_keys(image_bytes, use_phash=True):
+    """
+    The (digest, phash) pair an upload is cached under. phash is None when
+    use_phash is off or the image can't be decoded. A plain function, so it
+    can run in a process pool.
+    """
+    phash = None
+    if use_phash:
+        try:
+            phash = perceptual_hash(image_bytes)
+        except Exception:
+            # Undecodable uploads fall through to the analyzer, which reports the error
+            pass
+    return content_digest(image_bytes), phash
+
+
+def _hamming_distances(target, hashes):
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(target))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _max_delta_e(colours, other):
+    """Largest CIE76 colour difference between matching grid cells."""
+    return float(np.sqrt(((colours - other) ** 2).sum(axis=1)).max())
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache of analyze_skin_tone results.
+
+    Lookups try the exact byte digest first and then, when use_phash is on,
+    any stored image whose perceptual hash is within phash_distance bits and
+    whose grid colours are all within max_delta_e. Near matching is off by
+    default: a different face in the same scene can still pass.
+    Memory is bounded by an LRU of max_entries. With db_path set, exact
+    results are also kept in a SQLite file shared by every worker on the host.
+    Only successful analyses are cached.
+    """
+
+    def __init__(self, max_entries=256, use_phash=False, phash_distance=6, max_delta_e=3.0, db_path=None):
+        self.max_entries = max_entries
+        self.use_phash = use_phash
+        self.phash_distance = phash_distance
+        self.max_delta_e = max_delta_e
+        self.db_path = db_path or None
+        self._entries = OrderedDict()  # digest -> (phash, result)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._near_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        if self.db_path:
+            self._init_db()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("ANALYSIS_CACHE_SIZE", "256")),
+            use_phash=os.getenv("ANALYSIS_CACHE_PHASH", "0") == "1",
+            phash_distance=int(os.getenv("ANALYSIS_CACHE_PHASH_DISTANCE", "6")),
+            max_delta_e=float(os.getenv("ANALYSIS_CACHE_PHASH_MAX_DELTA_E", "3")),
+            db_path=os.getenv("ANALYSIS_CACHE_PATH") or None,
+        )
+
+    def keys_for(self, image_bytes):
+        """Returns the (digest, phash) pair used to look up and store image_bytes."""
+        return cache_keys(image_bytes, self.use_phash)
+
+    def analyze(self, image_bytes, analyze_fn):
+        """Returns the cached analysis for image_bytes, or runs analyze_fn(image_bytes) and stores it."""
+        start = time.perf_counter()
+        digest, phash = self.keys_for(image_bytes)
+
+        cached = self.get(digest, phash)
+        if cached is not None:
+            cached["timings"] = {"cache": round((time.perf_counter() - start) * 1000, 2)}
+            return cached
+
+        result = analyze_fn(image_bytes)
+        if result.get("success"):
+            self.put(digest, phash, result)
+        return result
+
+    def analyze_many(self, images, analyze_many_fn):
+        """
+        analyze() for a batch: cached images are answered from the cache, the
+        rest (each distinct image once) go to analyze_many_fn(list of bytes)
+        in one call, and its successful results are stored. Returns one
+        result per image, in order.
+        """
+        start = time.perf_counter()
+        results = [None] * len(images)
+        misses = {}
+        for index, image_bytes in enumerate(images):
+            digest, phash = self.keys_for(image_bytes)
+            if digest in misses:
+                misses[digest][2].append(index)
+                continue
+            cached = self.get(digest, phash)
+            if cached is not None:
+                cached["timings"] = {"cache": round((time.perf_counter() - start) * 1000, 2)}
+                results[index] = cached
+            else:
+                misses[digest] = (phash, image_bytes, [index])
+
+        analyzed = analyze_many_fn([image_bytes for _, image_bytes, _ in misses.values()]) if misses else []
+        for (digest, (phash, _, indices)), result in zip(misses.items(), analyzed):
+            if result.get("success"):
+                self.put(digest, phash, result)
+            for index in indices:
+                results[index] = result
+        return results
+
+    def get(self, digest, phash=None):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self._hits += 1
+                return dict(entry[1])
+
+            if phash is not None and self._entries:
+                digests = [d for d, (h, _) in self._entries.items() if h is not None]
+                if digests:
+                    distances = _hamming_distances(phash[0], [self._entries[d][0][0] for d in digests])
+                    for index in np.argsort(distances, kind="stable"):
+                        if distances[index] > self.phash_distance:
+                            break
+                        digest_near = digests[index]
+                        if _max_delta_e(phash[1], self._entries[digest_near][0][1]) <= self.max_delta_e:
+                            self._entries.move_to_end(digest_near)
+                            self._hits += 1
+                            self._near_hits += 1
+                            return dict(self._entries[digest_near][1])
+
+        if self.db_path:
+            result = self._load_from_disk(digest)
+            if result is not None:
+                with self._lock:
+                    self._store(digest, (phash, result))
+                    self._hits += 1
+                    self._disk_hits += 1
+                return dict(result)
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, digest, phash, result):
+        # Timings describe one particular run, so they aren't cached
+        result = {k: v for k, v in result.items() if k != "timings"}
+        with self._lock:
+            self._store(digest, (phash, result))
+        if self.db_path:
+            self._save_to_disk(digest, phash, result)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "near_duplicate_hits": self._near_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def _store(self, digest, entry):
+        self._entries[digest] = entry
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "digest TEXT PRIMARY KEY, phash TEXT, result TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _load_from_disk(self, digest):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT result FROM analyses WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row[0])
+        if "average_color" in result:
+            result["average_color"] = tuple(result["average_color"])
+        return result
+
+    def _save_to_disk(self, digest, phash, result):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (digest, phash, result, created_at) VALUES (?, ?, ?, ?)",
+                (digest, f"{phash[0]:016x}" if phash is not None else None, json.dumps(result), time.time()),
+            )
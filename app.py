@@ -1,336 +1,292 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context, g
 from werkzeug.utils import secure_filename
-from utils import analyze_skin_tone
 from groq_client import GroqService
+from groq_transport import LLMError
+from jobs import JobManager, QueueFullError
+from concurrent.futures.process import BrokenProcessPool
+from catalogue import CatalogueManager
+from analysis_cache import AnalysisCache
+from uploads import InMemoryRequest, read_upload
+from instrumentation import (HTTP_REQUEST_SECONDS, METRICS_CONTENT_TYPE, get_logger, observe_stages,
+                             process_memory, render_metrics, start_trace)
+from lazy import LazyObject, lazy_import
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import uuid
-import traceback
+import json
 
 load_dotenv()
 
+log = get_logger(__name__)
+
+# OpenCV, NumPy and the classifier load on the first analysis or in warm_up()
+utils = lazy_import('utils')
+
+def load_secret_key(path=None):
+    """
+    SECRET_KEY from the environment, else a random key kept in
+    instance/secret_key (SECRET_KEY_PATH) and created by whichever process
+    starts first, so every worker and every restart signs sessions alike.
+    """
+    key = os.getenv('SECRET_KEY')
+    if key:
+        return key
+    path = path or os.getenv('SECRET_KEY_PATH') or os.path.join(app.instance_path, 'secret_key')
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}"
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            f.write(os.urandom(32))
+        try:
+            # Linking fails if another worker got there first; its key wins
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path, 'rb') as f:
+        return f.read()
+
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
+# Uploads are parsed into memory and analyzed from there; nothing is written to disk
+app.request_class = InMemoryRequest
+app.secret_key = load_secret_key()
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
-
-# Create uploads folder if it doesn't exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png'}
+BATCH_MAX_IMAGES = int(os.getenv('BATCH_MAX_IMAGES', '50'))
+PRODUCTS_MAX_LIMIT = int(os.getenv('PRODUCTS_MAX_LIMIT', '50'))
+LIMIT_ERROR_MESSAGE = f'limit must be a whole number from 1 to {PRODUCTS_MAX_LIMIT}'
+MISSING_API_KEY_MESSAGE = 'Groq API Key is not configured. Please set GROQ_API_KEY in .env file.'
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-groq_service = GroqService()
+def parse_limit(value, default=5):
+    """A product query's ?limit= as an int in 1..PRODUCTS_MAX_LIMIT, or None if it isn't one."""
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        return None
+    return limit if 1 <= limit <= PRODUCTS_MAX_LIMIT else None
 
-def generate_product_recommendations(skin_tone, gender):
-    """Generate personalized product recommendations based on skin tone and gender"""
-    print(f"🛍️ Generating products for {gender} with {skin_tone} skin tone")
-    
-    # Product database with recommendations for different skin tones
-    products_db = {
-        'Fair': {
-            'Female': [
-                {
-                    'name': 'Royal Blue Shirt',
-                    'description': 'Perfect for Fair skin - enhances brightness',
-                    'shop_link': 'https://www.amazon.in/s?k=royal+blue+shirt+women'
-                },
-                {
-                    'name': 'Pearl White Blouse',
-                    'description': 'Classic and flattering shade',
-                    'shop_link': 'https://www.myntra.com/search?query=white+blouse+women'
-                },
-                {
-                    'name': 'Emerald Green Saree',
-                    'description': 'Rich color that complements Fair skin',
-                    'shop_link': 'https://www.amazon.in/s?k=emerald+green+saree'
-                },
-                {
-                    'name': 'Navy Blue Jumpsuit',
-                    'description': 'Versatile and elegant option',
-                    'shop_link': 'https://www.myntra.com/search?query=navy+jumpsuit+women'
-                },
-                {
-                    'name': 'Silver Jewelry Set',
-                    'description': 'Metal that complements Fair complexions',
-                    'shop_link': 'https://www.amazon.in/s?k=silver+jewelry+women'
-                }
-            ],
-            'Male': [
-                {
-                    'name': 'Royal Blue Formal Shirt',
-                    'description': 'Perfect for Fair skin - enhances complexion',
-                    'shop_link': 'https://www.amazon.in/s?k=royal+blue+formal+shirt+men'
-                },
-                {
-                    'name': 'Crisp White T-Shirt',
-                    'description': 'Clean and classic look',
-                    'shop_link': 'https://www.myntra.com/search?query=white+tshirt+men'
-                },
-                {
-                    'name': 'Charcoal Grey Blazer',
-                    'description': 'Sophisticated and flattering',
-                    'shop_link': 'https://www.amazon.in/s?k=charcoal+blazer+men'
-                },
-                {
-                    'name': 'Navy Blue Jeans',
-                    'description': 'Versatile wardrobe essential',
-                    'shop_link': 'https://www.myntra.com/search?query=navy+jeans+men'
-                },
-                {
-                    'name': 'Silver Watch',
-                    'description': 'Complements Fair skin tone',
-                    'shop_link': 'https://www.amazon.in/s?k=silver+watch+men'
-                }
-            ]
-        },
-        'Medium': {
-            'Female': [
-                {
-                    'name': 'Deep Purple Formal Dress',
-                    'description': 'Rich jewel tone for Medium skin',
-                    'shop_link': 'https://www.amazon.in/s?k=purple+formal+dress+women'
-                },
-                {
-                    'name': 'Terracotta Saree',
-                    'description': 'Warm color that enhances complexion',
-                    'shop_link': 'https://www.myntra.com/search?query=terracotta+saree+women'
-                },
-                {
-                    'name': 'Emerald Green Shirt',
-                    'description': 'Stunning color for Medium tones',
-                    'shop_link': 'https://www.amazon.in/s?k=emerald+green+shirt+women'
-                },
-                {
-                    'name': 'Burgundy Loafers',
-                    'description': 'Perfect footwear accessory',
-                    'shop_link': 'https://www.myntra.com/search?query=burgundy+loafers+women'
-                },
-                {
-                    'name': 'Gold Earrings',
-                    'description': 'Gold complements Medium skin beautifully',
-                    'shop_link': 'https://www.amazon.in/s?k=gold+earrings+women'
-                }
-            ],
-            'Male': [
-                {
-                    'name': 'Deep Maroon Shirt',
-                    'description': 'Sophisticated and flattering',
-                    'shop_link': 'https://www.amazon.in/s?k=maroon+shirt+men'
-                },
-                {
-                    'name': 'Olive Green Jacket',
-                    'description': 'Earthy tone perfect for Medium skin',
-                    'shop_link': 'https://www.myntra.com/search?query=olive+jacket+men'
-                },
-                {
-                    'name': 'Dark Blue Chinos',
-                    'description': 'Versatile and stylish',
-                    'shop_link': 'https://www.amazon.in/s?k=dark+blue+chinos+men'
-                },
-                {
-                    'name': 'Brown Leather Shoes',
-                    'description': 'Classic accessory',
-                    'shop_link': 'https://www.myntra.com/search?query=brown+leather+shoes+men'
-                },
-                {
-                    'name': 'Gold Chain Necklace',
-                    'description': 'Complements Medium complexion',
-                    'shop_link': 'https://www.amazon.in/s?k=gold+chain+men'
-                }
-            ]
-        },
-        'Olive': {
-            'Female': [
-                {
-                    'name': 'Mustard Yellow Kurta',
-                    'description': 'Warm tone that flatters Olive skin',
-                    'shop_link': 'https://www.amazon.in/s?k=mustard+kurta+women'
-                },
-                {
-                    'name': 'Forest Green Saree',
-                    'description': 'Rich jewel tone',
-                    'shop_link': 'https://www.myntra.com/search?query=forest+green+saree'
-                },
-                {
-                    'name': 'Rust Orange Top',
-                    'description': 'Earthy and stunning',
-                    'shop_link': 'https://www.amazon.in/s?k=rust+orange+top+women'
-                },
-                {
-                    'name': 'Black Chelsea Boots',
-                    'description': 'Classic and versatile',
-                    'shop_link': 'https://www.myntra.com/search?query=black+boots+women'
-                },
-                {
-                    'name': 'Copper Bracelet',
-                    'description': 'Metallic that glows on Olive skin',
-                    'shop_link': 'https://www.amazon.in/s?k=copper+bracelet+women'
-                }
-            ],
-            'Male': [
-                {
-                    'name': 'Olive Green T-Shirt',
-                    'description': 'Matches and enhances tone',
-                    'shop_link': 'https://www.amazon.in/s?k=olive+tshirt+men'
-                },
-                {
-                    'name': 'Mustard Yellow Shirt',
-                    'description': 'Warm and flattering',
-                    'shop_link': 'https://www.myntra.com/search?query=mustard+shirt+men'
-                },
-                {
-                    'name': 'Khaki Chinos',
-                    'description': 'Complements Olive perfectly',
-                    'shop_link': 'https://www.amazon.in/s?k=khaki+chinos+men'
-                },
-                {
-                    'name': 'Brown Suede Jacket',
-                    'description': 'Sophisticated and versatile',
-                    'shop_link': 'https://www.myntra.com/search?query=brown+suede+jacket+men'
-                },
-                {
-                    'name': 'Copper Ring',
-                    'description': 'Stands out beautifully',
-                    'shop_link': 'https://www.amazon.in/s?k=copper+ring+men'
-                }
-            ]
-        },
-        'Deep': {
-            'Female': [
-                {
-                    'name': 'Vibrant Red Saree',
-                    'description': 'Bold and stunning for Deep skin',
-                    'shop_link': 'https://www.amazon.in/s?k=red+saree+women'
-                },
-                {
-                    'name': 'Jewel Tone Purple Dress',
-                    'description': 'Rich and luxurious',
-                    'shop_link': 'https://www.myntra.com/search?query=purple+dress+women'
-                },
-                {
-                    'name': 'Bright Yellow Top',
-                    'description': 'Radiant and eye-catching',
-                    'shop_link': 'https://www.amazon.in/s?k=bright+yellow+top+women'
-                },
-                {
-                    'name': 'Gold Sandals',
-                    'description': 'Luxurious and glamorous',
-                    'shop_link': 'https://www.myntra.com/search?query=gold+sandals+women'
-                },
-                {
-                    'name': 'Gold Statement Necklace',
-                    'description': 'Shines beautifully on Deep skin',
-                    'shop_link': 'https://www.amazon.in/s?k=gold+necklace+women'
-                }
-            ],
-            'Male': [
-                {
-                    'name': 'Bright Blue Shirt',
-                    'description': 'Vibrant and flattering',
-                    'shop_link': 'https://www.amazon.in/s?k=bright+blue+shirt+men'
-                },
-                {
-                    'name': 'Red Kurta',
-                    'description': 'Bold traditional look',
-                    'shop_link': 'https://www.myntra.com/search?query=red+kurta+men'
-                },
-                {
-                    'name': 'Black Dress Pants',
-                    'description': 'Classic and elegant',
-                    'shop_link': 'https://www.amazon.in/s?k=black+dress+pants+men'
-                },
-                {
-                    'name': 'Gold Watch',
-                    'description': 'Luxury and elegance',
-                    'shop_link': 'https://www.myntra.com/search?query=gold+watch+men'
-                },
-                {
-                    'name': 'Vibrant Pocket Square',
-                    'description': 'Adds pop of color',
-                    'shop_link': 'https://www.amazon.in/s?k=pocket+square+men'
-                }
-            ]
-        }
-    }
-    
-    # Get products for the skin tone and gender, default to Medium if not found
-    skin_tone_key = skin_tone if skin_tone in products_db else 'Medium'
-    gender_key = gender if gender in products_db[skin_tone_key] else list(products_db[skin_tone_key].keys())[0]
-    
-    products = products_db[skin_tone_key][gender_key][:5]  # Return top 5 products
+def build_groq_service():
+    if os.getenv("STYLEAI_STUB_LLM"):
+        # Offline runs and load tests: answer from a local stub instead of Groq
+        from stub_llm import StubGroqClient
+        return GroqService(client=StubGroqClient(latency=float(os.getenv("STYLEAI_STUB_LLM_LATENCY", "0"))))
+    return GroqService()
+
+# Built on first use or by warm_up(), so the server can answer health checks
+# before the guide store, the Groq SDK and the product index are loaded
+groq_service = LazyObject(build_groq_service)
+product_catalogue = LazyObject(CatalogueManager.from_env)
+
+# What start_warm_up() loads ahead of traffic, in order; asgi.py adds its own
+WARM_UP_STEPS = [
+    ('detector', lambda: utils.warm_up_detectors()),
+    ('catalogue', lambda: product_catalogue.catalogue),
+    ('llm', lambda: groq_service.transport),
+]
+# Reported by /healthz: cold, warming, warm or failed
+warm_state = {'status': 'cold', 'steps': {}}
+_warm_up_lock = threading.Lock()
+
+def warm_up():
+    """Runs every warm-up step; returns {step: ms}. Steps already done are near free."""
+    start = time.perf_counter()
+    warm_state['status'] = 'warming'
+    try:
+        for name, load in WARM_UP_STEPS:
+            step_start = time.perf_counter()
+            load()
+            warm_state['steps'][name] = round((time.perf_counter() - step_start) * 1000, 1)
+    except Exception:
+        warm_state['status'] = 'failed'
+        raise
+    warm_state.update(status='warm', ms=round((time.perf_counter() - start) * 1000, 1))
+    log.info("warm_up_done", ms=warm_state['ms'], steps=warm_state['steps'])
+    return dict(warm_state['steps'])
+
+def _warm_up_in_background():
+    try:
+        warm_up()
+    except Exception as e:
+        # Whatever failed loads again on first use and reports its error there
+        log.error("warm_up_failed", exc_info=True, error=str(e))
+
+def start_warm_up(mode=None):
+    """
+    Warms up as WARM_UP says: 'background' (default) in a daemon thread, so
+    health checks answer at once; 'eager' before returning; 'lazy' not at
+    all, leaving each piece to its first request. Does nothing once warm-up
+    has started.
+    """
+    mode = mode or os.getenv('WARM_UP', 'background')
+    if mode not in ('background', 'eager', 'lazy'):
+        raise ValueError(f"WARM_UP must be background, eager or lazy, not {mode!r}")
+    if mode == 'lazy':
+        return
+    with _warm_up_lock:
+        if warm_state['status'] != 'cold':
+            return
+        warm_state['status'] = 'warming'
+    if mode == 'eager':
+        warm_up()
+    else:
+        threading.Thread(target=_warm_up_in_background, name='warm-up', daemon=True).start()
+
+def ensure_warm_up():
+    """
+    Starts a background warm-up on the first request when no entry point did,
+    e.g. under flask run or another WSGI server. Never blocks the request.
+    """
+    if warm_state['status'] == 'cold' and os.getenv('WARM_UP', 'background') != 'lazy':
+        start_warm_up('background')
+
+def generate_product_recommendations(skin_tone, gender, category=None, retailer=None, limit=5, guide=None):
+    """
+    Generate personalized product recommendations based on skin tone and gender.
+    With a style guide, the products match the items its shopping links name.
+    """
+    # With a guide and no filters, shop_the_look matches the items its links
+    # name and tops up from the plain lookup; otherwise the catalogue index is
+    # filtered directly. Both resolve unknown tones to Medium and unknown
+    # genders to the tone's first list (ProductCatalogue.resolve)
+    if guide and not category and not retailer:
+        products = product_catalogue.shop_the_look(guide, skin_tone, gender, limit)
+    else:
+        products = product_catalogue.lookup(skin_tone, gender, category, retailer, limit)
     
-    print(f"✅ Generated {len(products)} product recommendations")
+    log.debug("products_selected", skin_tone=skin_tone, gender=gender, products=len(products), from_guide=bool(guide))
     return products
 
+analysis_cache = AnalysisCache.from_env()
+job_manager = JobManager.from_env(groq_service, generate_product_recommendations, analysis_cache)
+
+def analyze_upload(file):
+    """Runs the skin tone analysis on an upload, reusing results for repeat images."""
+    result = analysis_cache.analyze(read_upload(file), utils.analyze_image_bytes)
+    observe_stages(result.get('timings'))
+    return result
+
+def analysis_error_payload(result):
+    """The 400 body for a failed analysis. Stage timings are internal; analyze_upload records them in /metrics."""
+    return {'success': False, 'message': result['message']}
+
+def analyze_on_cv_pool(sources):
+    """utils.analyze_batch on the job manager's CV pool, replacing it once if a worker died."""
+    pool = job_manager.cv_pool()
+    try:
+        return utils.analyze_batch(sources, workers=job_manager.cv_workers, pool=pool)
+    except BrokenProcessPool:
+        # Later batches and jobs need a working pool too
+        job_manager.replace_broken_cv_pool(pool)
+        return utils.analyze_batch(sources, workers=job_manager.cv_workers, pool=job_manager.cv_pool())
+
+@app.before_request
+def start_request_trace():
+    # Honour a proxy's request id so its logs and ours line up
+    g.trace_id = start_trace(request.headers.get('X-Request-ID'))
+    g.request_start = time.perf_counter()
+    ensure_warm_up()
+
+@app.after_request
+def record_request(response):
+    # Label by route pattern, not path, so /api/jobs/<job_id> stays one series
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    elapsed = time.perf_counter() - g.get('request_start', time.perf_counter())
+    HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=response.status_code)
+    log.info("request", method=request.method, route=route, status=response.status_code,
+             ms=round(elapsed * 1000, 1))
+    response.headers['X-Trace-Id'] = g.get('trace_id', '')
+    return response
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def validate_upload_request():
+    """
+    Checks the multipart upload shared by the analyze endpoints.
+    Returns (file, gender, None) or (None, None, error_response).
+    """
+    if 'file' not in request.files:
+        return None, None, (jsonify({'success': False, 'message': 'No file provided'}), 400)
+    
+    file = request.files['file']
+    gender = request.form.get('gender', 'Female')
+    
+    if file.filename == '':
+        return None, None, (jsonify({'success': False, 'message': 'No file selected'}), 400)
+    
+    if not allowed_file(file.filename):
+        log.info("upload_rejected", filename=file.filename, reason="file_type")
+        return None, None, (jsonify({'success': False, 'message': 'Invalid file type. Please upload JPG or PNG'}), 400)
+    
+    error = api_key_error()
+    if error:
+        return None, None, error
+    return file, gender, None
+
+def llm_configured():
+    """True if recommendations can be generated or served from the precomputed store."""
+    return bool(os.getenv("GROQ_API_KEY") or len(groq_service.store) or os.getenv("STYLEAI_STUB_LLM"))
+
+def api_key_error():
+    """Returns an error response if recommendations can't be generated, else None."""
+    # Check if API key is available from environment
+    # (not needed when every guide can be served from the precomputed store)
+    if not llm_configured():
+        log.error("groq_api_key_missing")
+        return jsonify({'success': False, 'message': MISSING_API_KEY_MESSAGE}), 400
+    return None
+
+def llm_error_response(error):
+    """JSON error response for a failed recommendation call."""
+    headers = {}
+    if error.retry_after is not None:
+        headers['Retry-After'] = str(max(1, int(round(error.retry_after))))
+    return jsonify({
+        'success': False,
+        'message': f'Error generating recommendations: {error.message}',
+        'error': error.to_dict()
+    }), error.http_status, headers
+
+def sse_event(event, data):
+    """Formats one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     try:
-        print("=" * 50)
-        print("🔍 Analyzing request...")
-        
-        if 'file' not in request.files:
-            print("❌ No file provided in request")
-            return jsonify({'success': False, 'message': 'No file provided'}), 400
-        
-        file = request.files['file']
-        gender = request.form.get('gender', 'Female')
-        
-        print(f"📸 File received: {file.filename}")
-        print(f"👥 Gender: {gender}")
-        
-        if file.filename == '':
-            print("❌ File has empty filename")
-            return jsonify({'success': False, 'message': 'No file selected'}), 400
-        
-        if not allowed_file(file.filename):
-            print(f"❌ Invalid file type: {file.filename}")
-            return jsonify({'success': False, 'message': 'Invalid file type. Please upload JPG or PNG'}), 400
-        
-        # Check if API key is available from environment
-        env_api_key = os.getenv("GROQ_API_KEY")
-        if not env_api_key:
-            print("❌ GROQ_API_KEY not found in .env")
-            return jsonify({'success': False, 'message': 'Groq API Key is not configured. Please set GROQ_API_KEY in .env file.'}), 400
-        
-        print("✅ API Key configured")
+        file, gender, error = validate_upload_request()
+        if error:
+            return error
         
         # Analyze skin tone
-        print("🔄 Starting skin tone analysis...")
-        analysis_result = analyze_skin_tone(file)
-        
-        print(f"Analysis result: {analysis_result}")
+        analysis_result = analyze_upload(file)
         
         if not analysis_result['success']:
-            print(f"❌ Analysis failed: {analysis_result['message']}")
-            return jsonify(analysis_result), 400
-        
-        print(f"✅ Skin tone detected: {analysis_result['skin_tone']}")
-        print(f"✅ Face shape detected: {analysis_result.get('face_shape', 'Oval')}")
+            return jsonify(analysis_error_payload(analysis_result)), 400
         
         # Get recommendations from Groq
         try:
-            print("🤖 Calling Groq API for recommendations...")
             recommendations = groq_service.get_fashion_recommendations(
                 analysis_result['skin_tone'],
                 gender,
                 analysis_result.get('face_shape', 'Oval')
             )
             
-            print("✅ Recommendations generated successfully")
-            
             # Generate product recommendations
-            print("🛍️ Generating product recommendations...")
             products = generate_product_recommendations(
                 analysis_result['skin_tone'],
-                gender
+                gender,
+                guide=recommendations
             )
             
             r, g, b = analysis_result['average_color']
@@ -344,20 +300,272 @@ def analyze():
                 'recommendations': recommendations,
                 'products': products
             })
+        except LLMError as e:
+            return llm_error_response(e)
         except Exception as e:
-            print(f"❌ Error calling Groq API: {str(e)}")
-            print(traceback.format_exc())
+            log.error("recommendations_failed", exc_info=True, error=str(e))
             return jsonify({
                 'success': False,
                 'message': f'Error generating recommendations: {str(e)}'
             }), 500
     
     except Exception as e:
-        print(f"❌ Server error: {str(e)}")
-        print(traceback.format_exc())
+        log.error("server_error", exc_info=True, error=str(e))
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """
+    Same as /api/analyze, but streams the response as server-sent events:
+    'analysis' and 'products' first, then 'chunk' events with the markdown as
+    the model writes it, then 'done' (or 'error').
+    """
+    try:
+        file, gender, error = validate_upload_request()
+        if error:
+            return error
+        
+        analysis_result = analyze_upload(file)
+        if not analysis_result['success']:
+            return jsonify(analysis_error_payload(analysis_result)), 400
+        
+        skin_tone = analysis_result['skin_tone']
+        face_shape = analysis_result.get('face_shape', 'Oval')
+        r, g, b = analysis_result['average_color']
+        products = generate_product_recommendations(skin_tone, gender)
+    except Exception as e:
+        log.error("server_error", exc_info=True, error=str(e))
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+    
+    def generate():
+        yield sse_event('analysis', {
+            'success': True,
+            'skin_tone': skin_tone,
+            'face_shape': face_shape,
+            'average_color': f'rgb({r},{g},{b})',
+            'gender': gender
+        })
+        yield sse_event('products', {'products': products})
+        parts = []
+        try:
+            for chunk in groq_service.stream_fashion_recommendations(skin_tone, gender, face_shape):
+                parts.append(chunk)
+                yield sse_event('chunk', {'text': chunk})
+        except LLMError as e:
+            yield sse_event('error', {'message': f'Error generating recommendations: {e.message}', 'error': e.to_dict()})
+            return
+        except Exception as e:
+            log.error("recommendations_stream_failed", exc_info=True, error=str(e))
+            yield sse_event('error', {'message': f'Error generating recommendations: {str(e)}'})
+            return
+        # Now that the guide is known, swap in products matching what it suggests
+        yield sse_event('products', {'products': generate_product_recommendations(skin_tone, gender, guide=''.join(parts))})
+        yield sse_event('done', {'success': True})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Stop proxies from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch_route():
+    """
+    Analyzes several uploads ('files') in parallel. 'gender' is given once for
+    the whole batch or once per file. Results come back in upload order; each
+    unique (skin_tone, gender, face_shape) profile gets one recommendation lookup.
+    """
+    try:
+        files = request.files.getlist('files')
+        if not files:
+            return jsonify({'success': False, 'message': 'No files provided'}), 400
+        if len(files) > BATCH_MAX_IMAGES:
+            return jsonify({'success': False, 'message': f'Too many files. The limit is {BATCH_MAX_IMAGES} per batch'}), 400
+        
+        genders = request.form.getlist('gender') or ['Female']
+        if len(genders) == 1:
+            genders = genders * len(files)
+        elif len(genders) != len(files):
+            return jsonify({'success': False, 'message': 'Provide one gender for the batch or one per file'}), 400
+        
+        error = api_key_error()
+        if error:
+            return error
+        
+        # Invalid files are reported in place; the rest go to the batch analyzer
+        results = [None] * len(files)
+        valid_indices = []
+        for index, file in enumerate(files):
+            if not allowed_file(file.filename):
+                results[index] = {'success': False, 'message': 'Invalid file type. Please upload JPG or PNG'}
+            else:
+                valid_indices.append(index)
+        # Repeat images come from the analysis cache; the rest share the job
+        # manager's pool, so concurrent batches queue for its workers instead
+        # of each forking their own
+        sources = [read_upload(files[index]) for index in valid_indices]
+        analyzed = analysis_cache.analyze_many(sources, analyze_on_cv_pool)
+        for index, result in zip(valid_indices, analyzed):
+            observe_stages(result.get('timings'))
+            results[index] = result
+        
+        profiles = []
+        profile_of = {}
+        for profile, indices in utils.group_by_profile(results, genders).items():
+            skin_tone, gender, face_shape = profile
+            entry = {
+                'skin_tone': skin_tone,
+                'gender': gender,
+                'face_shape': face_shape,
+                'images': indices
+            }
+            # One failed guide shouldn't fail the whole batch
+            try:
+                entry['recommendations'] = groq_service.get_fashion_recommendations(skin_tone, gender, face_shape)
+            except LLMError as e:
+                entry['recommendations'] = None
+                entry['error'] = e.to_dict()
+            entry['products'] = generate_product_recommendations(skin_tone, gender, guide=entry['recommendations'])
+            profiles.append(entry)
+            for index in indices:
+                profile_of[index] = len(profiles) - 1
+        log.info("batch_done", images=len(files), profiles=len(profiles))
+        
+        images = []
+        for index, (file, result) in enumerate(zip(files, results)):
+            image = {
+                'index': index,
+                'filename': file.filename,
+                'success': result['success'],
+                'gender': genders[index]
+            }
+            if result['success']:
+                r, g, b = result['average_color']
+                image.update({
+                    'skin_tone': result['skin_tone'],
+                    'face_shape': result.get('face_shape', 'Oval'),
+                    'average_color': f'rgb({r},{g},{b})',
+                    'profile': profile_of[index]
+                })
+            else:
+                image['message'] = result['message']
+            images.append(image)
+        
+        return jsonify({'success': True, 'images': images, 'profiles': profiles})
+    except Exception as e:
+        log.error("server_error", exc_info=True, error=str(e))
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
+@app.route('/api/products', methods=['GET'])
+def product_search():
+    """Catalogue lookup: ?skin_tone=&gender=&category=&retailer=&limit="""
+    skin_tone = request.args.get('skin_tone', 'Medium')
+    gender = request.args.get('gender', 'Female')
+    limit = parse_limit(request.args.get('limit'))
+    if limit is None:
+        return jsonify({'success': False, 'message': LIMIT_ERROR_MESSAGE}), 400
+    return jsonify({
+        'success': True,
+        'products': generate_product_recommendations(
+            skin_tone,
+            gender,
+            request.args.get('category'),
+            request.args.get('retailer'),
+            limit
+        )
+    })
+
+@app.route('/api/products/search', methods=['GET'])
+def product_similarity_search():
+    """Products similar to free text: ?q=&skin_tone=&gender=&limit= (profile optional)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'Provide a search query (q)'}), 400
+    limit = parse_limit(request.args.get('limit'))
+    if limit is None:
+        return jsonify({'success': False, 'message': LIMIT_ERROR_MESSAGE}), 400
+    return jsonify({
+        'success': True,
+        'query': query,
+        'products': product_catalogue.search(
+            query,
+            request.args.get('skin_tone'),
+            request.args.get('gender', 'Female'),
+            limit
+        )
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'success': True,
+        'analysis': analysis_cache.stats(),
+        'recommendations': groq_service.cache.stats(),
+        'llm': groq_service.transport.stats(),
+        'coalescing': groq_service.single_flight.stats(),
+        'tokens': dict(groq_service.tokens.stats(), prompt=groq_service.prompt.stats()),
+        'process': dict(pid=os.getpid(), **process_memory())
+    })
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness, answered without loading anything. With ?ready it is a
+    readiness check instead: 503 until warm-up has finished.
+    """
+    status = 503 if 'ready' in request.args and warm_state['status'] != 'warm' else 200
+    return jsonify({'status': 'ok' if status == 200 else 'starting', 'warm_up': warm_state['status']}), status
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Request, analysis stage and LLM latency histograms in the Prometheus text format."""
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Accepts an upload and returns at once with a job id. Poll
+    /api/jobs/<job_id> for progress and the same payload /api/analyze returns.
+    """
+    try:
+        file, gender, error = validate_upload_request()
+        if error:
+            return error
+        
+        job_id = job_manager.submit(read_upload(file), gender)
+        log.info("job_queued", job_id=job_id)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
+    except QueueFullError as e:
+        log.warning("job_queue_full", error=str(e))
+        return jsonify({'success': False, 'message': 'Server is busy. Please try again shortly.'}), 429, {'Retry-After': '5'}
+    except Exception as e:
+        log.error("server_error", exc_info=True, error=str(e))
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown or expired job'}), 404
+    return jsonify({
+        'success': job['status'] != 'failed',
+        'job_id': job_id,
+        'status': job['status'],
+        'progress': job['progress'],
+        'result': job['result'],
+        'message': job['error'],
+        'error': job.get('error_info')
+    })
 
 if __name__ == '__main__':
     print("🚀 Starting StyleAI Flask Server...")
     print(f"🔑 API Key configured: {bool(os.getenv('GROQ_API_KEY'))}")
+    # The debug reloader's parent process only watches files; warm up the one that serves
+    if os.environ.get('WERKZEUG_RUN_MAIN'):
+        start_warm_up()
     app.run(debug=True, host='127.0.0.1', port=5000)
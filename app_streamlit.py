@@ -1,12 +1,23 @@
-from utils import analyze_skin_tone
+import streamlit as st
 from groq_client import GroqService
+from groq_transport import LLMError
+from lazy import lazy_import
 import os
+import threading
 from dotenv import load_dotenv
-from PIL import Image
 from typing import List
 
 load_dotenv()
 
+# OpenCV and NumPy load in the background while the first visitor reads the
+# page, instead of before Streamlit can render anything
+utils = lazy_import("utils")
+
+@st.cache_resource
+def start_warm_up():
+    threading.Thread(target=utils.warm_up_detectors, name="warm-up", daemon=True).start()
+    return True
+
 st.set_page_config(
     page_title="Styling AI",
     page_icon="👗",
@@ -14,9 +25,16 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+start_warm_up()
+
 if 'groq_service' not in st.session_state:
     st.session_state.groq_service = GroqService()
 
+def show_upload(uploaded_file):
+    # PIL is only needed once a photo has been uploaded
+    from PIL import Image
+    st.image(Image.open(uploaded_file), caption='Uploaded Photo', use_container_width=True)
+
 def get_collage_images(gender: str) -> List[str]:
     if gender == "Male":
         return [
@@ -155,12 +173,11 @@ with col1:
     uploaded_file = st.file_uploader("Upload a clear facial photo...", type=["jpg", "jpeg", "png"])
     
     if uploaded_file is not None:
-        image = Image.open(uploaded_file)
-        st.image(image, caption='Uploaded Photo', use_container_width=True)
+        show_upload(uploaded_file)
         
         if st.button("Analyze & Style Me!"):
             with st.spinner("Analyzing skin tone..."):
-                analysis_result = analyze_skin_tone(uploaded_file)
+                analysis_result = utils.analyze_skin_tone(uploaded_file)
                 
                 if analysis_result['success']:
                     st.session_state.skin_tone = analysis_result['skin_tone']
@@ -175,11 +192,14 @@ with col1:
                     st.caption("Average Face Color")
                     
                     with st.spinner("Consulting AI Stylist (Llama 3.3)..."):
-                        recommendations = st.session_state.groq_service.get_fashion_recommendations(
-                            st.session_state.skin_tone,
-                            gender
-                        )
-                        st.session_state.recommendations = recommendations
+                        try:
+                            recommendations = st.session_state.groq_service.get_fashion_recommendations(
+                                st.session_state.skin_tone,
+                                gender
+                            )
+                            st.session_state.recommendations = recommendations
+                        except LLMError as e:
+                            st.error(f"Error generating recommendations: {e.message}")
                 else:
                     st.error(analysis_result['message'])
 
@@ -0,0 +1,415 @@
+"""
+ASGI entry point serving the same routes and templates as app.py without
+tying up a thread per request:
+
+    uvicorn asgi:app --host 127.0.0.1 --port 8000
+
+Recommendation calls go through AsyncGroqService, so one process can keep
+hundreds of them in flight. CV work runs in the job manager's process pool
+(JOB_CV_WORKERS, 0 for threads) so it never blocks the event loop. Caches,
+the precomputed store, the product catalogue and the job queue, CV pool
+included, are shared with app.py.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from starlette.templating import Jinja2Templates
+
+import app as flask_app
+from app import (
+    BATCH_MAX_IMAGES,
+    LIMIT_ERROR_MESSAGE,
+    MISSING_API_KEY_MESSAGE,
+    allowed_file,
+    analysis_cache,
+    analysis_error_payload,
+    generate_product_recommendations,
+    job_manager,
+    llm_configured,
+    parse_limit,
+    utils,
+    product_catalogue,
+    sse_event,
+)
+from analysis_cache import cache_keys
+from groq_client import AsyncGroqService
+from groq_transport import LLMError
+from instrumentation import (HTTP_REQUEST_SECONDS, METRICS_CONTENT_TYPE, get_logger, observe_stages,
+                             process_memory, render_metrics, start_trace)
+from jobs import QueueFullError
+from lazy import LazyObject
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_UPLOAD_BYTES = flask_app.app.config['MAX_CONTENT_LENGTH']
+
+log = get_logger(__name__)
+
+if os.getenv("STYLEAI_STUB_LLM"):
+    from stub_llm import AsyncStubGroqClient
+    llm_client = AsyncStubGroqClient(latency=float(os.getenv("STYLEAI_STUB_LLM_LATENCY", "0")))
+else:
+    llm_client = None
+# Same store and cache as the Flask app, so either server can warm them
+groq_service = LazyObject(lambda: AsyncGroqService(
+    cache=flask_app.groq_service.cache,
+    store=flask_app.groq_service.store,
+    client=llm_client,
+))
+flask_app.WARM_UP_STEPS.append(('async_llm', lambda: groq_service.transport))
+
+templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+# index.html uses Flask's url_for('static', filename=...) signature
+templates.env.globals["url_for"] = lambda endpoint, filename: f"/static/{filename}"
+
+@asynccontextmanager
+async def lifespan(_):
+    # Start the CV workers now rather than on the first upload
+    cv_pool = job_manager.cv_pool()
+    flask_app.start_warm_up()
+    log.info("asgi_ready", cv_pool=type(cv_pool).__name__, cv_workers=job_manager.cv_workers)
+    try:
+        yield
+    finally:
+        job_manager.shutdown(wait=True)
+
+async def run_cv(fn, *args):
+    """Awaits fn(*args) on the job manager's CV pool."""
+    return await asyncio.wrap_future(job_manager.submit_cv(fn, *args))
+
+async def analyze_upload(image_bytes):
+    """Runs the skin tone analysis in the CV pool, reusing results for repeat images."""
+    # Hashing decodes the image too; in a thread it would hold the GIL the event loop needs
+    digest, phash = await run_cv(cache_keys, image_bytes, analysis_cache.use_phash)
+    # With ANALYSIS_CACHE_PATH set, lookups and stores hit SQLite; keep them off the loop
+    cached = await run_in_threadpool(analysis_cache.get, digest, phash)
+    if cached is not None:
+        return cached
+    result = await run_cv(utils.analyze_image_bytes, image_bytes)
+    observe_stages(result.get("timings"))
+    if result["success"]:
+        await run_in_threadpool(analysis_cache.put, digest, phash, result)
+    return result
+
+def error_response(message, status):
+    return JSONResponse({'success': False, 'message': message}, status_code=status)
+
+def llm_error_response(error):
+    headers = {}
+    if error.retry_after is not None:
+        headers['Retry-After'] = str(max(1, int(round(error.retry_after))))
+    return JSONResponse({
+        'success': False,
+        'message': f'Error generating recommendations: {error.message}',
+        'error': error.to_dict()
+    }, status_code=error.http_status, headers=headers)
+
+async def read_form(request):
+    if int(request.headers.get('content-length') or 0) > MAX_UPLOAD_BYTES:
+        return None, error_response('File is too large', 413)
+    return await request.form(max_part_size=MAX_UPLOAD_BYTES), None
+
+async def validate_upload(request):
+    """Async counterpart of app.validate_upload_request: (image_bytes, gender, error_response)."""
+    form, error = await read_form(request)
+    if error:
+        return None, None, error
+    file = form.get('file')
+    gender = form.get('gender', 'Female')
+    if file is None or isinstance(file, str):
+        return None, None, error_response('No file provided', 400)
+    if not file.filename:
+        return None, None, error_response('No file selected', 400)
+    if not allowed_file(file.filename):
+        return None, None, error_response('Invalid file type. Please upload JPG or PNG', 400)
+    # The first call builds the Groq service and loads the precomputed store
+    if not await run_in_threadpool(llm_configured):
+        return None, None, error_response(MISSING_API_KEY_MESSAGE, 400)
+    return await file.read(), gender, None
+
+def analysis_payload(analysis_result, gender):
+    r, g, b = analysis_result['average_color']
+    return {
+        'success': True,
+        'skin_tone': analysis_result['skin_tone'],
+        'face_shape': analysis_result.get('face_shape', 'Oval'),
+        'average_color': f'rgb({r},{g},{b})',
+        'gender': gender
+    }
+
+async def index(request):
+    return templates.TemplateResponse(request, 'index.html')
+
+async def analyze(request):
+    try:
+        image_bytes, gender, error = await validate_upload(request)
+        if error:
+            return error
+        analysis_result = await analyze_upload(image_bytes)
+        if not analysis_result['success']:
+            return JSONResponse(analysis_error_payload(analysis_result), status_code=400)
+
+        payload = analysis_payload(analysis_result, gender)
+        try:
+            payload['recommendations'] = await groq_service.get_fashion_recommendations(
+                payload['skin_tone'], gender, payload['face_shape']
+            )
+        except LLMError as e:
+            return llm_error_response(e)
+        payload['products'] = await run_in_threadpool(generate_product_recommendations, payload['skin_tone'], gender,
+                                                      guide=payload['recommendations'])
+        return JSONResponse(payload)
+    except Exception as e:
+        log.error("server_error", exc_info=True, error=str(e))
+        return error_response(f'Server error: {str(e)}', 500)
+
+async def analyze_stream(request):
+    """Server-sent events, as /api/analyze/stream in app.py."""
+    try:
+        image_bytes, gender, error = await validate_upload(request)
+        if error:
+            return error
+        analysis_result = await analyze_upload(image_bytes)
+        if not analysis_result['success']:
+            return JSONResponse(analysis_error_payload(analysis_result), status_code=400)
+        payload = analysis_payload(analysis_result, gender)
+        products = await run_in_threadpool(generate_product_recommendations, payload['skin_tone'], gender)
+    except Exception as e:
+        log.error("server_error", exc_info=True, error=str(e))
+        return error_response(f'Server error: {str(e)}', 500)
+
+    async def generate():
+        yield sse_event('analysis', payload)
+        yield sse_event('products', {'products': products})
+        parts = []
+        try:
+            async for chunk in groq_service.stream_fashion_recommendations(
+                    payload['skin_tone'], gender, payload['face_shape']):
+                parts.append(chunk)
+                yield sse_event('chunk', {'text': chunk})
+        except LLMError as e:
+            yield sse_event('error', {'message': f'Error generating recommendations: {e.message}', 'error': e.to_dict()})
+            return
+        except Exception as e:
+            log.error("recommendations_stream_failed", exc_info=True, error=str(e))
+            yield sse_event('error', {'message': f'Error generating recommendations: {str(e)}'})
+            return
+        matched = await run_in_threadpool(generate_product_recommendations, payload['skin_tone'], gender,
+                                          guide=''.join(parts))
+        yield sse_event('products', {'products': matched})
+        yield sse_event('done', {'success': True})
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+async def profile_entry(profile, indices):
+    skin_tone, gender, face_shape = profile
+    entry = {
+        'skin_tone': skin_tone,
+        'gender': gender,
+        'face_shape': face_shape,
+        'images': indices
+    }
+    try:
+        entry['recommendations'] = await groq_service.get_fashion_recommendations(skin_tone, gender, face_shape)
+    except LLMError as e:
+        entry['recommendations'] = None
+        entry['error'] = e.to_dict()
+    entry['products'] = await run_in_threadpool(generate_product_recommendations, skin_tone, gender,
+                                                guide=entry['recommendations'])
+    return entry
+
+async def analyze_batch_route(request):
+    """Batch analysis, as /api/analyze/batch in app.py; profiles are fetched concurrently."""
+    try:
+        form, error = await read_form(request)
+        if error:
+            return error
+        files = [f for f in form.getlist('files') if not isinstance(f, str)]
+        if not files:
+            return error_response('No files provided', 400)
+        if len(files) > BATCH_MAX_IMAGES:
+            return error_response(f'Too many files. The limit is {BATCH_MAX_IMAGES} per batch', 400)
+
+        genders = form.getlist('gender') or ['Female']
+        if len(genders) == 1:
+            genders = genders * len(files)
+        elif len(genders) != len(files):
+            return error_response('Provide one gender for the batch or one per file', 400)
+        if not await run_in_threadpool(llm_configured):
+            return error_response(MISSING_API_KEY_MESSAGE, 400)
+
+        async def analyze_file(file):
+            if not allowed_file(file.filename):
+                return {'success': False, 'message': 'Invalid file type. Please upload JPG or PNG'}
+            return await analyze_upload(await file.read())
+
+        results = await asyncio.gather(*(analyze_file(file) for file in files))
+        grouped = utils.group_by_profile(results, genders)
+        profiles = await asyncio.gather(*(profile_entry(profile, indices) for profile, indices in grouped.items()))
+        profile_of = {index: number for number, entry in enumerate(profiles) for index in entry['images']}
+
+        images = []
+        for index, (file, result) in enumerate(zip(files, results)):
+            image = {'index': index, 'filename': file.filename, 'success': result['success'], 'gender': genders[index]}
+            if result['success']:
+                image.update(analysis_payload(result, genders[index]))
+                image['profile'] = profile_of[index]
+            else:
+                image['message'] = result['message']
+            images.append(image)
+        return JSONResponse({'success': True, 'images': images, 'profiles': profiles})
+    except Exception as e:
+        log.error("server_error", exc_info=True, error=str(e))
+        return error_response(f'Server error: {str(e)}', 500)
+
+async def product_search(request):
+    args = request.query_params
+    limit = parse_limit(args.get('limit'))
+    if limit is None:
+        return error_response(LIMIT_ERROR_MESSAGE, 400)
+    products = await run_in_threadpool(
+        generate_product_recommendations,
+        args.get('skin_tone', 'Medium'),
+        args.get('gender', 'Female'),
+        args.get('category'),
+        args.get('retailer'),
+        limit
+    )
+    return JSONResponse({'success': True, 'products': products})
+
+async def product_similarity_search(request):
+    args = request.query_params
+    query = args.get('q', '').strip()
+    if not query:
+        return error_response('Provide a search query (q)', 400)
+    limit = parse_limit(args.get('limit'))
+    if limit is None:
+        return error_response(LIMIT_ERROR_MESSAGE, 400)
+    products = await run_in_threadpool(product_catalogue.search, query, args.get('skin_tone'),
+                                       args.get('gender', 'Female'), limit)
+    return JSONResponse({'success': True, 'query': query, 'products': products})
+
+async def cache_stats(request):
+    return JSONResponse({
+        'success': True,
+        'analysis': analysis_cache.stats(),
+        'recommendations': groq_service.cache.stats(),
+        'llm': groq_service.transport.stats(),
+        'coalescing': groq_service.single_flight.stats(),
+        'tokens': dict(groq_service.tokens.stats(), prompt=groq_service.prompt.stats()),
+        'process': dict(pid=os.getpid(), **process_memory())
+    })
+
+async def healthz(request):
+    status = 503 if 'ready' in request.query_params and flask_app.warm_state['status'] != 'warm' else 200
+    return JSONResponse({'status': 'ok' if status == 200 else 'starting', 'warm_up': flask_app.warm_state['status']},
+                        status_code=status)
+
+async def metrics(request):
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+async def submit_job(request):
+    try:
+        image_bytes, gender, error = await validate_upload(request)
+        if error:
+            return error
+        job_id = await run_in_threadpool(job_manager.submit, image_bytes, gender)
+        return JSONResponse({'success': True, 'job_id': job_id, 'status_url': f'/api/jobs/{job_id}'}, status_code=202)
+    except QueueFullError as e:
+        log.warning("job_queue_full", error=str(e))
+        return JSONResponse({'success': False, 'message': 'Server is busy. Please try again shortly.'},
+                            status_code=429, headers={'Retry-After': '5'})
+    except Exception as e:
+        log.error("server_error", exc_info=True, error=str(e))
+        return error_response(f'Server error: {str(e)}', 500)
+
+async def job_status(request):
+    job_id = request.path_params['job_id']
+    job = job_manager.get(job_id)
+    if job is None:
+        return error_response('Unknown or expired job', 404)
+    return JSONResponse({
+        'success': job['status'] != 'failed',
+        'job_id': job_id,
+        'status': job['status'],
+        'progress': job['progress'],
+        'result': job['result'],
+        'message': job['error'],
+        'error': job.get('error_info')
+    })
+
+class RequestMetrics:
+    """
+    ASGI middleware counterpart of app.py's before/after_request hooks: sets
+    the trace id, returns it as X-Trace-Id and times each request until its
+    last body chunk is sent, so streams count in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Servers that skip the lifespan never started warm-up
+        flask_app.ensure_warm_up()
+        headers = dict(scope.get("headers") or [])
+        trace_id = start_trace(headers.get(b"x-request-id", b"").decode("latin-1") or None)
+        start = time.perf_counter()
+        status, finished = 500, False
+
+        async def send_with_metrics(message):
+            nonlocal status, finished
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode())]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+                self.record(scope, status, start)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        except BaseException:
+            if not finished:
+                self.record(scope, status, start)
+            raise
+
+    @staticmethod
+    def record(scope, status, start):
+        # Label by route pattern, not path, so /api/jobs/{job_id} stays one series
+        route = getattr(scope.get("route"), "path", "unmatched")
+        elapsed = time.perf_counter() - start
+        HTTP_REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=status)
+        log.info("request", method=scope["method"], route=route, status=status, ms=round(elapsed * 1000, 1))
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/analyze', analyze, methods=['POST']),
+        Route('/api/analyze/stream', analyze_stream, methods=['POST']),
+        Route('/api/analyze/batch', analyze_batch_route, methods=['POST']),
+        Route('/api/products', product_search, methods=['GET']),
+        Route('/api/products/search', product_similarity_search, methods=['GET']),
+        Route('/api/cache/stats', cache_stats, methods=['GET']),
+        Route('/healthz', healthz, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/api/jobs', submit_job, methods=['POST']),
+        Route('/api/jobs/{job_id}', job_status, methods=['GET']),
+        Mount('/static', StaticFiles(directory=os.path.join(BASE_DIR, 'static')), name='static'),
+    ],
+    middleware=[Middleware(RequestMetrics)],
+    lifespan=lifespan,
+)
@@ -0,0 +1,123 @@
+"""
+Analyzes a batch of photos from the command line.
+
+    python batch_analyze.py PATH [PATH ...] [--gender Female] [--workers N]
+                            [--recommend] [--output results.json]
+
+Each PATH can be an image, a directory of images, or a .zip/.tar(.gz) archive.
+Results are written as JSON in input order. With --recommend each unique
+(skin_tone, gender, face_shape) profile gets one style-guide lookup.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tarfile
+import zipfile
+
+from utils import analyze_batch, group_by_profile
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def collect_sources(paths):
+    """Expands paths into (name, source) pairs; source is a file path or raw bytes."""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                for name in sorted(files):
+                    if is_image_name(name):
+                        full_path = os.path.join(root, name)
+                        sources.append((full_path, full_path))
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and is_image_name(info.filename):
+                        sources.append((f"{path}:{info.filename}", archive.read(info)))
+        elif tarfile.is_tarfile(path):
+            with tarfile.open(path) as archive:
+                for member in archive.getmembers():
+                    if member.isfile() and is_image_name(member.name):
+                        sources.append((f"{path}:{member.name}", archive.extractfile(member).read()))
+        elif is_image_name(path):
+            sources.append((path, path))
+        else:
+            print(f"⚠️  Skipping {path}: not an image, directory or archive", file=sys.stderr)
+    return sources
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Images, directories or archives")
+    parser.add_argument("--gender", default="Female", choices=["Female", "Male", "Non-Binary"])
+    parser.add_argument("--workers", type=int, default=None, help="Analysis processes (default: CPU count)")
+    parser.add_argument("--recommend", action="store_true", help="Fetch one style guide per unique profile")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    sources = collect_sources(args.paths)
+    if not sources:
+        print("❌ No images found", file=sys.stderr)
+        return 1
+
+    # Progress output goes to stderr so stdout carries only the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = analyze_batch([source for _, source in sources], workers=args.workers)
+        profiles = group_by_profile(results, args.gender)
+
+        guides = {}
+        if args.recommend and profiles:
+            from groq_client import GroqService
+            from groq_transport import LLMError
+            service = GroqService()
+            for profile in profiles:
+                try:
+                    guides[profile] = {"recommendations": service.get_fashion_recommendations(*profile)}
+                except LLMError as e:
+                    guides[profile] = {"recommendations": None, "error": e.to_dict()}
+
+    images = []
+    for (name, _), result in zip(sources, results):
+        image = {"image": name, "success": result["success"]}
+        if result["success"]:
+            image.update({
+                "skin_tone": result["skin_tone"],
+                "face_shape": result.get("face_shape", "Oval"),
+                "average_color": [int(c) for c in result["average_color"]],
+            })
+        else:
+            image["message"] = result["message"]
+        images.append(image)
+
+    report = {
+        "images": images,
+        "profiles": [
+            {
+                "skin_tone": skin_tone,
+                "gender": gender,
+                "face_shape": face_shape,
+                "images": indices,
+                **(guides[(skin_tone, gender, face_shape)] if args.recommend else {}),
+            }
+            for (skin_tone, gender, face_shape), indices in profiles.items()
+        ],
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Wrote {len(images)} results ({len(profiles)} unique profiles) to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Benchmark scripts for the StyleAI analysis pipeline. Run them with `python -m benchmarks.<name>`."""
@@ -0,0 +1,72 @@
+"""
+Reports latency and detection rate for each face detector backend
+(haar, lbp, yunet) on the same image set, so FACE_DETECTOR can be chosen
+from data.
+
+    python -m benchmarks.bench_backends [--images DIR] [--backends haar,yunet] [--repeat N]
+
+Backends whose model file is missing (see LBP_CASCADE_PATH and
+YUNET_MODEL_PATH) are reported as unavailable and skipped. Detection rate
+is the share of images where at least one face was found, so the image set
+should contain one face per photo.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_detect import load_images, synthetic_images
+from utils import FACE_DETECTOR_BACKENDS, build_face_detector, locate_face
+
+def run_backend(detector, images, repeat):
+    latencies = []
+    found = 0
+    for _, image in images:
+        timings = []
+        box = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            box = locate_face(image, detector=detector)
+            timings.append(time.perf_counter() - start)
+        latencies.append(float(np.median(timings)) * 1000)
+        found += box is not None
+    return latencies, found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help='Directory of JPG/PNG images (default: synthetic set)')
+    parser.add_argument('--backends', default=','.join(FACE_DETECTOR_BACKENDS), help='Comma-separated backends to compare')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per image; the median is reported')
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else synthetic_images()
+    if not images:
+        print("No images found")
+        return
+
+    rows = []
+    for name in args.backends.split(','):
+        # No fallback: a missing model should show as unavailable, not as Haar's numbers
+        detector = build_face_detector(name.strip(), fallback=False)
+        try:
+            start = time.perf_counter()
+            detector.warm_up()
+            load_ms = (time.perf_counter() - start) * 1000
+        except (FileNotFoundError, cv2.error) as e:
+            rows.append((detector.name, None, str(e)))
+            continue
+        latencies, found = run_backend(detector, images, args.repeat)
+        rows.append((detector.name, (load_ms, latencies, found), None))
+
+    print(f"\n{'backend':<10}{'load ms':>10}{'median ms':>12}{'p90 ms':>10}{'detected':>12}")
+    for name, result, error in rows:
+        if result is None:
+            print(f"{name:<10}  unavailable: {error}")
+            continue
+        load_ms, latencies, found = result
+        print(f"{name:<10}{load_ms:>10.1f}{np.median(latencies):>12.1f}{np.percentile(latencies, 90):>10.1f}"
+              f"{f'{found}/{len(images)}':>12}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Compares the single-pass multi-scale face detector against the original
+four-sweep path on a fixed image set.
+
+    python -m benchmarks.bench_detect [--images DIR] [--repeat N]
+
+Without --images a deterministic synthetic set is generated, so runs are
+comparable across machines and commits.
+
+The single-pass detector stops at the first confident scale factor, so it
+finds the same largest face as the four-sweep path but its box can be a few
+pixels off (IoU 0.87-0.96 on the synthetic set). Two boxes count as the
+same face at IoU >= SAME_FACE_IOU; any image below that is reported.
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from benchmarks.corpus import draw_face
+from utils import box_iou_matrix, detector_registry, detect_faces_multiscale
+
+LEGACY_SCALE_FACTORS = [1.1, 1.15, 1.2, 1.3]
+SYNTHETIC_SIZES = [(640, 480), (1280, 960), (2016, 1512), (4032, 3024)]
+SAME_FACE_IOU = 0.8
+
+def legacy_four_sweep(gray, cascade):
+    """The detection path as it was before the single-pass engine."""
+    faces = []
+    for scale_factor in LEGACY_SCALE_FACTORS:
+        detected = cascade.detectMultiScale(gray, scale_factor, 5, minSize=(50, 50))
+        if len(detected) > 0:
+            faces.extend(detected)
+
+    unique_faces = []
+    for face in faces:
+        x1, y1, w1, h1 = face
+        if not any(abs(x1 - x2) < w1 / 2 and abs(y1 - y2) < h1 / 2 for x2, y2, _, _ in unique_faces):
+            unique_faces.append(face)
+    if not unique_faces:
+        return None
+    return tuple(int(v) for v in max(unique_faces, key=lambda rect: rect[2] * rect[3]))
+
+def single_pass(gray, cascade):
+    faces = detect_faces_multiscale(gray, cascade)
+    if len(faces) == 0:
+        return None
+    return tuple(int(v) for v in faces[0])
+
+def synthetic_images(seed=0):
+    """Draws a simple face-like pattern on a noisy background at several resolutions."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for width, height in SYNTHETIC_SIZES:
+        image = rng.integers(60, 200, size=(height, width, 3), dtype=np.uint8)
+        draw_face(image, (224, 180, 150))
+        images.append((f"synthetic_{width}x{height}", image))
+    return images
+
+def load_images(directory):
+    paths = sorted(
+        p for p in glob.glob(os.path.join(directory, '*'))
+        if p.lower().endswith(('.jpg', '.jpeg', '.png'))
+    )
+    return [(os.path.basename(p), np.array(Image.open(p).convert('RGB'))) for p in paths]
+
+def enhance(image_array):
+    gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
+    return cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+
+def box_agreement(a, b):
+    """IoU between the two chosen boxes; 1.0 when both paths found nothing."""
+    if a is None or b is None:
+        return 1.0 if a == b else 0.0
+    return float(box_iou_matrix([a, b])[0, 1])
+
+def time_call(fn, gray, cascade, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(gray, cascade)
+        timings.append(time.perf_counter() - start)
+    return result, float(np.median(timings)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help='Directory of JPG/PNG images (default: synthetic set)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per image; the median is reported')
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else synthetic_images()
+    cascade = detector_registry.get()
+
+    # Scale factors land on slightly different boxes, so agreement is reported as IoU
+    print(f"{'image':<28}{'legacy ms':>12}{'single ms':>12}{'speedup':>10}{'box IoU':>10}  same face")
+    legacy_total = single_total = 0.0
+    mismatches = []
+    for name, image in images:
+        gray = enhance(image)
+        legacy_box, legacy_ms = time_call(legacy_four_sweep, gray, cascade, args.repeat)
+        single_box, single_ms = time_call(single_pass, gray, cascade, args.repeat)
+        legacy_total += legacy_ms
+        single_total += single_ms
+        speedup = legacy_ms / single_ms if single_ms else float('inf')
+        iou = box_agreement(legacy_box, single_box)
+        same_face = iou >= SAME_FACE_IOU
+        if not same_face:
+            mismatches.append(name)
+        print(f"{name:<28}{legacy_ms:>12.1f}{single_ms:>12.1f}{speedup:>9.2f}x{iou:>10.2f}  {same_face}")
+
+    if images:
+        print(f"{'total':<28}{legacy_total:>12.1f}{single_total:>12.1f}{legacy_total / max(single_total, 1e-9):>9.2f}x")
+    if mismatches:
+        print(f"Different face (IoU < {SAME_FACE_IOU}): {', '.join(mismatches)}")
+
+if __name__ == '__main__':
+    main()
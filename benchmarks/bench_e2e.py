@@ -0,0 +1,136 @@
+"""
+End-to-end latency and throughput of POST /api/analyze, in process through
+the Flask test client, with the stub LLM standing in for Groq.
+
+    python -m benchmarks.bench_e2e [--concurrency 1,4,16] [--requests 32] [--llm-latency 0.5] [--json PATH]
+
+The analysis and recommendation caches and the precomputed store are
+turned off, so every request decodes, detects and classifies its image and
+asks the model for a guide. Requests cycle through the fixed corpus
+(benchmarks/corpus.py). Identical guides requested at the same time are
+still coalesced, as in production. Besides client-side throughput and
+latency, each level reports the server's mean time per stage from the
+/metrics histograms. benchmarks/load_test.py runs a similar test against
+real server processes.
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.corpus import face_corpus
+
+E2E_SIZES = ((640, 480), (1280, 960))
+
+def configure_app(llm_latency, workdir):
+    """Imports app with the caches off and the stub LLM on; must run before anything imports app."""
+    os.environ.update(
+        STYLEAI_STUB_LLM="1",
+        STYLEAI_STUB_LLM_LATENCY=str(llm_latency),
+        RECOMMENDATION_CACHE_SIZE="0",
+        RECOMMENDATION_CACHE_PATH="",
+        RECOMMENDATION_STORE_PATH=os.path.join(workdir, "no_guides.json"),
+        ANALYSIS_CACHE_SIZE="0",
+        ANALYSIS_CACHE_PATH="",
+    )
+    import app
+    return app
+
+def stage_means(before, after):
+    """Mean ms per observation between two histogram snapshots."""
+    means = {}
+    for stage, snapshot in after.items():
+        count = snapshot["count"] - before.get(stage, {"count": 0})["count"]
+        if count:
+            total = snapshot["sum"] - before.get(stage, {"sum": 0.0})["sum"]
+            means[stage] = round(total / count * 1000, 3)
+    return means
+
+def server_snapshot():
+    from instrumentation import LLM_SECONDS, STAGE_SECONDS
+    snapshot = {stage: STAGE_SECONDS.snapshot(stage=stage)
+                for stage in ("decode", "downscale", "grayscale", "clahe", "detect", "skin_color", "classify", "face_shape")}
+    snapshot["llm"] = LLM_SECONDS.snapshot(mode="complete", outcome="ok")
+    return snapshot
+
+def run_level(app_module, bodies, concurrency, total):
+    """Sends total requests from concurrency threads; returns one result row."""
+    latencies, errors = [], []
+
+    def send(index):
+        client = app_module.app.test_client()
+        jpeg, gender = bodies[index % len(bodies)]
+        start = time.perf_counter()
+        response = client.post('/api/analyze', data={'file': (io.BytesIO(jpeg), 'photo.jpg'), 'gender': gender},
+                               content_type='multipart/form-data')
+        latencies.append(time.perf_counter() - start)
+        # Corpus images without a detectable face answer 400 by design
+        if response.status_code not in (200, 400):
+            errors.append(response.status_code)
+
+    llm_calls = app_module.groq_service.transport.stats()["calls"]
+    before = server_snapshot()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": len(errors),
+        "llm_calls": app_module.groq_service.transport.stats()["calls"] - llm_calls,
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 1),
+        "server_mean_ms": stage_means(before, server_snapshot()),
+    }
+
+def run(levels=(1, 4, 16), requests=32, llm_latency=0.5, sizes=E2E_SIZES):
+    """Runs each concurrency level in turn; returns a JSON-ready dict."""
+    with tempfile.TemporaryDirectory() as workdir:
+        app_module = configure_app(llm_latency, workdir)
+        corpus = face_corpus(sizes=sizes)
+        genders = ("Female", "Male", "Non-Binary")
+        bodies = [(entry["jpeg"], genders[i % len(genders)]) for i, entry in enumerate(corpus)]
+        # Loads the detector and opens the HTTP pool before anything is timed
+        run_level(app_module, bodies, 1, 1)
+        rows = [run_level(app_module, bodies, level, max(requests, level)) for level in levels]
+    return {
+        "llm_latency": llm_latency,
+        "images": [entry["name"] for entry in corpus],
+        "levels": rows,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per level")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the stub LLM takes per call")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    from instrumentation import configure_logging
+    configure_logging(level="WARNING")
+    results = run([int(level) for level in args.concurrency.split(",")], args.requests, args.llm_latency)
+
+    print(f"Stub LLM latency {args.llm_latency:.2f}s per call, {len(results['images'])} corpus images")
+    print(f"{'clients':>8}{'requests':>10}{'errors':>8}{'LLM calls':>11}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in results["levels"]:
+        print(f"{row['concurrency']:>8}{row['requests']:>10}{row['errors']:>8}{row['llm_calls']:>11}"
+              f"{row['throughput_rps']:>9.2f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+        print("        server mean ms: " + ", ".join(f"{k}={v}" for k, v in row["server_mean_ms"].items()))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Reports the per-image cost of the face shape stage and the spread of shapes
+it assigns, next to the old bounding-box aspect-ratio rule.
+
+    python -m benchmarks.bench_face_shape [--images DIR] [--repeat N]
+
+Faces are detected once per image; only the shape stage is timed. Without
+--images a deterministic synthetic set of round to long faces is generated.
+"""
+import argparse
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_detect import load_images
+from utils import crop_face_roi, detect_face_shape, locate_face, measure_face_shape
+
+def synthetic_faces():
+    """Face-like ellipses from wider-than-long to much longer than wide."""
+    images = []
+    for half_w, half_h in [(130, 120), (120, 130), (110, 150), (105, 165), (95, 180)]:
+        image = np.full((600, 500, 3), 40, dtype=np.uint8)
+        cv2.ellipse(image, (250, 300), (half_w, half_h), 0, 0, 360, (224, 180, 150), -1)
+        eye_dx, eye_y, eye_r = half_w // 2, 300 - half_h // 4, half_w // 8
+        cv2.circle(image, (250 - eye_dx, eye_y), eye_r, (40, 30, 30), -1)
+        cv2.circle(image, (250 + eye_dx, eye_y), eye_r, (40, 30, 30), -1)
+        cv2.ellipse(image, (250, 300 + half_h // 2), (half_w // 3, half_h // 10), 0, 0, 180, (120, 50, 60), -1)
+        images.append((f"ellipse_{half_w}x{half_h}", image))
+    return images
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help='Directory of JPG/PNG images (default: synthetic set)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per image; the median is reported')
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else synthetic_faces()
+    rows = []
+    for name, image in images:
+        box = locate_face(image)
+        if box is None:
+            rows.append((name, None))
+            continue
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            shape, geometry = measure_face_shape(image, box)
+            timings.append(time.perf_counter() - start)
+        legacy = detect_face_shape(crop_face_roi(image, box))
+        rows.append((name, (float(np.median(timings)) * 1000, shape, geometry, legacy)))
+
+    print(f"\n{'image':<28}{'ms':>8}{'method':>11}{'shape':>9}{'box rule':>10}{'length/width':>14}")
+    shapes, legacy_shapes, costs = Counter(), Counter(), []
+    for name, row in rows:
+        if row is None:
+            print(f"{name:<28}  no face detected")
+            continue
+        ms, shape, geometry, legacy = row
+        costs.append(ms)
+        shapes[shape] += 1
+        legacy_shapes[legacy] += 1
+        print(f"{name:<28}{ms:>8.2f}{geometry['method']:>11}{shape:>9}{legacy:>10}"
+              f"{geometry.get('length_to_width', float('nan')):>14.2f}")
+
+    if costs:
+        print(f"\nmedian {np.median(costs):.2f} ms per image")
+        print(f"shapes:   {dict(shapes)}")
+        print(f"box rule: {dict(legacy_shapes)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Microbenchmarks for each stage of the analysis pipeline on the fixed
+corpus (benchmarks/corpus.py):
+
+- decode: JPEG bytes to an RGB array (load_image_array)
+- detect: downscale, CLAHE and the face detector (locate_face)
+- skin_color: skin colour of the face ROI (estimate_skin_color)
+- classify: palette match (classify_skin_tone_detailed)
+- face_shape: measure_face_shape
+- total: the whole analyze_image_bytes call
+
+    python -m benchmarks.bench_pipeline [--repeat N] [--sizes 640x480,1280x960] [--json PATH]
+
+Each stage runs once untimed and then repeat times; p50, p95 and mean are
+reported per image and over the whole corpus. Stages after detect are
+skipped for images where no face is found. The run fails if a JPEG at least
+twice INGEST_MAX_EDGE on its long side is decoded without DCT reduction.
+"""
+import argparse
+import io
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.corpus import CORPUS_SIZES, face_corpus
+from instrumentation import configure_logging
+from utils import (
+    INGEST_MAX_EDGE,
+    analyze_image_bytes,
+    classify_skin_tone_detailed,
+    crop_face_roi,
+    draft_jpeg,
+    estimate_skin_color,
+    load_image_array,
+    locate_face,
+    measure_face_shape,
+    warm_up_detectors,
+)
+
+STAGES = ("decode", "detect", "skin_color", "classify", "face_shape", "total")
+
+def time_ms(fn, repeat):
+    """Runs fn once to warm up, then repeat times; returns (result, [ms, ...])."""
+    result = fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, samples
+
+def summarize(samples):
+    if not samples:
+        return None
+    samples = np.asarray(samples)
+    return {
+        "runs": int(samples.size),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "mean_ms": round(float(samples.mean()), 3),
+    }
+
+def check_reduced_decode(entry):
+    """Raises if a JPEG big enough for a 1/2 DCT scale would still be decoded at full size."""
+    image = Image.open(io.BytesIO(entry["jpeg"]))
+    source = image.size
+    if max(source) >= 2 * INGEST_MAX_EDGE and draft_jpeg(image, INGEST_MAX_EDGE).size == source:
+        raise AssertionError(f"{entry['name']}: {source[0]}x{source[1]} JPEG decodes at full size")
+
+def bench_image(entry, repeat):
+    """Stage samples for one corpus entry: ({stage: [ms, ...]}, skin_tone or None)."""
+    jpeg = entry["jpeg"]
+    samples = {}
+    image, samples["decode"] = time_ms(lambda: load_image_array(io.BytesIO(jpeg)), repeat)
+    check_reduced_decode(entry)
+    box, samples["detect"] = time_ms(lambda: locate_face(image), repeat)
+    skin_tone = None
+    if box is not None:
+        roi = crop_face_roi(image, box)
+        (rgb, _), samples["skin_color"] = time_ms(lambda: estimate_skin_color(roi), repeat)
+        (skin_tone, _, _), samples["classify"] = time_ms(lambda: classify_skin_tone_detailed(rgb), repeat)
+        _, samples["face_shape"] = time_ms(lambda: measure_face_shape(image, box), repeat)
+    _, samples["total"] = time_ms(lambda: analyze_image_bytes(jpeg), repeat)
+    return samples, skin_tone
+
+def run(repeat=3, sizes=CORPUS_SIZES, seed=0):
+    """Benchmarks every corpus image; returns a JSON-ready dict."""
+    warm_up_detectors()
+    corpus = face_corpus(seed, sizes)
+    images, pooled = [], {stage: [] for stage in STAGES}
+    for entry in corpus:
+        samples, skin_tone = bench_image(entry, repeat)
+        for stage, values in samples.items():
+            pooled[stage] += values
+        images.append({
+            "name": entry["name"],
+            "size": entry["size"],
+            "tone": entry["tone"],
+            "jpeg_bytes": len(entry["jpeg"]),
+            "face_found": skin_tone is not None,
+            "skin_tone": skin_tone,
+            "stages": {stage: summarize(samples.get(stage)) for stage in STAGES},
+        })
+    return {
+        "repeat": repeat,
+        "seed": seed,
+        "images": images,
+        "stages": {stage: summarize(pooled[stage]) for stage in STAGES},
+    }
+
+def parse_sizes(text):
+    return tuple(tuple(int(v) for v in size.split("x")) for size in text.split(","))
+
+def print_report(results):
+    print(f"{'image':<20}{'face':>6}" + "".join(f"{stage:>12}" for stage in STAGES) + "   (p50 ms)")
+    for image in results["images"]:
+        cells = "".join(
+            f"{image['stages'][stage]['p50_ms']:>12.2f}" if image["stages"][stage] else f"{'-':>12}"
+            for stage in STAGES
+        )
+        print(f"{image['name']:<20}{image['skin_tone'] or 'none':>6}{cells}")
+    for key in ("p50_ms", "p95_ms"):
+        cells = "".join(
+            f"{results['stages'][stage][key]:>12.2f}" if results["stages"][stage] else f"{'-':>12}"
+            for stage in STAGES
+        )
+        print(f"{'all ' + key[:3]:<26}{cells}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage and image")
+    parser.add_argument("--sizes", type=parse_sizes, default=CORPUS_SIZES, help="Comma-separated WxH corpus sizes")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # Per-image INFO logs would be timed along with the pipeline
+    configure_logging(level="WARNING")
+    results = run(args.repeat, args.sizes)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Builds the product text index over a synthetic catalogue (100k items by
+default) and reports build time, on-disk size and lookup latency.
+
+    python -m benchmarks.bench_product_index [--items N] [--queries N] [--json FILE]
+
+The index is written to a temporary directory and memory-mapped, as it is
+with PRODUCT_INDEX_PATH set. Lookups are timed three ways: a free-text
+search across the whole catalogue, the same search within one
+(skin_tone, gender) profile, and shop_the_look() for a style guide naming
+six items.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from catalogue import ProductCatalogue
+from recommendation_store import GENDERS, SKIN_TONES
+
+COLORS = ["white", "black", "navy", "royal blue", "sky blue", "emerald", "olive", "mustard", "maroon", "burgundy",
+          "coral", "peach", "blush pink", "lavender", "charcoal", "grey", "beige", "camel", "rust", "teal",
+          "cobalt", "ivory", "cream", "gold", "silver", "khaki", "mint", "plum", "tan", "red"]
+FABRICS = ["linen", "cotton", "silk", "denim", "wool", "chiffon", "velvet", "satin", "leather", "suede",
+           "corduroy", "tweed", "jersey", "crepe", "khadi"]
+ITEMS = [("Tops", ["shirt", "t-shirt", "blouse", "polo", "tunic", "crop top", "sweater", "cardigan"]),
+         ("Bottoms", ["chinos", "jeans", "trousers", "skirt", "palazzo", "shorts", "joggers"]),
+         ("Dresses", ["maxi dress", "midi dress", "wrap dress", "saree", "lehenga", "jumpsuit"]),
+         ("Outerwear", ["blazer", "jacket", "trench coat", "bomber jacket", "overcoat", "nehru jacket"]),
+         ("Ethnic Wear", ["kurta", "sherwani", "anarkali", "dupatta", "bandhgala"]),
+         ("Footwear", ["loafers", "sneakers", "heels", "juttis", "oxfords", "sandals", "boots"]),
+         ("Accessories", ["watch", "earrings", "necklace", "belt", "sunglasses", "scarf", "tote bag"])]
+STYLES = ["slim fit", "relaxed", "classic", "tailored", "oversized", "printed", "embroidered", "pleated",
+          "striped", "solid", "textured", "cropped"]
+RETAILERS = ["Amazon.in", "Myntra", "Zara"]
+
+def synthetic_catalogue(count, seed=0):
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        category, items = rng.choice(ITEMS)
+        item, color, fabric, style = rng.choice(items), rng.choice(COLORS), rng.choice(FABRICS), rng.choice(STYLES)
+        tone = rng.choice(SKIN_TONES)
+        name = f"{style} {color} {fabric} {item}".title()
+        products.append({
+            "id": f"synthetic-{i}",
+            "skin_tone": tone,
+            "gender": rng.choice(GENDERS),
+            "category": category,
+            "retailer": rng.choice(RETAILERS),
+            "name": name,
+            "description": f"{rng.choice(['Flattering', 'Perfect', 'Great'])} for {tone} skin in {color}",
+            "shop_link": f"https://www.myntra.com/search?query={name.lower().replace(' ', '+')}",
+        })
+    return products
+
+def synthetic_guide(rng):
+    lines = []
+    for look in ("Casual", "Business/Formal", "Party"):
+        for _ in range(2):
+            _, items = rng.choice(ITEMS)
+            item = f"{rng.choice(COLORS)} {rng.choice(FABRICS)} {rng.choice(items)}".title()
+            lines.append(f"- *{look} Look:* [Search for {item} on Myntra](https://www.myntra.com/search?query=x)")
+    return "### 7. Shopping Guide\n" + "\n".join(lines)
+
+def percentiles(timings):
+    micros = np.array(timings) * 1e6
+    return {"p50_us": round(float(np.percentile(micros, 50)), 1), "p99_us": round(float(np.percentile(micros, 99)), 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100_000, help='Synthetic catalogue size')
+    parser.add_argument('--queries', type=int, default=2000, help='Lookups timed per mode')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    products = synthetic_catalogue(args.items)
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        catalogue = ProductCatalogue(products, index_path=index_dir)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        catalogue = ProductCatalogue(products, index_path=index_dir)
+        open_s = time.perf_counter() - start
+        size_mb = sum(os.path.getsize(os.path.join(index_dir, name)) for name in os.listdir(index_dir)) / 2 ** 20
+
+        queries = [f"{rng.choice(COLORS)} {rng.choice(FABRICS)} {rng.choice(rng.choice(ITEMS)[1])}"
+                   for _ in range(args.queries)]
+        profiles = [(rng.choice(SKIN_TONES), rng.choice(GENDERS)) for _ in range(args.queries)]
+        guides = [synthetic_guide(rng) for _ in range(args.queries // 10 or 1)]
+        index = catalogue.text_index
+        # Touch the pages once, as a long-running server would have
+        for query in queries[:50]:
+            index.search(query)
+
+        results = {"items": args.items, "build_s": round(build_s, 2), "open_s": round(open_s, 2),
+                   "index_mb": round(size_mb, 1)}
+        for mode, run in [
+            ("search_all", lambda i: index.search(queries[i], k=5)),
+            ("search_profile", lambda i: index.search(queries[i], *profiles[i], k=5)),
+            ("shop_the_look", lambda i: catalogue.shop_the_look(guides[i % len(guides)], *profiles[i])),
+        ]:
+            timings = []
+            for i in range(args.queries if mode != "shop_the_look" else len(guides)):
+                start = time.perf_counter()
+                run(i)
+                timings.append(time.perf_counter() - start)
+            results[mode] = percentiles(timings)
+
+        query, profile = queries[0], profiles[0]
+        top = [product["name"] for product in catalogue.search(query, *profile, limit=3)]
+
+    print(f"\n{args.items} items: built in {results['build_s']:.2f}s, reopened in {results['open_s']:.2f}s, "
+          f"{results['index_mb']:.1f} MB on disk")
+    print(f"{'lookup':<16}{'p50 us':>10}{'p99 us':>10}")
+    for mode in ("search_all", "search_profile", "shop_the_look"):
+        print(f"{mode:<16}{results[mode]['p50_us']:>10.1f}{results[mode]['p99_us']:>10.1f}")
+    print(f"\nexample: {query!r} for {profile[0]}/{profile[1]} -> {top}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
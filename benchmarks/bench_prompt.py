@@ -0,0 +1,39 @@
+"""
+Compares the full and compact prompts: static prefix size, per-request
+tokens, the completion budget and the cost of building the messages.
+
+    python -m benchmarks.bench_prompt [--repeat N]
+
+Token counts are estimates (about 4 characters per token); the live numbers
+the API reports are under "tokens" in /api/cache/stats.
+"""
+import argparse
+import time
+
+from prompts import PROMPT_MODES, PromptTemplate, estimate_tokens
+from recommendation_store import all_profiles
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200, help='Passes over all profiles when timing')
+    args = parser.parse_args()
+
+    profiles = all_profiles()
+    print(f"\n{'mode':<9}{'sections':>9}{'prefix tok':>12}{'profile tok':>13}{'max_tokens':>12}{'build us':>10}")
+    for mode in PROMPT_MODES:
+        template = PromptTemplate(mode)
+        prefixes = {template.messages(*profile)[0]["content"] for profile in profiles}
+        assert len(prefixes) == 1, "system prompt must not vary between profiles"
+        profile_tokens = max(estimate_tokens(template.messages(*profile)[1]["content"]) for profile in profiles)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for profile in profiles:
+                template.messages(*profile)
+        build_us = (time.perf_counter() - start) / (args.repeat * len(profiles)) * 1e6
+
+        print(f"{mode:<9}{len(template.sections):>9}{template.prefix_tokens:>12}{profile_tokens:>13}"
+              f"{template.max_tokens:>12}{build_us:>10.2f}")
+
+if __name__ == '__main__':
+    main()
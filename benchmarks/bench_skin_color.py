@@ -0,0 +1,105 @@
+"""
+Compares skin colour estimators (plain ROI mean vs. skin-masked median,
+trimmed mean and k-means) for latency and label stability.
+
+    python -m benchmarks.bench_skin_color [--images DIR] [--repeat N]
+
+Each face ROI is perturbed the way real photos of the same person differ:
+hair over the forehead, glasses, background at the edges, lipstick and a
+brightness shift. Stability is the share of perturbed ROIs that keep the
+label of the clean ROI; drift is the mean ΔE between their colours.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_detect import load_images
+from utils import (
+    DEFAULT_SKIN_PALETTE,
+    SKIN_COLOR_METHODS,
+    classify_skin_tone_detailed,
+    detect_face,
+    estimate_skin_color,
+    rgb_to_lab,
+)
+
+ROI_SIZE = 320
+
+def synthetic_rois(seed=0):
+    """Shaded, noisy skin patches for every palette tone."""
+    rng = np.random.default_rng(seed)
+    shading = np.linspace(0.85, 1.1, ROI_SIZE, dtype=np.float32)[None, :, None]
+    rois = []
+    for tone, rgb in DEFAULT_SKIN_PALETTE.items():
+        base = np.array(rgb, dtype=np.float32)[None, None, :] * shading
+        noise = rng.normal(0, 6, size=(ROI_SIZE, ROI_SIZE, 3))
+        rois.append((f"synthetic_{tone.lower()}", np.clip(base + noise, 0, 255).astype(np.uint8)))
+    return rois
+
+def perturbations(roi, seed=0):
+    rng = np.random.default_rng(seed)
+    h, w = roi.shape[:2]
+    variants = []
+
+    hair = roi.copy()
+    hair[: h // 4] = (45, 32, 25)
+    variants.append(hair)
+
+    glasses = roi.copy()
+    eye_y, eye_h = int(h * 0.35), max(2, h // 8)
+    cv2.rectangle(glasses, (int(w * 0.15), eye_y), (int(w * 0.45), eye_y + eye_h), (20, 20, 20), -1)
+    cv2.rectangle(glasses, (int(w * 0.55), eye_y), (int(w * 0.85), eye_y + eye_h), (20, 20, 20), -1)
+    variants.append(glasses)
+
+    background = roi.copy()
+    edge = max(1, w // 8)
+    background[:, :edge] = rng.integers(0, 255, size=(h, edge, 3))
+    background[:, -edge:] = rng.integers(0, 255, size=(h, edge, 3))
+    variants.append(background)
+
+    lips = roi.copy()
+    cv2.ellipse(lips, (w // 2, int(h * 0.8)), (w // 5, h // 14), 0, 0, 360, (170, 40, 60), -1)
+    variants.append(lips)
+
+    for factor in (0.9, 1.1):
+        variants.append(np.clip(roi.astype(np.float32) * factor, 0, 255).astype(np.uint8))
+    return variants
+
+def time_estimate(roi, method, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        estimate_skin_color(roi, method)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help='Directory of face photos (default: synthetic skin patches)')
+    parser.add_argument('--repeat', type=int, default=20, help='Timing runs per ROI; the median is reported')
+    args = parser.parse_args()
+
+    if args.images:
+        rois = [(name, detect_face(image)) for name, image in load_images(args.images)]
+        rois = [(name, roi) for name, roi in rois if roi is not None and roi.size]
+    else:
+        rois = synthetic_rois()
+
+    print(f"{'method':<10}{'latency ms':>12}{'stable':>10}{'ΔE drift':>10}")
+    for method in SKIN_COLOR_METHODS:
+        latencies, stable, total, drift = [], 0, 0, []
+        for index, (_, roi) in enumerate(rois):
+            latencies.append(time_estimate(roi, method, args.repeat))
+            clean_rgb, _ = estimate_skin_color(roi, method)
+            clean_tone = classify_skin_tone_detailed(clean_rgb)[0]
+            for variant in perturbations(roi, seed=index):
+                rgb, _ = estimate_skin_color(variant, method)
+                stable += classify_skin_tone_detailed(rgb)[0] == clean_tone
+                total += 1
+                drift.append(float(np.linalg.norm(rgb_to_lab(rgb) - rgb_to_lab(clean_rgb))))
+        print(f"{method:<10}{np.median(latencies):>12.2f}{stable / max(total, 1):>10.0%}{np.mean(drift):>10.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Cold start: how long importing the app takes, what it imports, how soon
+/healthz answers and what warm-up then costs. Every run is a fresh
+interpreter, so nothing is cached in sys.modules.
+
+    python -m benchmarks.bench_startup [--module app] [--repeat 5] [--top 15] [--json PATH]
+
+The import profile comes from python -X importtime: the entry module's
+direct imports by cumulative time (each includes what it imports in turn).
+Heavy modules (cv2, numpy, PIL, groq, httpx) should not load at import;
+warm_up() loads them.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("cv2", "numpy", "PIL.Image", "groq", "httpx", "utils")
+
+# Runs in the child; prints one JSON line
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+import_ms = (time.perf_counter() - start) * 1000
+import app
+loaded = [name for name in {heavy!r} if name in sys.modules]
+client = app.app.test_client()
+start = time.perf_counter()
+status = client.get('/healthz').status_code
+healthz_ms = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+steps = app.warm_up()
+warm_up_ms = (time.perf_counter() - start) * 1000
+print(json.dumps(dict(import_ms=import_ms, loaded_at_import=loaded, healthz_status=status,
+                      healthz_ms=healthz_ms, warm_up_ms=warm_up_ms, warm_up_steps=steps)))
+"""
+
+def child_env():
+    # Startup logs would land in the output we parse
+    return dict(os.environ, LOG_LEVEL="WARNING", WARM_UP="lazy")
+
+def run_once(module):
+    code = CHILD.format(module=module, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, env=child_env(),
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def import_profile(module, top):
+    """module's total import ms and its slowest direct imports, as [{module, cumulative_ms, self_ms}]."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BASE_DIR,
+                            env=child_env(), capture_output=True, text=True, check=True).stderr
+    children, direct, total_ms = [], [], None
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        row = {"module": name.strip(), "cumulative_ms": round(int(cumulative_us) / 1000, 1),
+               "self_ms": round(int(self_us) / 1000, 1)}
+        # A module's imports are listed before it, one level deeper
+        if depth == 1:
+            children.append(row)
+        elif depth == 0:
+            if row["module"] == module:
+                direct, total_ms = children, row["cumulative_ms"]
+            children = []
+    direct.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return {"total_ms": total_ms, "modules": direct[:top]}
+
+def run(module="app", repeat=5, top=15):
+    """Cold starts module repeat times; returns a JSON-ready dict of medians plus the import profile."""
+    runs = [run_once(module) for _ in range(repeat)]
+    median = lambda key: round(statistics.median(r[key] for r in runs), 1)
+    steps = runs[0]["warm_up_steps"].keys()
+    return {
+        "module": module,
+        "repeat": repeat,
+        "import_ms": median("import_ms"),
+        "healthz_ms": median("healthz_ms"),
+        "healthz_status": runs[-1]["healthz_status"],
+        "warm_up_ms": median("warm_up_ms"),
+        "warm_up_steps": {step: round(statistics.median(r["warm_up_steps"][step] for r in runs), 1) for step in steps},
+        "loaded_at_import": runs[-1]["loaded_at_import"],
+        "import_profile": import_profile(module, top),
+    }
+
+def print_report(results):
+    print(f"Cold start of {results['module']} (median of {results['repeat']} fresh interpreters)")
+    print(f"  import            {results['import_ms']:>9.1f} ms")
+    print(f"  first /healthz    {results['healthz_ms']:>9.1f} ms  (HTTP {results['healthz_status']})")
+    print(f"  warm_up()         {results['warm_up_ms']:>9.1f} ms  "
+          + ", ".join(f"{step}={ms}" for step, ms in results["warm_up_steps"].items()))
+    print(f"  heavy modules loaded by the import: {', '.join(results['loaded_at_import']) or 'none'}")
+    profile = results["import_profile"]
+    print(f"\nImport profile (-X importtime, {profile['total_ms']} ms in total)")
+    print(f"{'imported by ' + results['module']:<32}{'cumulative ms':>15}{'self ms':>10}")
+    for row in profile["modules"]:
+        print(f"{row['module']:<32}{row['cumulative_ms']:>15.1f}{row['self_ms']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="Entry module to import (app or asgi)")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15, help="Modules to list in the import profile")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.module, args.repeat, args.top)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+The fixed image corpus the benchmarks run on: a face-like pattern for each
+palette skin tone at several resolutions, on a seeded noisy background.
+Every run on every commit sees the same pixels and the same JPEG bytes.
+
+    python -m benchmarks.corpus --out DIR
+
+writes the corpus as JPEGs, e.g. for the --images option of the other
+benchmarks.
+"""
+import argparse
+import io
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from utils import DEFAULT_SKIN_PALETTE
+
+CORPUS_SIZES = ((640, 480), (1280, 960), (2016, 1512), (4032, 3024))
+JPEG_QUALITY = 90
+
+def draw_face(image, color):
+    """Draws a face-sized ellipse with eyes and a mouth in the middle of image, in place."""
+    height, width = image.shape[:2]
+    cx, cy = width // 2, height // 2
+    face_w, face_h = width // 5, int(height // 3.5)
+    cv2.ellipse(image, (cx, cy), (face_w, face_h), 0, 0, 360, color, -1)
+    eye_dx, eye_y, eye_r = face_w // 2, cy - face_h // 4, max(face_w // 8, 2)
+    cv2.circle(image, (cx - eye_dx, eye_y), eye_r, (40, 30, 30), -1)
+    cv2.circle(image, (cx + eye_dx, eye_y), eye_r, (40, 30, 30), -1)
+    cv2.ellipse(image, (cx, cy + face_h // 2), (face_w // 3, face_h // 10), 0, 0, 180, (120, 50, 60), -1)
+    return image
+
+def encode_jpeg(image, quality=JPEG_QUALITY):
+    buf = io.BytesIO()
+    Image.fromarray(image).save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+def face_corpus(seed=0, sizes=CORPUS_SIZES, tones=None):
+    """
+    One entry per (size, tone), smallest first: dicts with name, size
+    ("WxH"), tone, image (RGB array) and jpeg (encoded bytes).
+    """
+    tones = tones or list(DEFAULT_SKIN_PALETTE)
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for width, height in sizes:
+        for tone in tones:
+            image = rng.integers(60, 200, size=(height, width, 3), dtype=np.uint8)
+            draw_face(image, DEFAULT_SKIN_PALETTE[tone])
+            corpus.append({
+                "name": f"{tone.lower()}_{width}x{height}",
+                "size": f"{width}x{height}",
+                "tone": tone,
+                "image": image,
+                "jpeg": encode_jpeg(image),
+            })
+    return corpus
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="Directory to write the JPEGs to")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for entry in face_corpus(args.seed):
+        path = os.path.join(args.out, f"{entry['name']}.jpg")
+        with open(path, "wb") as f:
+            f.write(entry["jpeg"])
+        print(f"{path} ({len(entry['jpeg']) / 1024:.0f} KiB)")
+
+if __name__ == "__main__":
+    main()
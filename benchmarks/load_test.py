@@ -0,0 +1,170 @@
+"""
+Load-tests /api/analyze on the Flask dev server and on the ASGI server
+(asgi.py under uvicorn), both answering from the stub LLM.
+
+    python -m benchmarks.load_test [--concurrency 10,50,200] [--llm-latency 1.0]
+
+Each server is started in a subprocess with STYLEAI_STUB_LLM=1 and the
+recommendation cache and precomputed store disabled, so every request
+waits llm-latency seconds on the "model". The same photo is sent every
+time, so after the first request the analysis cache answers the CV part
+and the test measures how many LLM calls each server keeps in flight.
+For each concurrency level it reports throughput, p50/p99 latency and
+errors.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_detect import synthetic_images
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    "flask": lambda port: [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port)],
+    "asgi": lambda port: [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--log-level", "warning"],
+}
+
+def sample_image():
+    _, image = synthetic_images()[0]
+    buf = io.BytesIO()
+    Image.fromarray(image).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+def start_server(name, port, llm_latency, workdir):
+    env = dict(
+        os.environ,
+        STYLEAI_STUB_LLM="1",
+        STYLEAI_STUB_LLM_LATENCY=str(llm_latency),
+        RECOMMENDATION_CACHE_SIZE="0",
+        RECOMMENDATION_CACHE_PATH="",
+        RECOMMENDATION_STORE_PATH=os.path.join(workdir, "no_guides.json"),
+    )
+    process = subprocess.Popen(SERVERS[name](port), cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/api/products", timeout=1).status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{name} server did not start within 60s")
+
+def build_request(host, port, image_bytes, gender="Female"):
+    """A complete multipart POST /api/analyze request, encoded once and replayed."""
+    boundary = "styleai-load-test"
+    body = b"".join([
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"gender\"\r\n\r\n{gender}\r\n".encode(),
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"photo.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n".encode(),
+        image_bytes,
+        f"\r\n--{boundary}--\r\n".encode(),
+    ])
+    head = (
+        f"POST /api/analyze HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n"
+        f"Content-Type: multipart/form-data; boundary={boundary}\r\nContent-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode() + body
+
+async def send_request(host, port, request_bytes):
+    """Sends one request on a fresh connection and returns the HTTP status."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(request_bytes)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+async def run_level(url, image_bytes, concurrency, total):
+    # A bare asyncio client: httpx costs more CPU per request than the servers
+    # under test, which skews results on small machines
+    host, port = url.rsplit("//", 1)[1].split(":")
+    request_bytes = build_request(host, port, image_bytes)
+    latencies, errors = [], 0
+    remaining = total
+
+    async def worker():
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                ok = await asyncio.wait_for(send_request(host, int(port), request_bytes), 120) == 200
+            except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 1),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", default="flask,asgi", help="Comma-separated servers to test")
+    parser.add_argument("--concurrency", default="10,50,200", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests-per-client", type=int, default=3, help="Requests each concurrent client sends")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds the stub LLM takes per call")
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    image_bytes = sample_image()
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for offset, name in enumerate(args.servers.split(",")):
+            process, url = start_server(name, args.port + offset, args.llm_latency, workdir)
+            try:
+                # One warm-up request fills the analysis cache and loads the detector
+                asyncio.run(run_level(url, image_bytes, 1, 1))
+                results[name] = [
+                    asyncio.run(run_level(url, image_bytes, level, level * args.requests_per_client))
+                    for level in levels
+                ]
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+
+    print(f"\nStub LLM latency {args.llm_latency:.2f}s per call")
+    print(f"{'server':<8}{'clients':>9}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, rows in results.items():
+        for row in rows:
+            print(f"{name:<8}{row['concurrency']:>9}{row['requests']:>10}{row['errors']:>8}"
+                  f"{row['throughput_rps']:>9.2f}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"llm_latency": args.llm_latency, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Runs the pipeline microbenchmarks, the end-to-end test and the cold start
+benchmark and writes one JSON report, tagged with the commit and
+environment, so runs on different commits can be compared.
+
+    python -m benchmarks.suite [--out PATH] [--baseline OLD.json] [--quick]
+
+The report goes to benchmarks/results/<commit>.json by default. With
+--baseline, every latency and throughput figure is compared to that report
+and the run exits with status 1 if any got worse by more than --tolerance.
+Compare runs from the same machine only.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+
+from benchmarks import bench_e2e, bench_pipeline, bench_startup
+from benchmarks.corpus import CORPUS_SIZES
+from instrumentation import configure_logging
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+REPORT_FORMAT = 1
+QUICK_SIZES = ((640, 480), (1280, 960))
+# Sub-millisecond stages jitter by more than any sensible tolerance
+MIN_REGRESSION_MS = 0.5
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "face_detector": os.getenv("FACE_DETECTOR", "haar"),
+    }
+
+def key_metrics(report):
+    """Flat {name: (value, higher_is_better)} of the figures worth tracking."""
+    metrics = {}
+    for stage, summary in report["pipeline"]["stages"].items():
+        if summary:
+            metrics[f"pipeline.{stage}.p50_ms"] = (summary["p50_ms"], False)
+            metrics[f"pipeline.{stage}.p95_ms"] = (summary["p95_ms"], False)
+    for row in report["e2e"]["levels"]:
+        prefix = f"e2e.c{row['concurrency']}"
+        metrics[f"{prefix}.p50_ms"] = (row["p50_ms"], False)
+        metrics[f"{prefix}.p99_ms"] = (row["p99_ms"], False)
+        metrics[f"{prefix}.throughput_rps"] = (row["throughput_rps"], True)
+    if "startup" in report:
+        for key in ("import_ms", "healthz_ms", "warm_up_ms"):
+            metrics[f"startup.{key}"] = (report["startup"][key], False)
+    return metrics
+
+def compare(baseline, report, tolerance):
+    """Prints each shared metric's change; returns the names that regressed beyond tolerance."""
+    old, new = key_metrics(baseline), key_metrics(report)
+    regressions = []
+    print(f"\nAgainst {(baseline['environment'].get('commit') or 'unknown')[:12]} (tolerance {tolerance:.0%})")
+    print(f"{'metric':<34}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name in sorted(old.keys() & new.keys()):
+        (before, higher_is_better), (after, _) = old[name], new[name]
+        change = (after - before) / before if before else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance and (higher_is_better or after - before > MIN_REGRESSION_MS):
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<34}{before:>12.2f}{after:>12.2f}{change:>+10.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="Report path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown before failing (0.10 = 10%%)")
+    parser.add_argument("--quick", action="store_true", help="Small images, one timed run each, fewer requests")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage and image")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated end-to-end concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="End-to-end requests per level")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the stub LLM takes per call")
+    args = parser.parse_args()
+
+    configure_logging(level="WARNING")
+    sizes, repeat, requests = CORPUS_SIZES, args.repeat, args.requests
+    if args.quick:
+        sizes, repeat, requests = QUICK_SIZES, 1, min(requests, 8)
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    print("Pipeline microbenchmarks...")
+    pipeline = bench_pipeline.run(repeat, sizes)
+    bench_pipeline.print_report(pipeline)
+    print("\nEnd-to-end /api/analyze...")
+    e2e = bench_e2e.run(levels, requests, args.llm_latency)
+    for row in e2e["levels"]:
+        print(f"  {row['concurrency']:>3} clients: {row['throughput_rps']:.2f} req/s, "
+              f"p50 {row['p50_ms']:.1f} ms, p99 {row['p99_ms']:.1f} ms, {row['errors']} errors")
+
+    print("\nCold start...")
+    startup = bench_startup.run(repeat=3 if args.quick else 5)
+    print(f"  import {startup['import_ms']:.1f} ms, first /healthz {startup['healthz_ms']:.1f} ms, "
+          f"warm_up {startup['warm_up_ms']:.1f} ms")
+
+    report = {
+        "format": REPORT_FORMAT,
+        "environment": environment(),
+        "settings": {"quick": args.quick, "repeat": repeat, "requests": requests,
+                     "concurrency": levels, "llm_latency": args.llm_latency},
+        "pipeline": pipeline,
+        "e2e": e2e,
+        "startup": startup,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{(report['environment']['commit'] or 'local')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != report["settings"]:
+            print("Warning: the baseline was run with different settings; figures may not be comparable")
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from instrumentation import get_logger
+from product_index import ProductIndex, shopping_queries
+
+DEFAULT_CATALOGUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "products.json")
+DEFAULT_SKIN_TONE = "Medium"
+# Fields returned to the client for each product
+PUBLIC_FIELDS = ("name", "description", "shop_link", "category", "retailer")
+
+log = get_logger(__name__)
+
+
+class ProductCatalogue:
+    """
+    Immutable product index built once from the catalogue file.
+
+    Products are grouped by (skin_tone, gender), and within that by category
+    and by retailer, so every lookup is a few dict reads. Missing tones fall
+    back to Medium and missing genders to the first gender listed for the tone,
+    as the inline product table used to.
+
+    search() and shop_the_look() go through a ProductIndex over the same
+    products, memory-mapped from index_path when one is given.
+    """
+
+    def __init__(self, products, version=None, index_path=None):
+        by_profile = {}
+        genders_by_tone = {}
+        for product in products:
+            record = MappingProxyType({field: product.get(field, "") for field in PUBLIC_FIELDS})
+            tone, gender = product["skin_tone"], product["gender"]
+            genders_by_tone.setdefault(tone, [])
+            if gender not in genders_by_tone[tone]:
+                genders_by_tone[tone].append(gender)
+            groups = by_profile.setdefault((tone, gender), {"all": [], "category": {}, "retailer": {}})
+            groups["all"].append(record)
+            groups["category"].setdefault(record["category"].lower(), []).append(record)
+            groups["retailer"].setdefault(record["retailer"].lower(), []).append(record)
+
+        self._index = {
+            key: {
+                "all": tuple(groups["all"]),
+                "category": {k: tuple(v) for k, v in groups["category"].items()},
+                "retailer": {k: tuple(v) for k, v in groups["retailer"].items()},
+            }
+            for key, groups in by_profile.items()
+        }
+        self._genders_by_tone = {tone: tuple(genders) for tone, genders in genders_by_tone.items()}
+        self.version = version
+        self.size = sum(len(groups["all"]) for groups in self._index.values())
+        self.text_index = ProductIndex.load_or_build(products, index_path)
+        self._records = {
+            id(product): MappingProxyType({field: product.get(field, "") for field in PUBLIC_FIELDS})
+            for product in products
+        }
+
+    @classmethod
+    def load(cls, path=DEFAULT_CATALOGUE_PATH, index_path=None):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["products"], version=data.get("version"), index_path=index_path)
+
+    def resolve(self, skin_tone, gender):
+        """Maps a profile onto the (skin_tone, gender) key the catalogue actually has."""
+        tone = skin_tone if skin_tone in self._genders_by_tone else DEFAULT_SKIN_TONE
+        genders = self._genders_by_tone.get(tone, ())
+        if not genders:
+            return None
+        return tone, gender if gender in genders else genders[0]
+
+    def lookup(self, skin_tone, gender, category=None, retailer=None, limit=5):
+        """Returns up to limit products as plain dicts, optionally filtered."""
+        key = self.resolve(skin_tone, gender)
+        if key is None:
+            return []
+        groups = self._index[key]
+        products = groups["all"]
+        if category:
+            products = groups["category"].get(category.lower(), ())
+        if retailer:
+            wanted = retailer.lower()
+            if category:
+                products = tuple(p for p in products if p["retailer"].lower() == wanted)
+            else:
+                products = groups["retailer"].get(wanted, ())
+        if limit is not None:
+            products = products[:limit]
+        return [dict(product) for product in products]
+
+    def search(self, query, skin_tone=None, gender=None, limit=5):
+        """Products most similar to query, best first, each with its similarity score."""
+        key = self.resolve(skin_tone, gender) if skin_tone else (None, None)
+        if key is None:
+            return []
+        return [
+            dict(self._records[id(product)], score=round(score, 3))
+            for product, score in self.text_index.search(query, key[0], key[1], k=limit)
+        ]
+
+    def shop_the_look(self, guide, skin_tone, gender, limit=5):
+        """
+        Products for the items a style guide's shopping links name: the best
+        match for each item in turn, then the runner-ups, topped up from
+        lookup() when the guide names too few items the catalogue has.
+        """
+        key = self.resolve(skin_tone, gender)
+        if key is None:
+            return []
+        matches = [
+            [product for product, _ in self.text_index.search(query, key[0], key[1], k=limit)]
+            for query in shopping_queries(guide)
+        ]
+        picked, seen = [], set()
+        for rank in range(limit):
+            for products in matches:
+                if rank < len(products) and id(products[rank]) not in seen and len(picked) < limit:
+                    seen.add(id(products[rank]))
+                    picked.append(dict(self._records[id(products[rank])]))
+        for product in self.lookup(skin_tone, gender, limit=2 * limit):
+            if len(picked) >= limit:
+                break
+            if product not in picked:
+                picked.append(product)
+        return picked
+
+
+class CatalogueManager:
+    """
+    Holds the live ProductCatalogue and swaps in a fresh one when the file
+    changes. The modification time is checked at most every check_interval
+    seconds, so lookups stay cheap. A broken file keeps the previous catalogue.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOGUE_PATH, check_interval=5.0, index_path=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self._catalogue = None
+        self.reload()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            path=os.getenv("CATALOGUE_PATH", DEFAULT_CATALOGUE_PATH),
+            check_interval=float(os.getenv("CATALOGUE_RELOAD_INTERVAL", "5")),
+            index_path=os.getenv("PRODUCT_INDEX_PATH") or None,
+        )
+
+    @property
+    def catalogue(self):
+        if self.check_interval and time.monotonic() >= self._next_check:
+            self.reload_if_changed()
+        return self._catalogue
+
+    def reload(self):
+        mtime = os.path.getmtime(self.path)
+        catalogue = ProductCatalogue.load(self.path, self.index_path)
+        with self._lock:
+            self._catalogue = catalogue
+            self._mtime = mtime
+            self._next_check = time.monotonic() + self.check_interval
+        log.info("catalogue_loaded", products=catalogue.size, path=self.path)
+        return catalogue
+
+    def reload_if_changed(self):
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+        try:
+            if os.path.getmtime(self.path) == self._mtime:
+                return False
+            self.reload()
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("catalogue_reload_failed", path=self.path, error=str(e))
+            return False
+
+    def lookup(self, skin_tone, gender, category=None, retailer=None, limit=5):
+        return self.catalogue.lookup(skin_tone, gender, category, retailer, limit)
+
+    def search(self, query, skin_tone=None, gender=None, limit=5):
+        return self.catalogue.search(query, skin_tone, gender, limit)
+
+    def shop_the_look(self, guide, skin_tone, gender, limit=5):
+        return self.catalogue.shop_the_look(guide, skin_tone, gender, limit)
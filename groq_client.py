@@ -1,140 +1,441 @@
+import asyncio
 import os
 import re
+import time
 from urllib.parse import urlparse, quote
-from groq import Groq
 from dotenv import load_dotenv
+from instrumentation import LLM_FIRST_TOKEN_SECONDS, LLM_SECONDS, RECOMMENDATIONS, get_logger
+from groq_transport import (
+    ERROR_UNAVAILABLE,
+    AsyncGroqTransport,
+    GroqTransport,
+    LLMError,
+    build_async_groq_client,
+    build_groq_client,
+)
+from recommendation_cache import RecommendationCache
+from recommendation_store import RecommendationStore
+from prompts import TokenMeter, get_template
+from single_flight import AsyncSingleFlight, FlightAbandoned, SingleFlight
 
 load_dotenv()
 
-class GroqService:
+log = get_logger(__name__)
+
+MODEL = "llama-3.3-70b-versatile"
+
+LINK_PATTERN = re.compile(r"\[([^\]]+)\]\((https?://[^\)]+)\)")
+
+def _rewrite_link(match):
+    label = match.group(1)
+    url = match.group(2)
+    try:
+        parsed = urlparse(url)
+        host = parsed.netloc.lower()
+        # Extract a query string from label fallback to last path segment
+        candidate = label
+        if not candidate or candidate.strip() == "":
+            path_last = parsed.path.split("/")[-1]
+            candidate = path_last.replace("-", " ")
+        q = quote(candidate.strip())
+        if "amazon.in" in host:
+            return f"[{label}](https://www.amazon.in/s?k={q})"
+        if "myntra.com" in host:
+            return f"[{label}](https://www.myntra.com/search?query={q})"
+        if "zara.com" in host:
+            return f"[{label}](https://www.zara.com/in/en/search?searchTerm={q})"
+        return match.group(0)
+    except Exception:
+        return match.group(0)
+
+def normalize_shopping_links(markdown: str) -> str:
+    # Convert any platform links to valid search URLs using the link text as query
+    return LINK_PATTERN.sub(_rewrite_link, markdown)
+
+def _chunk_usage(chunk):
+    """Token usage carried by a stream chunk; Groq sends it in x_groq on the last one."""
+    usage = getattr(chunk, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+    return usage
+
+class StreamingLinkNormalizer:
+    """
+    Applies normalize_shopping_links to streamed text. A trailing fragment that
+    could still become a markdown link is held back until it either closes or
+    clearly isn't a link, so links split across chunks are rewritten correctly.
+    """
+    # Give up waiting for a link to close after this many characters
+    MAX_HOLD = 1024
+
     def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text):
+        self._buffer += text
+        cut = self._safe_prefix_length(self._buffer)
+        ready, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return normalize_shopping_links(ready) if ready else ""
+
+    def finish(self):
+        ready, self._buffer = self._buffer, ""
+        return normalize_shopping_links(ready) if ready else ""
+
+    def _safe_prefix_length(self, text):
+        start = text.rfind("[")
+        if start == -1 or len(text) - start > self.MAX_HOLD:
+            return len(text)
+        tail = text[start:]
+        close = tail.find("]")
+        if close == -1 or close == len(tail) - 1:
+            return start  # label still open, or "(" not received yet
+        if tail[close + 1] != "(":
+            return len(text)  # "[...]" not followed by a URL
+        if ")" not in tail[close + 2:]:
+            return start  # URL still open
+        return len(text)
+
+class GroqService:
+    """
+    Style guides from the precomputed store, the cache or the model, in that
+    order. Model calls go through GroqTransport (pooled connections, deadline,
+    retries, circuit breaker), and concurrent requests for the same prompt
+    share one call (single_flight). Failures raise LLMError, after falling
+    back to any saved guide for the same profile.
+
+    The prompt comes from prompts.get_template() (PROMPT_MODE) unless one is
+    passed in, and token usage per call is tallied in self.tokens.
+    """
+    def __init__(self, cache=None, store=None, client=None, transport=None, prompt=None):
+        self.prompt = prompt if prompt is not None else get_template()
+        self.tokens = TokenMeter()
+        self.cache = cache if cache is not None else RecommendationCache.from_env()
+        self.store = store if store is not None else RecommendationStore.from_env(MODEL, self.prompt.version)
+        self.single_flight = SingleFlight()
+        if transport is not None:
+            self.api_key = None
+            self.client = transport.client
+            self.transport = transport
+            return
+        if client is not None:
+            # Injected clients (e.g. stub_llm.StubGroqClient) skip the API key lookup
+            self.api_key = None
+            self.client = client
+            self.transport = GroqTransport.from_env(client)
+            return
         self.api_key = os.getenv("GROQ_API_KEY")
-        print(f"🔧 GroqService initialized. API Key available: {bool(self.api_key)}")
         if not self.api_key:
-            print("  ⚠️  Warning: No API key found in environment")
+            log.warning("groq_api_key_missing")
             self.client = None
         else:
-            print("  ✅ Creating Groq client...")
-            self.client = Groq(api_key=self.api_key)
+            self.client = build_groq_client(self.api_key)
+        self.transport = GroqTransport.from_env(self.client)
 
     def set_api_key(self, api_key):
-        self.client = Groq(api_key=api_key)
+        self.client = build_groq_client(api_key)
+        # Keep the breaker: a new key doesn't make a struggling service healthy
+        self.transport = GroqTransport.from_env(self.client, breaker=self.transport.breaker)
+
+    def reconnect(self):
+        """Rebuilds the Groq client, e.g. after groq_transport.reset_http_client() in a forked worker."""
+        if self.api_key:
+            self.set_api_key(self.api_key)
 
     def _normalize_shopping_links(self, markdown: str) -> str:
-        # Convert any platform links to valid search URLs using the link text as query
-        def repl(match):
-            label = match.group(1)
-            url = match.group(2)
-            try:
-                parsed = urlparse(url)
-                host = parsed.netloc.lower()
-                # Extract a query string from label fallback to last path segment
-                candidate = label
-                if not candidate or candidate.strip() == "":
-                    path_last = parsed.path.split("/")[-1]
-                    candidate = path_last.replace("-", " ")
-                q = quote(candidate.strip())
-                if "amazon.in" in host:
-                    return f"[{label}](https://www.amazon.in/s?k={q})"
-                if "myntra.com" in host:
-                    return f"[{label}](https://www.myntra.com/search?query={q})"
-                if "zara.com" in host:
-                    return f"[{label}](https://www.zara.com/in/en/search?searchTerm={q})"
-                return match.group(0)
-            except Exception:
-                return match.group(0)
-
-        pattern = re.compile(r"\[([^\]]+)\]\((https?://[^\)]+)\)")
-        return pattern.sub(repl, markdown)
+        return normalize_shopping_links(markdown)
+
+    def _lookup_saved(self, skin_tone, gender, face_shape, context):
+        """Returns (guide or None, cache_key) from the precomputed store or the cache."""
+        # Precomputed and cached guides were normalised before they were stored
+        cache_key = self.cache.make_key(skin_tone, gender, face_shape, context)
+        if not context:
+            stored = self.store.get(skin_tone, gender, face_shape)
+            if stored is not None:
+                RECOMMENDATIONS.inc(source="store")
+                return stored, cache_key
+
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            RECOMMENDATIONS.inc(source="cache")
+        return cached, cache_key
+
+    def _fallback_guide(self, skin_tone, gender, face_shape, error):
+        """
+        A saved guide for the same profile, ignoring any extra context, for
+        when the model can't be reached. Raises error if there is none.
+        """
+        fallback = self.store.get(skin_tone, gender, face_shape)
+        if fallback is None:
+            fallback = self.cache.get(self.cache.make_key(skin_tone, gender, face_shape, ""))
+        if fallback is None:
+            raise error
+        log.warning("serving_saved_guide", error_kind=error.kind)
+        RECOMMENDATIONS.inc(source="fallback")
+        return fallback
 
     def get_fashion_recommendations(self, skin_tone, gender, face_shape="Oval", context=""):
-        if not self.client:
-            print("❌ Error: Groq client not initialized")
-            return "Error: Groq API Key is missing."
-
-        print(f"\n📝 Generating recommendations for: {gender} with {skin_tone} skin tone and {face_shape} face shape")
-
-        prompt = f"""
-        You are StyleAI, an expert fashion stylist and personal grooming consultant. 
-        
-        User Profile:
-        - Skin Tone: {skin_tone}
-        - Gender: {gender}
-        - Face Shape: {face_shape}
-        {f'- Additional Context: {context}' if context else ''}
-
-        Based on this profile, please provide a comprehensive fashion and styling guide.
-        
-        Your response MUST be formatted in Markdown and cover the following sections:
-
-        ### 1. Analysis
-        - Explain why specific colors and styles work for the {skin_tone} skin tone.
-        - Mention how {face_shape} face shape influences styling choices.
-
-        ### 2. Hairstyle Recommendations
-        For {face_shape} face shape ({gender}):
-        - **Short Hair:** 1-2 style suggestions with descriptions
-        - **Medium Hair:** 1-2 style suggestions with descriptions
-        - **Long Hair:** 1-2 style suggestions with descriptions
-        - **Styling Tips:** Best practices for hair care and styling
-
-        ### 3. Color Palette
-        - **Primary Colors:** Best main colors for outfits.
-        - **Secondary Colors:** Complementary colors.
-        - **Avoid:** Colors that might wash out or clash with the skin tone.
-
-        ### 4. Clothing Type Recommendations
-        - **Body Type Friendly Fits:** Suggest clothing fits that work well for {gender}
-        - **Best Fabrics:** Lightweight, medium-weight, heavy fabrics recommendations
-        - **Patterns & Prints:** Best patterns for {skin_tone} skin tone
-
-        ### 5. Outfit Recommendations (Gender-Specific)
-        Provide 3 distinct outfit ideas (Casual, Business/Formal, Party/Event):
-        - **Casual:** Clothing type, colors, shoes, accessories specifically for {face_shape} face
-        - **Business/Formal:** Clothing type, suit/style, shoes, and professional look
-        - **Party:** Outfit type, colors, and special occasion styling
-
-        ### 6. Grooming & Accessories
-        - **Hairstyle:** Specific suggestions for {face_shape} face shape and {skin_tone} skin tone
-        - **Makeup (if applicable):** Colors that enhance features
-        - **Accessories:** Jewelry metals (Gold/Silver/Rose Gold), glasses recommendations, based on face shape
-        - **Eyebrow Shape:** Best suited for {face_shape} face
-
-        ### 7. Shopping Guide
-        For each outfit recommendation above, provide specific search terms to find these items on Amazon.in, Myntra, and Zara.
-        Format them as:
-        - *Casual Look:* [Search for White Linen Shirt on Amazon.in](https://www.amazon.in/s?k=white+linen+shirt)
-        - *Casual Look:* [Search for White Linen Shirt on Myntra](https://www.myntra.com/search?query=white+linen+shirt)
-        - *Casual Look:* [Search for White Linen Shirt on Zara](https://www.zara.com/in/en/search?searchTerm=white+linen+shirt)
-        
-        Please ensure the tone is encouraging, professional, and personalized to the {face_shape} face shape and {skin_tone} skin tone combination.
+        log.debug("recommendations_requested", skin_tone=skin_tone, gender=gender, face_shape=face_shape)
+
+        saved, cache_key = self._lookup_saved(skin_tone, gender, face_shape, context)
+        if saved is not None:
+            return saved
+
+        def generate():
+            result = self.generate_guide(skin_tone, gender, face_shape, context)
+            self.cache.put(cache_key, result)
+            return result
+
+        # Identical requests already waiting on the model share its answer
+        try:
+            try:
+                result = self.single_flight.do(cache_key, generate)
+            except FlightAbandoned:
+                result = self.single_flight.do(cache_key, generate)
+        except LLMError as e:
+            log.error("groq_call_failed", error_kind=e.kind, error=e.message)
+            return self._fallback_guide(skin_tone, gender, face_shape, e)
+        return result
+
+    def stream_fashion_recommendations(self, skin_tone, gender, face_shape="Oval", context=""):
         """
+        Yields the guide as normalised markdown chunks as soon as the model
+        produces them. Saved guides are yielded in one chunk, as is the
+        fallback guide when the model can't be reached. Other failures raise
+        LLMError.
+        """
+        log.debug("recommendations_requested", skin_tone=skin_tone, gender=gender, face_shape=face_shape, stream=True)
+
+        saved, cache_key = self._lookup_saved(skin_tone, gender, face_shape, context)
+        if saved is not None:
+            yield saved
+            return
+
+        call, leader = self.single_flight.begin(cache_key)
+        if not leader:
+            # Someone is already streaming this guide; wait for the whole of it
+            try:
+                yield call.wait()
+            except FlightAbandoned:
+                yield self.get_fashion_recommendations(skin_tone, gender, face_shape, context)
+            except LLMError as e:
+                yield self._fallback_guide(skin_tone, gender, face_shape, e)
+            return
 
+        parts = []
         try:
-            print("  🌐 Calling Groq API...")
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a professional fashion stylist and personal grooming consultant with expertise in face shapes, skin tone matching, and personalized styling."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                model="llama-3.3-70b-versatile",
-                temperature=0.7,
-                max_tokens=3000,
-            )
-            print("  ✅ Response received from Groq API")
-            raw = chat_completion.choices[0].message.content
-            print("  🔗 Processing shopping links...")
-            result = self._normalize_shopping_links(raw)
-            print("✅ Recommendations ready!\n")
+            for text in self._stream_guide(skin_tone, gender, face_shape, context):
+                parts.append(text)
+                yield text
+        except LLMError as e:
+            self.single_flight.finish(cache_key, call, error=e)
+            log.error("groq_call_failed", error_kind=e.kind, error=e.message, stream=True)
+            if parts:
+                # Part of the guide has already been sent, so there is nothing to fall back to
+                raise
+            yield self._fallback_guide(skin_tone, gender, face_shape, e)
+            return
+        except BaseException:
+            # The client went away mid-stream; release anyone waiting on it
+            self.single_flight.finish(cache_key, call, error=FlightAbandoned())
+            raise
+
+        result = "".join(parts)
+        self.cache.put(cache_key, result)
+        self.single_flight.finish(cache_key, call, result=result)
+
+    def _stream_guide(self, skin_tone, gender, face_shape, context):
+        messages = self.build_messages(skin_tone, gender, face_shape, context)
+        with LLM_SECONDS.time(mode="stream"):
+            start = time.perf_counter()
+            stream = self.transport.create(**self._completion_args(messages), stream=True)
+            normalizer = StreamingLinkNormalizer()
+            usage, finish_reason, raw = None, None, []
+            try:
+                for chunk in stream:
+                    usage = _chunk_usage(chunk) or usage
+                    if not chunk.choices:
+                        continue
+                    finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if not raw:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+                    raw.append(delta)
+                    text = normalizer.feed(delta)
+                    if text:
+                        yield text
+            except LLMError:
+                raise
+            except Exception as e:
+                raise LLMError(ERROR_UNAVAILABLE, f"The style service stream broke off: {str(e)}") from e
+            text = normalizer.finish()
+            if text:
+                yield text
+        self._record_usage(usage, messages, "".join(raw), finish_reason)
+
+    def _completion_args(self, messages):
+        return {
+            "messages": messages,
+            "model": MODEL,
+            "temperature": 0.7,
+            "max_tokens": self.prompt.max_tokens,
+        }
+
+    def _record_usage(self, usage, messages, completion, finish_reason):
+        RECOMMENDATIONS.inc(source="model")
+        prompt_tokens, completion_tokens = self.tokens.record(usage, messages, completion, finish_reason)
+        log.info("llm_tokens", prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                 estimated=usage is None)
+        if finish_reason == "length":
+            log.warning("guide_truncated", max_tokens=self.prompt.max_tokens)
+
+    def build_messages(self, skin_tone, gender, face_shape="Oval", context=""):
+        return self.prompt.messages(skin_tone, gender, face_shape, context)
+
+    def generate_guide(self, skin_tone, gender, face_shape="Oval", context=""):
+        """
+        Calls the model for a fresh guide, bypassing the store and cache.
+        Returns the normalised markdown and raises LLMError on any API error.
+        """
+        messages = self.build_messages(skin_tone, gender, face_shape, context)
+        with LLM_SECONDS.time(mode="complete"):
+            chat_completion = self.transport.create(**self._completion_args(messages))
+        choice = chat_completion.choices[0]
+        raw = choice.message.content
+        self._record_usage(getattr(chat_completion, "usage", None), messages, raw, getattr(choice, "finish_reason", None))
+        return self._normalize_shopping_links(raw)
+
+class AsyncGroqService(GroqService):
+    """
+    GroqService for asyncio servers, built on the AsyncGroq client.
+    get_fashion_recommendations and generate_guide are coroutines and
+    stream_fashion_recommendations is an async generator; prompts, link
+    normalisation, the store, the cache and the fallbacks are shared with
+    GroqService. Pass the sync service's cache and store to share them too.
+    """
+    def __init__(self, cache=None, store=None, client=None, transport=None, prompt=None):
+        self.prompt = prompt if prompt is not None else get_template()
+        self.tokens = TokenMeter()
+        self.cache = cache if cache is not None else RecommendationCache.from_env()
+        self.store = store if store is not None else RecommendationStore.from_env(MODEL, self.prompt.version)
+        self.single_flight = AsyncSingleFlight()
+        self.api_key = None
+        if transport is not None:
+            self.client = transport.client
+        elif client is not None:
+            # Injected clients (e.g. stub_llm.AsyncStubGroqClient) skip the API key lookup
+            self.client = client
+        else:
+            self.api_key = os.getenv("GROQ_API_KEY")
+            self.client = build_async_groq_client(self.api_key) if self.api_key else None
+        self.transport = transport if transport is not None else AsyncGroqTransport.from_env(self.client)
+
+    def set_api_key(self, api_key):
+        self.client = build_async_groq_client(api_key)
+        self.transport = AsyncGroqTransport.from_env(self.client, breaker=self.transport.breaker)
+
+    # With RECOMMENDATION_CACHE_PATH set the cache is SQLite, so every cache
+    # touch runs in a thread instead of blocking the event loop
+
+    async def _lookup_saved_async(self, skin_tone, gender, face_shape, context):
+        return await asyncio.to_thread(self._lookup_saved, skin_tone, gender, face_shape, context)
+
+    async def _fallback_guide_async(self, skin_tone, gender, face_shape, error):
+        return await asyncio.to_thread(self._fallback_guide, skin_tone, gender, face_shape, error)
+
+    async def get_fashion_recommendations(self, skin_tone, gender, face_shape="Oval", context=""):
+        saved, cache_key = await self._lookup_saved_async(skin_tone, gender, face_shape, context)
+        if saved is not None:
+            return saved
+
+        async def generate():
+            result = await self.generate_guide(skin_tone, gender, face_shape, context)
+            await asyncio.to_thread(self.cache.put, cache_key, result)
             return result
-        except Exception as e:
-            print(f"❌ Error calling Groq API: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return f"Error generating recommendations: {str(e)}"
+
+        try:
+            try:
+                return await self.single_flight.do(cache_key, generate)
+            except FlightAbandoned:
+                return await self.single_flight.do(cache_key, generate)
+        except LLMError as e:
+            log.error("groq_call_failed", error_kind=e.kind, error=e.message)
+            return await self._fallback_guide_async(skin_tone, gender, face_shape, e)
+
+    async def stream_fashion_recommendations(self, skin_tone, gender, face_shape="Oval", context=""):
+        saved, cache_key = await self._lookup_saved_async(skin_tone, gender, face_shape, context)
+        if saved is not None:
+            yield saved
+            return
+
+        future, leader = self.single_flight.begin(cache_key)
+        if not leader:
+            try:
+                yield await asyncio.shield(future)
+            except FlightAbandoned:
+                yield await self.get_fashion_recommendations(skin_tone, gender, face_shape, context)
+            except LLMError as e:
+                yield await self._fallback_guide_async(skin_tone, gender, face_shape, e)
+            return
+
+        parts = []
+        try:
+            async for text in self._stream_guide(skin_tone, gender, face_shape, context):
+                parts.append(text)
+                yield text
+        except LLMError as e:
+            self.single_flight.finish(cache_key, future, error=e)
+            log.error("groq_call_failed", error_kind=e.kind, error=e.message, stream=True)
+            if parts:
+                raise
+            yield await self._fallback_guide_async(skin_tone, gender, face_shape, e)
+            return
+        except BaseException:
+            self.single_flight.finish(cache_key, future, error=FlightAbandoned())
+            raise
+
+        result = "".join(parts)
+        # Followers get the guide before the cache write, which may be cancelled
+        self.single_flight.finish(cache_key, future, result=result)
+        await asyncio.to_thread(self.cache.put, cache_key, result)
+
+    async def _stream_guide(self, skin_tone, gender, face_shape, context):
+        messages = self.build_messages(skin_tone, gender, face_shape, context)
+        with LLM_SECONDS.time(mode="stream"):
+            start = time.perf_counter()
+            stream = await self.transport.create(**self._completion_args(messages), stream=True)
+            normalizer = StreamingLinkNormalizer()
+            usage, finish_reason, raw = None, None, []
+            try:
+                async for chunk in stream:
+                    usage = _chunk_usage(chunk) or usage
+                    if not chunk.choices:
+                        continue
+                    finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if not raw:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+                    raw.append(delta)
+                    text = normalizer.feed(delta)
+                    if text:
+                        yield text
+            except LLMError:
+                raise
+            except Exception as e:
+                raise LLMError(ERROR_UNAVAILABLE, f"The style service stream broke off: {str(e)}") from e
+            text = normalizer.finish()
+            if text:
+                yield text
+        self._record_usage(usage, messages, "".join(raw), finish_reason)
+
+    async def generate_guide(self, skin_tone, gender, face_shape="Oval", context=""):
+        messages = self.build_messages(skin_tone, gender, face_shape, context)
+        with LLM_SECONDS.time(mode="complete"):
+            chat_completion = await self.transport.create(**self._completion_args(messages))
+        choice = chat_completion.choices[0]
+        self._record_usage(getattr(chat_completion, "usage", None), messages, choice.message.content,
+                           getattr(choice, "finish_reason", None))
+        return self._normalize_shopping_links(choice.message.content)
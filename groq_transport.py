@@ -0,0 +1,442 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from instrumentation import get_logger
+from lazy import lazy_import
+
+# The SDK and its HTTP stack take a few hundred ms to import; only pay for
+# that once a client is built
+groq = lazy_import("groq")
+httpx = lazy_import("httpx")
+
+# Error kinds carried by LLMError. The retryable ones are retried with backoff
+# and count towards opening the circuit.
+ERROR_MISSING_KEY = "missing_key"
+ERROR_RATE_LIMITED = "rate_limited"
+ERROR_TIMEOUT = "timeout"
+ERROR_UNAVAILABLE = "unavailable"
+ERROR_CIRCUIT_OPEN = "circuit_open"
+ERROR_BAD_REQUEST = "bad_request"
+
+RETRYABLE_ERRORS = (ERROR_RATE_LIMITED, ERROR_TIMEOUT, ERROR_UNAVAILABLE)
+
+# HTTP status the app answers with for each kind
+ERROR_HTTP_STATUS = {
+    ERROR_MISSING_KEY: 503,
+    ERROR_RATE_LIMITED: 429,
+    ERROR_TIMEOUT: 504,
+    ERROR_UNAVAILABLE: 502,
+    ERROR_CIRCUIT_OPEN: 503,
+    ERROR_BAD_REQUEST: 502,
+}
+
+log = get_logger(__name__)
+
+
+class LLMError(RuntimeError):
+    """
+    A failed recommendation call, with a machine-readable kind and, when
+    known, how many seconds to wait before trying again.
+    """
+
+    def __init__(self, kind, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.kind = kind
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.kind in RETRYABLE_ERRORS or self.kind == ERROR_CIRCUIT_OPEN
+
+    @property
+    def http_status(self):
+        return ERROR_HTTP_STATUS.get(self.kind, 500)
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "message": self.message,
+            "retryable": self.retryable,
+            "retry_after": round(self.retry_after, 1) if self.retry_after is not None else None,
+        }
+
+
+def _retry_after_header(response):
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def classify_error(error):
+    """
+    Maps a Groq SDK or httpx transport exception onto an LLMError. Anything
+    else is a bug on our side, not a service failure, and is re-raised
+    unchanged so it is neither retried nor counted by the breaker.
+    """
+    if isinstance(error, LLMError):
+        return error
+    if isinstance(error, (groq.APITimeoutError, httpx.TimeoutException)):
+        return LLMError(ERROR_TIMEOUT, "The style service timed out")
+    if isinstance(error, (groq.APIConnectionError, httpx.TransportError)):
+        return LLMError(ERROR_UNAVAILABLE, "Could not reach the style service")
+    if isinstance(error, groq.APIStatusError):
+        status = error.status_code
+        retry_after = _retry_after_header(error.response)
+        if status == 429:
+            return LLMError(ERROR_RATE_LIMITED, "The style service is rate limited", status, retry_after)
+        if status >= 500:
+            return LLMError(ERROR_UNAVAILABLE, f"The style service returned HTTP {status}", status, retry_after)
+        return LLMError(ERROR_BAD_REQUEST, f"The style service rejected the request (HTTP {status})", status)
+    if isinstance(error, groq.APIError):
+        return LLMError(ERROR_UNAVAILABLE, f"Unexpected error from the style service: {str(error)}")
+    raise error
+
+
+class CircuitBreaker:
+    """
+    Stops calling the model after failure_threshold consecutive failures.
+    Once open, calls fail fast for reset_timeout seconds; then a single
+    trial call is let through, and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    # What allow() returns for the half-open trial call
+    TRIAL = "trial"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._rejected = 0
+        self._opened = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            failure_threshold=int(os.getenv("GROQ_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("GROQ_BREAKER_RESET", "30")),
+        )
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self):
+        """True if a call may go ahead now, or TRIAL (also true) for the half-open trial call."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return self.TRIAL
+            self._rejected += 1
+            return False
+
+    def retry_after(self):
+        """Seconds until the next trial call, or None if the circuit is closed."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return None
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        Frees the trial slot after a trial call ended with no outcome, e.g.
+        cancelled or its stream abandoned, so the next call can be the trial.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._opened += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self._opened,
+                "rejected_calls": self._rejected,
+            }
+
+
+# One connection pool per process, shared by every Groq client it creates
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def _pool_settings(max_connections=None):
+    max_connections = max_connections or int(os.getenv("GROQ_MAX_CONNECTIONS", "20"))
+    return {
+        "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        "timeout": httpx.Timeout(float(os.getenv("GROQ_TIMEOUT", "20")), connect=5.0),
+    }
+
+
+def shared_http_client(max_connections=None):
+    """Returns the process-wide pooled httpx client, creating it on first use."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(**_pool_settings(max_connections))
+        return _http_client
+
+
+def reset_http_client():
+    """
+    Drops the pool inherited from a parent process without closing it, since
+    its sockets are still the parent's. Call in a forked worker, then rebuild
+    clients (GroqService.reconnect).
+    """
+    global _http_client, _http_client_lock
+    _http_client = None
+    _http_client_lock = threading.Lock()
+
+
+def build_groq_client(api_key, base_url=None):
+    """
+    Groq client on the shared connection pool. The SDK's own retries are off;
+    GroqTransport retries within the call deadline instead. base_url (or
+    GROQ_BASE_URL) points the client at another server, e.g. a local fake.
+    """
+    return groq.Groq(
+        api_key=api_key,
+        base_url=base_url or os.getenv("GROQ_BASE_URL") or None,
+        http_client=shared_http_client(),
+        max_retries=0,
+    )
+
+
+def build_async_groq_client(api_key, base_url=None, max_connections=None):
+    """
+    AsyncGroq client with its own pooled httpx.AsyncClient. Async pools belong
+    to one event loop, so build one per loop rather than sharing it.
+    GROQ_MAX_CONNECTIONS should be raised to keep hundreds of calls in flight.
+    """
+    return groq.AsyncGroq(
+        api_key=api_key,
+        base_url=base_url or os.getenv("GROQ_BASE_URL") or None,
+        http_client=httpx.AsyncClient(**_pool_settings(max_connections)),
+        max_retries=0,
+    )
+
+
+class GroqTransport:
+    """
+    Wraps a Groq-compatible client's chat.completions.create with a per-call
+    deadline, jittered exponential backoff on 429/5xx/timeouts and a circuit
+    breaker. Service failures are raised as LLMError; other exceptions (bugs
+    in our own code) propagate unchanged and leave the breaker alone.
+
+    Each attempt gets at most attempt_timeout seconds and all attempts
+    together at most deadline seconds. A Retry-After header is honoured when
+    it fits in the remaining time.
+    """
+
+    def __init__(self, client, breaker=None, deadline=45.0, attempt_timeout=20.0, max_attempts=3,
+                 backoff_base=0.5, backoff_max=4.0, sleep=time.sleep):
+        self.client = client
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._retries = 0
+        self._failures = 0
+
+    @classmethod
+    def from_env(cls, client, breaker=None):
+        return cls(
+            client,
+            breaker=breaker if breaker is not None else CircuitBreaker.from_env(),
+            deadline=float(os.getenv("GROQ_DEADLINE", "45")),
+            attempt_timeout=float(os.getenv("GROQ_TIMEOUT", "20")),
+            max_attempts=int(os.getenv("GROQ_MAX_ATTEMPTS", "3")),
+        )
+
+    def create(self, **kwargs):
+        """
+        chat.completions.create with retries; returns the response or, with
+        stream=True, an iterator over the stream whose outcome (read to the
+        end, or broken off) is what the breaker records.
+        """
+        give_up_at, permit = self._begin()
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                try:
+                    response = self.client.chat.completions.create(timeout=self._attempt_timeout(give_up_at), **kwargs)
+                except Exception as e:
+                    delay = self._after_failure(e, attempt, give_up_at, permit)
+                else:
+                    if kwargs.get("stream"):
+                        return self._watch_stream(response, permit)
+                    self.breaker.record_success()
+                    return response
+                self._sleep(delay)
+        except LLMError:
+            # _after_failure has recorded the outcome
+            raise
+        except BaseException:
+            self._abandon(permit)
+            raise
+
+    def _watch_stream(self, stream, permit):
+        try:
+            yield from stream
+        except Exception as e:
+            self._record_stream_failure(e, permit)
+            raise
+        except BaseException:
+            self._abandon(permit)
+            raise
+        self.breaker.record_success()
+
+    def _begin(self):
+        """Checks the call may go ahead; returns its give-up time and the breaker's permit."""
+        if self.client is None:
+            raise LLMError(ERROR_MISSING_KEY, "Groq API Key is missing.")
+        permit = self.breaker.allow()
+        if not permit:
+            raise LLMError(ERROR_CIRCUIT_OPEN, "The style service is temporarily unavailable",
+                           retry_after=self.breaker.retry_after())
+        with self._lock:
+            self._calls += 1
+        return time.monotonic() + self.deadline, permit
+
+    def _abandon(self, permit):
+        # Cancelled, interrupted or rejected as a bad request: there's no
+        # health outcome to record, but a half-open trial must not keep the
+        # circuit shut for good
+        if permit == CircuitBreaker.TRIAL:
+            self.breaker.release_trial()
+
+    def _record_stream_failure(self, exception, permit):
+        """Counts a stream that broke off partway like a failed call."""
+        try:
+            error = classify_error(exception)
+        except Exception:
+            # Not the service's failure; the stream re-raises it as it is
+            self._abandon(permit)
+            return
+        if error.kind in RETRYABLE_ERRORS:
+            self.breaker.record_failure()
+            with self._lock:
+                self._failures += 1
+        else:
+            self._abandon(permit)
+
+    def _attempt_timeout(self, give_up_at):
+        return max(0.1, min(self.attempt_timeout, give_up_at - time.monotonic()))
+
+    def _after_failure(self, exception, attempt, give_up_at, permit):
+        """Returns the delay before the next attempt, or raises the LLMError."""
+        error = classify_error(exception)
+        if error.kind not in RETRYABLE_ERRORS:
+            # The request itself was bad, which says nothing about the
+            # service's health: free a trial slot but leave the state alone
+            self._abandon(permit)
+            raise error
+
+        delay = self._backoff(attempt, error.retry_after)
+        if attempt >= self.max_attempts or time.monotonic() + delay >= give_up_at:
+            self.breaker.record_failure()
+            with self._lock:
+                self._failures += 1
+            raise error
+
+        log.warning("groq_retry", error_kind=error.kind, delay_s=round(delay, 2),
+                    attempt=attempt + 1, max_attempts=self.max_attempts)
+        with self._lock:
+            self._retries += 1
+        return delay
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        # Full jitter keeps workers that failed together from retrying together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def stats(self):
+        with self._lock:
+            stats = {"calls": self._calls, "retries": self._retries, "failures": self._failures}
+        stats["breaker"] = self.breaker.stats()
+        return stats
+
+
+class AsyncGroqTransport(GroqTransport):
+    """GroqTransport for async clients: create() is a coroutine and backoff doesn't block the loop."""
+
+    def __init__(self, client, breaker=None, deadline=45.0, attempt_timeout=20.0, max_attempts=3,
+                 backoff_base=0.5, backoff_max=4.0, sleep=asyncio.sleep):
+        super().__init__(client, breaker, deadline, attempt_timeout, max_attempts, backoff_base, backoff_max, sleep)
+
+    async def create(self, **kwargs):
+        give_up_at, permit = self._begin()
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                try:
+                    response = await self.client.chat.completions.create(
+                        timeout=self._attempt_timeout(give_up_at), **kwargs)
+                except Exception as e:
+                    delay = self._after_failure(e, attempt, give_up_at, permit)
+                else:
+                    if kwargs.get("stream"):
+                        return self._watch_stream(response, permit)
+                    self.breaker.record_success()
+                    return response
+                await self._sleep(delay)
+        except LLMError:
+            raise
+        except BaseException:
+            self._abandon(permit)
+            raise
+
+    async def _watch_stream(self, stream, permit):
+        try:
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            self._record_stream_failure(e, permit)
+            raise
+        except BaseException:
+            self._abandon(permit)
+            raise
+        self.breaker.record_success()
@@ -0,0 +1,29 @@
+"""
+gunicorn settings for the production WSGI server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is loaded once in the master and shared copy-on-write by the
+workers (see wsgi.py). Each worker serves requests on a few threads, so
+requests waiting on the model don't hold up the rest.
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+# The app sizes each worker's CV process pool to its share of the cores
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = True
+# Model calls can take up to GROQ_DEADLINE (45s) and streams longer
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+# Recycle workers now and then, so slow leaks and copied pages don't pile up
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.init_worker()
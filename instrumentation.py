@@ -0,0 +1,374 @@
+"""
+Logging, trace ids and metrics for the app.
+
+    from instrumentation import get_logger
+    log = get_logger(__name__)
+    log.info("analysis_complete", skin_tone=tone, ms=12.5)
+
+Log calls are gated on the level before anything is formatted, so a
+disabled debug() costs a cached level check. Enabled records go through a
+queue and are formatted and written by a background thread, so request
+threads never block on stdout. Every record carries the trace id of the
+request it belongs to (see trace()).
+
+LOG_LEVEL sets the level (default INFO) and LOG_FORMAT picks "text"
+(key=value) or "json" lines.
+
+Histograms and counters are kept per process and rendered in the
+Prometheus text format by render_metrics() for the /metrics endpoint.
+"""
+import asyncio
+import atexit
+import bisect
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+LOGGER_NAME = "styleai"
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id=None):
+    """Tags everything logged inside the block with trace_id (a new one if None)."""
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+def start_trace(trace_id=None):
+    """Sets the trace id for the rest of the current context, e.g. a request; returns it."""
+    trace_id = trace_id or new_trace_id()
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+# Logging
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(f"{key}={_text_value(value)}" for key, value in record.fields.items())
+        line = f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')} {record.levelname:<7} {record.name} {record.msg}"
+        if fields:
+            line += " " + fields
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def _text_value(value):
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, separators=(",", ":"), default=str)
+    text = str(value)
+    return json.dumps(text) if not text or " " in text or "=" in text else text
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.msg,
+        }
+        payload.update(record.fields)
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are; formatting happens on the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+_listener = None
+_output = None
+_setup_lock = threading.Lock()
+
+
+def configure_logging(level=None, fmt=None, stream=None):
+    """(Re)configures the styleai loggers; called on import with LOG_LEVEL and LOG_FORMAT."""
+    global _listener, _output
+    level = (level or os.getenv("LOG_LEVEL") or "INFO").upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT") or "text").lower()
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+        _output = logging.StreamHandler(stream or sys.stderr)
+        _output.setFormatter(_JsonFormatter() if fmt == "json" else _TextFormatter())
+        records = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(records, _output)
+        _listener.start()
+        _set_handler(_DeferredQueueHandler(records))
+        logging.getLogger(LOGGER_NAME).setLevel(level)
+
+
+def _set_handler(handler):
+    logger = logging.getLogger(LOGGER_NAME)
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+    logger.addHandler(handler)
+    logger.propagate = False
+
+
+def _stop_logging():
+    """Flushes queued records; later records are written directly."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            _set_handler(_output)
+
+
+def _write_directly_in_child():
+    # A forked child inherits the queue but not the thread draining it
+    global _listener
+    _listener = None
+    if _output is not None:
+        _set_handler(_output)
+
+
+class StructLogger:
+    """Logger taking an event name plus keyword fields, e.g. log.info("cache_hit", key=key)."""
+
+    def __init__(self, name):
+        self._logger = logging.getLogger(name)
+
+    def is_enabled(self, level):
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level, event, fields, exc_info=None):
+        trace_id = _trace_id.get()
+        if trace_id is not None:
+            fields = dict(fields, trace_id=trace_id)
+        record = self._logger.makeRecord(self._logger.name, level, "", 0, event, None, exc_info)
+        record.fields = fields
+        self._logger.handle(record)
+
+    def debug(self, event, **fields):
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        if self._logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, event, fields)
+
+    def error(self, event, exc_info=False, **fields):
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, event, fields, sys.exc_info() if exc_info else None)
+
+
+def get_logger(name):
+    """A StructLogger under the styleai namespace, e.g. get_logger(__name__)."""
+    return StructLogger(f"{LOGGER_NAME}.{name}" if name and name != LOGGER_NAME else LOGGER_NAME)
+
+
+configure_logging()
+atexit.register(_stop_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_write_directly_in_child)
+
+
+# Metrics
+
+# Seconds; fine-grained at the low end for CV stages, up to a minute for LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key, extra=None):
+        pairs = list(zip(self.labels, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines += self._render_series(series)
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, series):
+        return [f"{self.name}_total{self._label_text(key)} {value}" for key, value in series]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (plus +Inf), then sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the wall time of the block. If the histogram has an
+        "outcome" label it is set to "ok", the error's kind or class name,
+        or "abandoned" for a closed generator or cancelled task.
+        """
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except (GeneratorExit, asyncio.CancelledError):
+            outcome = "abandoned"
+            raise
+        except BaseException as e:
+            outcome = getattr(e, "kind", None) or type(e).__name__
+            raise
+        finally:
+            if "outcome" in self.labels:
+                labels = dict(labels, outcome=outcome)
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels):
+        """{"count", "sum"} for one label set."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if series is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": sum(series[0]), "sum": series[1]}
+
+    def _render_series(self, series):
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {total}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+_registry = []
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "styleai_http_request_duration_seconds", "Time to answer an HTTP request.", ("method", "route", "status"))
+STAGE_SECONDS = Histogram(
+    "styleai_analysis_stage_duration_seconds",
+    "Time spent in each image analysis stage (decode, clahe, detect, classify, ...).", ("stage",))
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "styleai_llm_time_to_first_token_seconds", "Time from sending a streaming LLM call to its first text.")
+LLM_SECONDS = Histogram(
+    "styleai_llm_duration_seconds", "Total time of an LLM call, retries included.", ("mode", "outcome"))
+RECOMMENDATIONS = Counter(
+    "styleai_recommendations", "Style guides served, by where they came from.", ("source",))
+
+
+def observe_stages(timings):
+    """Records a result's per-stage timings (ms, as analyze_skin_tone returns them)."""
+    for stage, ms in (timings or {}).items():
+        STAGE_SECONDS.observe(ms / 1000, stage=stage)
+
+
+def render_metrics():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def process_memory():
+    """
+    This process's memory in MiB: rss, plus pss, shared and private where
+    /proc/self/smaps_rollup exists (Linux). Pages shared copy-on-write with
+    a parent count as shared until either side writes to them.
+    """
+    try:
+        with open("/proc/self/smaps_rollup", "r", encoding="ascii") as f:
+            fields = {}
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        try:
+            import resource
+        except ImportError:
+            return {}
+        # Peak rather than current; ru_maxrss is in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"max_rss_mb": round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)}
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1),
+        "private_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+    }
@@ -0,0 +1,287 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from groq_transport import LLMError
+from instrumentation import current_trace_id, get_logger, observe_stages, trace
+from lazy import lazy_import
+
+# OpenCV and NumPy load when the first analysis runs, not when the app imports
+utils = lazy_import("utils")
+
+JOB_QUEUED = "queued"
+JOB_ANALYZING = "analyzing"
+JOB_GENERATING = "generating"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+log = get_logger(__name__)
+
+# Rough share of the work finished when a job enters each state
+JOB_PROGRESS = {
+    JOB_QUEUED: 0,
+    JOB_ANALYZING: 10,
+    JOB_GENERATING: 50,
+    JOB_DONE: 100,
+    JOB_FAILED: 100,
+}
+
+def default_cv_workers():
+    """
+    This process's share of the CPU cores: os.cpu_count() divided by the
+    number of web workers (WEB_CONCURRENCY, which gunicorn.conf.py sets),
+    at least one, so N workers don't start N x cpu_count CV processes.
+    """
+    web_workers = max(1, int(os.getenv("WEB_CONCURRENCY") or 1))
+    return max(1, (os.cpu_count() or 1) // web_workers)
+
+def warm_up_cv_worker():
+    """CV process pool initializer: loads the detector in the worker without importing utils in the parent."""
+    utils.warm_up_detectors()
+
+
+class QueueFullError(RuntimeError):
+    """Raised by JobManager.submit when max_pending jobs are already in flight."""
+
+
+class JobManager:
+    """
+    Runs analyses in the background so uploads return right away with a job id.
+
+    CV work is CPU-bound and goes to a process pool (cv_workers=0 runs it on
+    threads instead), sized by default to this web worker's share of the
+    cores. The LLM call is I/O-bound and goes to a thread pool.
+    At most max_pending jobs can be in flight; beyond that submit() raises
+    QueueFullError so the caller can answer 429.
+
+    Jobs are held in this process's memory, so status polling must reach the
+    same worker that accepted the upload.
+    """
+
+    def __init__(self, llm_service, product_lookup, analysis_cache=None, cv_workers=None,
+                 llm_workers=8, max_pending=32, result_ttl=600):
+        self.llm_service = llm_service
+        self.product_lookup = product_lookup
+        self.analysis_cache = analysis_cache
+        self.cv_workers = default_cv_workers() if cv_workers is None else cv_workers
+        self.llm_workers = llm_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._cv_pool = None
+        self._llm_pool = None
+
+    @classmethod
+    def from_env(cls, llm_service, product_lookup, analysis_cache=None):
+        cv_workers = os.getenv("JOB_CV_WORKERS")
+        return cls(
+            llm_service,
+            product_lookup,
+            analysis_cache=analysis_cache,
+            cv_workers=int(cv_workers) if cv_workers else None,
+            llm_workers=int(os.getenv("JOB_LLM_WORKERS", "8")),
+            max_pending=int(os.getenv("JOB_MAX_PENDING", "32")),
+            result_ttl=int(os.getenv("JOB_RESULT_TTL", "600")),
+        )
+
+    def submit(self, image_bytes, gender):
+        """Queues an analysis and returns its job id."""
+        with self._lock:
+            self._expire_finished()
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"{self._pending} analyses already in progress")
+            self._pending += 1
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": JOB_QUEUED,
+                "progress": JOB_PROGRESS[JOB_QUEUED],
+                "gender": gender,
+                "result": None,
+                "error": None,
+                "error_info": None,
+                "finished": False,
+                "created_at": now,
+                "updated_at": now,
+                # Logs from the worker threads carry the submitting request's trace id
+                "trace_id": current_trace_id(),
+            }
+
+        self._ensure_pools()
+        self._update(job_id, JOB_ANALYZING)
+
+        # Repeat uploads skip the CV pool entirely
+        cache_keys = None
+        if self.analysis_cache is not None:
+            cache_keys = self.analysis_cache.keys_for(image_bytes)
+            cached = self.analysis_cache.get(*cache_keys)
+            if cached is not None:
+                self._on_analysis(job_id, gender, cached)
+                return job_id
+
+        try:
+            future = self.submit_cv(utils.analyze_image_bytes, image_bytes)
+        except Exception as e:
+            self._finish(job_id, error=f"Error processing image: {str(e)}")
+            raise
+        future.add_done_callback(lambda f: self._on_analysis_done(job_id, gender, f, cache_keys))
+        return job_id
+
+    def get(self, job_id):
+        """Returns a copy of the job's public state, or None if unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {"pending": self._pending, "max_pending": self.max_pending, "jobs": counts}
+
+    def cv_pool(self):
+        """The bounded CV executor jobs run on, for other CPU work that should share it."""
+        self._ensure_pools()
+        return self._cv_pool
+
+    def replace_broken_cv_pool(self, broken):
+        """
+        Swaps in a fresh CV executor after a worker process died and broke
+        this one. A no-op if another caller has already replaced it.
+        """
+        with self._lock:
+            if self._cv_pool is not broken:
+                return
+            self._cv_pool = None
+        log.warning("cv_pool_replaced", reason="broken process pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._ensure_pools()
+
+    def submit_cv(self, fn, *args):
+        """
+        Submits fn(*args) to the CV pool. A crashed or OOM-killed worker
+        breaks the whole executor for good, so a broken pool is replaced and
+        the submit retried once.
+        """
+        pool = self.cv_pool()
+        try:
+            return pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self.replace_broken_cv_pool(pool)
+            return self.cv_pool().submit(fn, *args)
+
+    def shutdown(self, wait=True):
+        for pool in (self._cv_pool, self._llm_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait)
+        self._cv_pool = self._llm_pool = None
+
+    def _ensure_pools(self):
+        # Created on first use so importing the app never forks
+        with self._lock:
+            if self._cv_pool is None:
+                if self.cv_workers > 0:
+                    self._cv_pool = ProcessPoolExecutor(max_workers=self.cv_workers, initializer=warm_up_cv_worker)
+                else:
+                    self._cv_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cv")
+            if self._llm_pool is None:
+                self._llm_pool = ThreadPoolExecutor(max_workers=self.llm_workers, thread_name_prefix="llm")
+
+    def _on_analysis_done(self, job_id, gender, future, cache_keys=None):
+        # concurrent.futures swallows exceptions from done callbacks, which
+        # would leave the job analyzing and its pending slot taken forever
+        try:
+            analysis = future.result()
+        except Exception as e:
+            self._finish(job_id, error=f"Error processing image: {str(e)}")
+            return
+        try:
+            # Metrics and the cache are best effort; the job goes on without them
+            observe_stages(analysis.get("timings"))
+            if cache_keys is not None and analysis["success"]:
+                self.analysis_cache.put(*cache_keys, analysis)
+        except Exception as e:
+            log.warning("job_analysis_record_failed", exc_info=True, job_id=job_id, error=str(e))
+        try:
+            self._on_analysis(job_id, gender, analysis)
+        except Exception as e:
+            log.error("job_dispatch_failed", exc_info=True, job_id=job_id, error=str(e))
+            self._finish(job_id, error=f"Error processing image: {str(e)}")
+
+    def _on_analysis(self, job_id, gender, analysis):
+        if not analysis["success"]:
+            self._finish(job_id, error=analysis["message"])
+            return
+
+        self._update(job_id, JOB_GENERATING)
+        try:
+            self._llm_pool.submit(self._generate, job_id, gender, analysis)
+        except RuntimeError as e:
+            # Pool already shut down
+            self._finish(job_id, error=str(e))
+
+    def _generate(self, job_id, gender, analysis):
+        with self._lock:
+            trace_id = self._jobs.get(job_id, {}).get("trace_id")
+        with trace(trace_id):
+            self._generate_traced(job_id, gender, analysis)
+
+    def _generate_traced(self, job_id, gender, analysis):
+        try:
+            skin_tone = analysis["skin_tone"]
+            face_shape = analysis.get("face_shape", "Oval")
+            recommendations = self.llm_service.get_fashion_recommendations(skin_tone, gender, face_shape)
+            r, g, b = analysis["average_color"]
+            self._finish(job_id, result={
+                "success": True,
+                "skin_tone": skin_tone,
+                "face_shape": face_shape,
+                "average_color": f"rgb({r},{g},{b})",
+                "gender": gender,
+                "recommendations": recommendations,
+                "products": self.product_lookup(skin_tone, gender, guide=recommendations),
+            })
+        except LLMError as e:
+            self._finish(job_id, error=f"Error generating recommendations: {e.message}", error_info=e.to_dict())
+        except Exception as e:
+            log.error("job_generation_failed", exc_info=True, job_id=job_id, error=str(e))
+            self._finish(job_id, error=f"Error generating recommendations: {str(e)}")
+
+    def _update(self, job_id, status):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job["finished"]:
+                job["status"] = status
+                job["progress"] = JOB_PROGRESS[status]
+                job["updated_at"] = time.time()
+
+    def _finish(self, job_id, result=None, error=None, error_info=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # Only finished jobs expire, so a missing job was already counted
+            if job is None or job["finished"]:
+                return
+            job["finished"] = True
+            self._pending -= 1
+            job["status"] = JOB_FAILED if error else JOB_DONE
+            job["progress"] = JOB_PROGRESS[job["status"]]
+            job["result"] = result
+            job["error"] = error
+            job["error_info"] = error_info
+            job["updated_at"] = time.time()
+
+    def _expire_finished(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished"] and job["updated_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
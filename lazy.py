@@ -0,0 +1,80 @@
+"""
+Deferred imports and objects, so importing the app doesn't pay for OpenCV,
+NumPy, PIL or the Groq SDK before a request needs them.
+
+    np = lazy_import("numpy")                            # imported on first attribute access
+    catalogue = LazyObject(CatalogueManager.from_env)    # built on first attribute access
+
+Both are safe to touch from several threads at once. app.warm_up() resolves
+everything ahead of traffic.
+"""
+import importlib
+import sys
+import threading
+
+
+class LazyModule:
+    """Stands in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        object.__setattr__(self, "_lazy_name", name)
+
+    def __getattr__(self, attr):
+        # import_module is thread-safe and returns the cached module after the first call
+        value = getattr(importlib.import_module(self._lazy_name), attr)
+        # Cache on the proxy, so later lookups don't come back through here
+        object.__setattr__(self, attr, value)
+        return value
+
+    def __repr__(self):
+        return f"<lazy module {self._lazy_name!r}{'' if is_loaded(self._lazy_name) else ' (not loaded)'}>"
+
+
+def lazy_import(name):
+    """The module called name, or a LazyModule for it if it hasn't been imported yet."""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def is_loaded(name):
+    return name in sys.modules
+
+
+class LazyObject:
+    """
+    Stands in for the object factory() returns, built on first attribute
+    access. Attribute reads and writes go to that object.
+    """
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_lazy_factory", factory)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+        object.__setattr__(self, "_lazy_value", None)
+
+    def _resolve(self):
+        value = self._lazy_value
+        if value is None:
+            with self._lazy_lock:
+                value = self._lazy_value
+                if value is None:
+                    value = self._lazy_factory()
+                    object.__setattr__(self, "_lazy_value", value)
+        return value
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._resolve(), attr, value)
+
+    def __repr__(self):
+        value = self._lazy_value
+        return f"<lazy {value!r}>" if value is not None else f"<lazy {self._lazy_factory!r} (not built)>"
+
+
+def resolve(value):
+    """The object behind a LazyObject, building it if needed; anything else as is."""
+    return value._resolve() if isinstance(value, LazyObject) else value
+
+
+def is_resolved(value):
+    return not isinstance(value, LazyObject) or value._lazy_value is not None
@@ -0,0 +1,83 @@
+"""
+Generates a style guide for every (skin_tone, gender, face_shape) profile and
+writes them to the recommendation store artifact that GroqService serves from.
+
+    python precompute_recommendations.py [--output PATH] [--workers N] [--stub]
+
+The artifact is checkpointed after every guide, so an interrupted run resumes
+where it stopped. Use --force to regenerate everything. --stub runs offline
+and needs its own --output; its artifact is marked with the stub model, so
+the app refuses to load it.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from groq_client import GroqService, MODEL
+from recommendation_cache import RecommendationCache
+from recommendation_store import (
+    ArtifactWriter,
+    DEFAULT_STORE_PATH,
+    RecommendationStore,
+    all_profiles,
+    profile_key,
+)
+
+
+def precompute(service, output_path, workers=4, force=False, model=MODEL):
+    """Fills the artifact at output_path. Returns (generated, skipped, failed) counts."""
+    writer = ArtifactWriter(output_path, model, service.prompt.version)
+    pending = [
+        profile for profile in all_profiles()
+        if force or not writer.has(profile_key(*profile))
+    ]
+    skipped = len(all_profiles()) - len(pending)
+    print(f"🗂️  {len(pending)} profiles to generate, {skipped} already in {output_path}")
+
+    generated = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(service.generate_guide, *profile): profile for profile in pending}
+        for future in as_completed(futures):
+            profile = futures[future]
+            try:
+                writer.add(profile_key(*profile), future.result())
+                generated += 1
+                print(f"  ✅ [{generated + failed}/{len(pending)}] {' / '.join(profile)}")
+            except Exception as e:
+                failed += 1
+                print(f"  ❌ [{generated + failed}/{len(pending)}] {' / '.join(profile)}: {str(e)}")
+    return generated, skipped, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    default_output = os.getenv("RECOMMENDATION_STORE_PATH", DEFAULT_STORE_PATH)
+    parser.add_argument("--output", help=f"Artifact path (default: {default_output}; required with --stub)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent Groq requests (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="Regenerate guides that already exist")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub client instead of Groq")
+    args = parser.parse_args(argv)
+
+    client, model = None, MODEL
+    if args.stub:
+        if not args.output or os.path.abspath(args.output) == os.path.abspath(default_output):
+            parser.error("--stub needs an --output other than the store the app serves from")
+        from stub_llm import STUB_MODEL, StubGroqClient
+        client, model = StubGroqClient(), STUB_MODEL
+
+    # The artifact is being built, so never serve from it or from the cache here
+    service = GroqService(cache=RecommendationCache(max_entries=0), store=RecommendationStore(), client=client)
+    if not service.client:
+        print("❌ GROQ_API_KEY is not set. Use --stub for an offline run.")
+        return 1
+
+    start = time.perf_counter()
+    generated, skipped, failed = precompute(service, args.output or default_output, args.workers, args.force, model)
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s: {generated} generated, {skipped} skipped, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
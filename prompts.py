@@ -0,0 +1,208 @@
+"""
+Style guide prompts. Everything that doesn't depend on the user lives in the
+system message, which is built once per mode and sent byte-for-byte the same
+on every call so the provider can reuse its cached prefix. Only the short
+profile message at the end changes between requests.
+"""
+import os
+import threading
+
+# Bump whenever the prompt text changes so stale precomputed guides are ignored
+PROMPT_VERSION = 2
+
+PROMPT_MODES = ("full", "compact")
+
+# Rough size of a token in English markdown, for budgets and estimates
+CHARS_PER_TOKEN = 4
+WORDS_PER_TOKEN = 0.75
+# Headings, bullets and links cost tokens on top of the section budgets
+FORMAT_OVERHEAD_TOKENS = 150
+
+PERSONA = (
+    "You are StyleAI, a professional fashion stylist and personal grooming consultant "
+    "with expertise in face shapes, skin tone matching, and personalized styling."
+)
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class PromptSection:
+    """
+    One "### N. Title" section of the guide. budget is its share of the
+    completion in tokens; compact_budget is its share in compact mode, or
+    None to leave it out there.
+    """
+
+    def __init__(self, title, instructions, budget, compact_budget=None):
+        self.title = title
+        self.instructions = instructions
+        self.budget = budget
+        self.compact_budget = compact_budget
+
+    def budget_for(self, mode):
+        return self.budget if mode == "full" else self.compact_budget
+
+
+SECTIONS = (
+    PromptSection("Analysis", """\
+- Explain why specific colors and styles work for the user's skin tone.
+- Mention how their face shape influences styling choices.""", 250),
+    PromptSection("Hairstyle Recommendations", """\
+For the user's face shape and gender:
+- **Short Hair:** 1-2 style suggestions with descriptions
+- **Medium Hair:** 1-2 style suggestions with descriptions
+- **Long Hair:** 1-2 style suggestions with descriptions
+- **Styling Tips:** Best practices for hair care and styling""", 450, 250),
+    PromptSection("Color Palette", """\
+- **Primary Colors:** Best main colors for outfits.
+- **Secondary Colors:** Complementary colors.
+- **Avoid:** Colors that might wash out or clash with the skin tone.""", 200, 150),
+    PromptSection("Clothing Type Recommendations", """\
+- **Body Type Friendly Fits:** Suggest clothing fits that work well for the user's gender
+- **Best Fabrics:** Lightweight, medium-weight, heavy fabrics recommendations
+- **Patterns & Prints:** Best patterns for the skin tone""", 300),
+    PromptSection("Outfit Recommendations (Gender-Specific)", """\
+Provide 3 distinct outfit ideas (Casual, Business/Formal, Party/Event):
+- **Casual:** Clothing type, colors, shoes, accessories suited to the face shape
+- **Business/Formal:** Clothing type, suit/style, shoes, and professional look
+- **Party:** Outfit type, colors, and special occasion styling""", 450, 300),
+    PromptSection("Grooming & Accessories", """\
+- **Hairstyle:** Specific suggestions for the face shape and skin tone
+- **Makeup (if applicable):** Colors that enhance features
+- **Accessories:** Jewelry metals (Gold/Silver/Rose Gold), glasses recommendations, based on face shape
+- **Eyebrow Shape:** Best suited for the face shape""", 350),
+    PromptSection("Shopping Guide", """\
+For each outfit recommendation above, provide specific search terms to find these items on Amazon.in, Myntra, and Zara.
+Format them as:
+- *Casual Look:* [Search for White Linen Shirt on Amazon.in](https://www.amazon.in/s?k=white+linen+shirt)
+- *Casual Look:* [Search for White Linen Shirt on Myntra](https://www.myntra.com/search?query=white+linen+shirt)
+- *Casual Look:* [Search for White Linen Shirt on Zara](https://www.zara.com/in/en/search?searchTerm=white+linen+shirt)""",
+                  500, 350),
+)
+
+PROFILE_TEMPLATE = "User Profile:\n- Skin Tone: {skin_tone}\n- Gender: {gender}\n- Face Shape: {face_shape}\n"
+CONTEXT_TEMPLATE = "- Additional Context: {context}\n"
+
+
+class PromptTemplate:
+    """
+    The compiled prompt for one mode. "full" asks for every section; "compact"
+    only for the hairstyle, colour, outfit and shopping sections, with
+    smaller budgets. max_tokens is the sum of the section budgets.
+    """
+
+    def __init__(self, mode="full", sections=SECTIONS):
+        if mode not in PROMPT_MODES:
+            raise ValueError(f"Unknown prompt mode {mode!r}; expected one of {', '.join(PROMPT_MODES)}")
+        self.mode = mode
+        self.sections = [(section, section.budget_for(mode)) for section in sections
+                         if section.budget_for(mode) is not None]
+        self.max_tokens = sum(budget for _, budget in self.sections) + FORMAT_OVERHEAD_TOKENS
+        # Precomputed guides are only reused for the prompt that produced them
+        self.version = PROMPT_VERSION if mode == "full" else f"{PROMPT_VERSION}-{mode}"
+        self.system_prompt = self._compile()
+        self.prefix_tokens = estimate_tokens(self.system_prompt)
+
+    def _compile(self):
+        parts = [
+            PERSONA,
+            "",
+            "Given the user profile in the next message, write a personalized fashion and styling guide.",
+            "Your response MUST be formatted in Markdown and contain exactly these sections, in this order, "
+            "keeping each one within its word limit:",
+        ]
+        for number, (section, budget) in enumerate(self.sections, start=1):
+            words = int(budget * WORDS_PER_TOKEN // 10 * 10)
+            parts += ["", f"### {number}. {section.title}", f"Keep this section under {words} words.", section.instructions]
+        parts += [
+            "",
+            "Please ensure the tone is encouraging, professional, and personalized to the user's "
+            "face shape and skin tone combination.",
+        ]
+        return "\n".join(parts)
+
+    @property
+    def section_titles(self):
+        return [section.title for section, _ in self.sections]
+
+    def messages(self, skin_tone, gender, face_shape="Oval", context=""):
+        profile = PROFILE_TEMPLATE.format(skin_tone=skin_tone, gender=gender, face_shape=face_shape)
+        if context:
+            profile += CONTEXT_TEMPLATE.format(context=context)
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": profile},
+        ]
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "version": self.version,
+            "sections": self.section_titles,
+            "static_prefix_tokens": self.prefix_tokens,
+            "max_tokens": self.max_tokens,
+        }
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(mode=None):
+    """The compiled template for mode (default PROMPT_MODE, else "full"), built once per process."""
+    mode = mode or os.getenv("PROMPT_MODE") or "full"
+    with _templates_lock:
+        template = _templates.get(mode)
+        if template is None:
+            template = _templates[mode] = PromptTemplate(mode)
+        return template
+
+
+class TokenMeter:
+    """
+    Running prompt and completion token counts per model call. Uses the
+    usage the API reports; when a client doesn't report any (e.g. the stub)
+    the counts are estimated from the text and flagged as such.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._estimated = 0
+        self._truncated = 0
+        self._prompt_tokens = 0
+        self._completion_tokens = 0
+        self._last = None
+
+    def record(self, usage, messages, completion, finish_reason=None):
+        """Adds one call and returns its (prompt_tokens, completion_tokens)."""
+        if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+            prompt_tokens, completion_tokens, estimated = usage.prompt_tokens, usage.completion_tokens or 0, False
+        else:
+            prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+            completion_tokens, estimated = estimate_tokens(completion), True
+        with self._lock:
+            self._requests += 1
+            self._estimated += estimated
+            # "length" means the guide hit max_tokens and was cut off
+            self._truncated += finish_reason == "length"
+            self._prompt_tokens += prompt_tokens
+            self._completion_tokens += completion_tokens
+            self._last = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "estimated": estimated}
+        return prompt_tokens, completion_tokens
+
+    def stats(self):
+        with self._lock:
+            requests = self._requests
+            return {
+                "requests": requests,
+                "estimated_requests": self._estimated,
+                "truncated_requests": self._truncated,
+                "prompt_tokens": self._prompt_tokens,
+                "completion_tokens": self._completion_tokens,
+                "avg_prompt_tokens": round(self._prompt_tokens / requests, 1) if requests else 0.0,
+                "avg_completion_tokens": round(self._completion_tokens / requests, 1) if requests else 0.0,
+                "last": self._last,
+            }
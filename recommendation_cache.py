@@ -0,0 +1,157 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+
+class RecommendationCache:
+    """
+    Caches generated style guides keyed by (skin_tone, gender, face_shape, context).
+
+    Entries live in an in-memory LRU with a TTL. When db_path is set they are
+    also written to a SQLite file, which survives restarts and is shared by
+    every worker process on the host.
+
+    With max_variants=1 the first stored guide is always served. With a higher
+    value the first max_variants lookups for a key miss, so the caller can
+    generate a fresh guide each time. After that a random stored variant is served.
+    """
+
+    def __init__(self, max_entries=128, ttl_seconds=86400, db_path=None, max_variants=1):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path or None
+        self.max_variants = max(1, max_variants)
+        self._entries = OrderedDict()  # key -> (created_at, [variants])
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        if self.db_path:
+            self._init_db()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "128")),
+            ttl_seconds=int(os.getenv("RECOMMENDATION_CACHE_TTL", "86400")),
+            db_path=os.getenv("RECOMMENDATION_CACHE_PATH") or None,
+            max_variants=int(os.getenv("RECOMMENDATION_CACHE_VARIANTS", "1")),
+        )
+
+    @staticmethod
+    def make_key(skin_tone, gender, face_shape, context=""):
+        return "|".join([skin_tone, gender, face_shape, (context or "").strip()])
+
+    def get(self, key):
+        """Returns a cached guide, or None if the caller should generate one."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        from_disk = False
+        if self.db_path and (entry is None or len(entry[1]) < self.max_variants):
+            # Another worker may already have stored this key, or more variants of it
+            created_at, variants = self._load_from_disk(key, now)
+            if variants and (entry is None or len(variants) > len(entry[1])):
+                entry = (created_at, variants)
+                from_disk = True
+                with self._lock:
+                    self._store(key, entry)
+
+        with self._lock:
+            if entry is None or len(entry[1]) < self.max_variants:
+                self._misses += 1
+                return None
+            self._hits += 1
+            if from_disk:
+                self._disk_hits += 1
+
+        variants = entry[1]
+        return variants[0] if self.max_variants == 1 else random.choice(variants)
+
+    def put(self, key, text):
+        """Stores a guide as a new variant for key, up to max_variants."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                entry = (now, [])
+            if len(entry[1]) >= self.max_variants:
+                return
+            entry[1].append(text)
+            self._store(key, entry)
+
+        if self.db_path:
+            self._save_to_disk(key, text, now)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM recommendations")
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _init_db(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            # WAL lets several worker processes read while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS recommendations ("
+                "key TEXT NOT NULL, variant INTEGER NOT NULL, text TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (key, variant))"
+            )
+
+    def _load_from_disk(self, key, now):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT text, created_at FROM recommendations WHERE key = ? AND created_at >= ? ORDER BY variant",
+                (key, now - self.ttl_seconds),
+            ).fetchall()
+        if not rows:
+            return now, []
+        return min(row[1] for row in rows), [row[0] for row in rows]
+
+    def _save_to_disk(self, key, text, now):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM recommendations WHERE key = ? AND created_at < ?",
+                (key, now - self.ttl_seconds),
+            )
+            count = conn.execute("SELECT COUNT(*) FROM recommendations WHERE key = ?", (key,)).fetchone()[0]
+            if count < self.max_variants:
+                conn.execute(
+                    "INSERT OR IGNORE INTO recommendations (key, variant, text, created_at) VALUES (?, ?, ?, ?)",
+                    (key, count, text, now),
+                )
@@ -0,0 +1,115 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from itertools import product
+
+from instrumentation import get_logger
+
+SKIN_TONES = ("Fair", "Medium", "Olive", "Deep")
+GENDERS = ("Female", "Male", "Non-Binary")
+FACE_SHAPES = ("Round", "Oval", "Square", "Heart", "Oblong")
+
+ARTIFACT_FORMAT = 1
+DEFAULT_STORE_PATH = os.path.join("recommendations", "style_guides.json")
+
+log = get_logger(__name__)
+
+
+def all_profiles():
+    """Every (skin_tone, gender, face_shape) combination the analyzer can produce."""
+    return list(product(SKIN_TONES, GENDERS, FACE_SHAPES))
+
+
+def profile_key(skin_tone, gender, face_shape):
+    return f"{skin_tone}|{gender}|{face_shape}"
+
+
+def load_artifact(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_artifact(path, artifact):
+    """Writes the artifact atomically so readers never see a half-written file."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".style_guides.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(artifact, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def new_artifact(model, prompt_version):
+    return {
+        "format": ARTIFACT_FORMAT,
+        "model": model,
+        "prompt_version": prompt_version,
+        "generated_at": None,
+        "guides": {},
+    }
+
+
+class RecommendationStore:
+    """
+    Read-only view of a precomputed style-guide artifact, as written by
+    precompute_recommendations.py. An artifact built for a different model or
+    prompt version is ignored, so live calls take over until it is rebuilt.
+    """
+
+    def __init__(self, path=None, model=None, prompt_version=None):
+        self.path = path
+        self.guides = {}
+        artifact = load_artifact(path)
+        if artifact is None:
+            return
+        if (artifact.get("format") != ARTIFACT_FORMAT
+                or artifact.get("model") != model
+                or artifact.get("prompt_version") != prompt_version):
+            log.warning("recommendation_store_stale", path=path, model=artifact.get("model"),
+                        prompt_version=artifact.get("prompt_version"))
+            return
+        self.guides = artifact.get("guides", {})
+        log.info("recommendation_store_loaded", guides=len(self.guides), path=path)
+
+    @classmethod
+    def from_env(cls, model, prompt_version):
+        return cls(os.getenv("RECOMMENDATION_STORE_PATH", DEFAULT_STORE_PATH), model, prompt_version)
+
+    def get(self, skin_tone, gender, face_shape):
+        return self.guides.get(profile_key(skin_tone, gender, face_shape))
+
+    def __len__(self):
+        return len(self.guides)
+
+
+class ArtifactWriter:
+    """Collects generated guides and checkpoints the artifact after each one."""
+
+    def __init__(self, path, model, prompt_version):
+        self.path = path
+        self._lock = threading.Lock()
+        artifact = load_artifact(path)
+        if (artifact is None
+                or artifact.get("format") != ARTIFACT_FORMAT
+                or artifact.get("model") != model
+                or artifact.get("prompt_version") != prompt_version):
+            artifact = new_artifact(model, prompt_version)
+        self.artifact = artifact
+
+    def has(self, key):
+        with self._lock:
+            return key in self.artifact["guides"]
+
+    def add(self, key, text):
+        with self._lock:
+            self.artifact["guides"][key] = text
+            self.artifact["generated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            write_artifact(self.path, self.artifact)
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+
+
+class FlightAbandoned(Exception):
+    """Given to followers when the leader gave up before producing a result; retry the call."""
+
+
+class _Call:
+    """One in-flight upstream call that followers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for the in-flight call")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _FlightStats:
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._leaders = 0
+        self._coalesced = 0
+
+    def _count(self, leader):
+        with self._stats_lock:
+            if leader:
+                self._leaders += 1
+            else:
+                self._coalesced += 1
+
+    def stats(self):
+        with self._stats_lock:
+            callers = self._leaders + self._coalesced
+            return {
+                "upstream_calls": self._leaders,
+                "coalesced_calls": self._coalesced,
+                "coalesce_rate": round(self._coalesced / callers, 3) if callers else 0.0,
+                "in_flight": len(self._calls),
+            }
+
+
+class SingleFlight(_FlightStats):
+    """
+    Coalesces concurrent calls with the same key: the first caller (the
+    leader) runs the work, and callers arriving while it is in flight wait
+    and get its result, or its exception. Once the call finishes the key is
+    free again, so nothing is cached here.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None):
+        """Returns fn(), shared with any concurrent do() for the same key."""
+        call, leader = self.begin(key)
+        if not leader:
+            return call.wait(timeout)
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def begin(self, key):
+        """
+        Joins the flight for key. Returns (call, leader); a leader must call
+        finish() exactly once, followers call call.wait(). For work that
+        doesn't fit in one function, such as a stream.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        self._count(leader)
+        return call, leader
+
+    def finish(self, key, call, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call.done.set()
+
+
+class AsyncSingleFlight(_FlightStats):
+    """
+    SingleFlight for coroutines on one event loop. The work runs in its own
+    task, so a leader that gets cancelled (e.g. its client disconnected)
+    doesn't cancel it for everyone else.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._calls = {}
+
+    async def do(self, key, coro_fn):
+        """Awaits coro_fn(), shared with any concurrent do() for the same key."""
+        task = self._calls.get(key)
+        self._count(task is None)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda t: self._release(key, t))
+        return await asyncio.shield(task)
+
+    def begin(self, key):
+        """As SingleFlight.begin, with an asyncio.Future followers await."""
+        future = self._calls.get(key)
+        leader = future is None
+        if leader:
+            future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self._count(leader)
+        return future, leader
+
+    def finish(self, key, future, result=None, error=None):
+        self._release(key, future)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        # Mark the exception retrieved so an unawaited flight isn't logged
+        future.exception()
+
+    def _release(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
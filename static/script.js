@@ -279,27 +279,13 @@ document.addEventListener('DOMContentLoaded', function() {
         formData.append('gender', gender);
 
         try {
-            const response = await fetch('/api/analyze', {
-                method: 'POST',
-                body: formData
-            });
-
-            const data = await response.json();
-
-            if (data.success) {
-                displayResults(data);
-                showAlert('Analysis complete! Check your personalized style guide below.', 'success');
-            } else {
-                showAlert(data.message || 'An error occurred', 'danger');
-            }
-            
-            loadingContainer.classList.remove('show');
+            await analyzeStreaming(formData);
         } catch (error) {
             const errorMsg = error.message || 'Server error. Please try again.';
             showAlert(errorMsg, 'danger');
             console.error('Error:', error);
-            loadingContainer.classList.remove('show');
         } finally {
+            loadingContainer.classList.remove('show');
             // Re-enable submit button
             submitBtn.disabled = false;
             spinner.classList.remove('show');
@@ -307,6 +293,91 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Posts the photo to the streaming endpoint and renders each server-sent
+    // event as it arrives, so the guide appears while it is being written.
+    async function analyzeStreaming(formData) {
+        const response = await fetch('/api/analyze/stream', {
+            method: 'POST',
+            body: formData
+        });
+
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('text/event-stream')) {
+            // Validation and analysis errors come back as plain JSON
+            const data = await response.json();
+            showAlert(data.message || 'An error occurred', 'danger');
+            return;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let markdown = '';
+        let renderScheduled = false;
+
+        const scheduleRender = () => {
+            if (renderScheduled) return;
+            renderScheduled = true;
+            requestAnimationFrame(() => {
+                renderScheduled = false;
+                displayRecommendations(markdown);
+            });
+        };
+
+        const handleEvent = (event, data) => {
+            switch (event) {
+                case 'analysis':
+                    displayAnalysis(data);
+                    displayRecommendations('');
+                    loadingContainer.classList.remove('show');
+                    showResults();
+                    break;
+                case 'products':
+                    displayProducts(data.products);
+                    break;
+                case 'chunk':
+                    markdown += data.text;
+                    scheduleRender();
+                    break;
+                case 'error':
+                    showAlert(data.message || 'An error occurred', 'danger');
+                    break;
+                case 'done':
+                    displayRecommendations(markdown);
+                    showAlert('Analysis complete! Check your personalized style guide below.', 'success');
+                    break;
+            }
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const parsed = parseSseEvent(rawEvent);
+                if (parsed) handleEvent(parsed.event, parsed.data);
+            }
+        }
+    }
+
+    function parseSseEvent(rawEvent) {
+        let event = 'message';
+        const dataLines = [];
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trimStart());
+            }
+        });
+        if (dataLines.length === 0) return null;
+        return { event, data: JSON.parse(dataLines.join('\n')) };
+    }
+
     function showAlert(message, type) {
         const alert = document.createElement('div');
         alert.className = `alert alert-${type} alert-dismissible fade show`;
@@ -320,21 +391,30 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function displayResults(data) {
+        displayAnalysis(data);
+        displayRecommendations(data.recommendations);
+        displayProducts(data.products);
+        showResults();
+    }
+
+    function displayAnalysis(data) {
         // Update skin tone detection
         document.getElementById('skintoneText').textContent = data.skin_tone;
         document.getElementById('colorBox').style.backgroundColor = data.average_color;
 
         // Update face shape detection
         document.getElementById('faceshapeText').textContent = data.face_shape;
+    }
 
-        // Update recommendations
-        const recommendationsHtml = markdownToHtml(data.recommendations);
-        document.getElementById('recommendationsContent').innerHTML = recommendationsHtml;
+    function displayRecommendations(markdown) {
+        document.getElementById('recommendationsContent').innerHTML = markdownToHtml(markdown || '');
+    }
 
+    function displayProducts(products) {
         // Update shopping guide
-        if (data.products && data.products.length > 0) {
+        if (products && products.length > 0) {
             const shoppingGrid = document.getElementById('shoppingGuide');
-            shoppingGrid.innerHTML = data.products.map(product => `
+            shoppingGrid.innerHTML = products.map(product => `
                 <div class="product-card">
                     <div style="font-size: 2rem; margin-bottom: 0.5rem;">👗</div>
                     <h6>${product.name}</h6>
@@ -345,7 +425,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 </div>
             `).join('');
         }
+    }
 
+    function showResults() {
         // Show results, hide placeholder
         resultsContainer.classList.add('show');
         placeholderContainer.style.display = 'none';
@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from prompts import estimate_tokens
+
+# Stamped on artifacts built from the stub, so the app never serves them as real guides
+STUB_MODEL = "stub"
+
+STUB_GUIDE = """### 1. Analysis
+Stub guide for offline runs.
+
+### 7. Shopping Guide
+- *Casual Look:* [Search for White Linen Shirt on Amazon.in](https://www.amazon.in/dp/B000000)
+- *Casual Look:* [Search for White Linen Shirt on Myntra](https://www.myntra.com/white-linen-shirt)
+"""
+
+
+class StubGroqClient:
+    """
+    Offline stand-in for groq.Groq that answers chat completions with a fixed
+    guide after an optional delay. Pass it to GroqService(client=...).
+    With stream=True the guide arrives in chunk_size pieces, chunk_delay apart.
+    """
+
+    def __init__(self, latency=0.0, content=STUB_GUIDE, chunk_size=16, chunk_delay=0.0):
+        self.latency = latency
+        self.content = content
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, messages, model=None, stream=False, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if stream:
+            return self._stream(model)
+        message = SimpleNamespace(role="assistant", content=self.content)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message)])
+
+    def _stream(self, model):
+        for start in range(0, len(self.content), self.chunk_size):
+            if start and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            delta = SimpleNamespace(role="assistant", content=self.content[start:start + self.chunk_size])
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta)])
+
+
+class AsyncStubGroqClient(StubGroqClient):
+    """StubGroqClient for AsyncGroqService: create() is a coroutine and waits with asyncio.sleep."""
+
+    async def _create(self, messages, model=None, stream=False, **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if stream:
+            return self._astream(model)
+        message = SimpleNamespace(role="assistant", content=self.content)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message)])
+
+    async def _astream(self, model):
+        for start in range(0, len(self.content), self.chunk_size):
+            if start and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            delta = SimpleNamespace(role="assistant", content=self.content[start:start + self.chunk_size])
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta)])
+
+
+class FakeGroqServer:
+    """
+    Local HTTP server speaking the Groq chat completions API, for exercising
+    the real SDK, connection pool, retries and circuit breaker offline:
+
+        with FakeGroqServer(failures=[503, 429]) as server:
+            client = groq_transport.build_groq_client("test", base_url=server.url)
+
+    failures lists the HTTP status for each of the first requests; after
+    that every request succeeds. latency delays every response, and
+    retry_after adds a Retry-After header to failures.
+    """
+
+    def __init__(self, content=STUB_GUIDE, failures=(), latency=0.0, retry_after=None, host="127.0.0.1", port=0):
+        self.content = content
+        self.failures = list(failures)
+        self.latency = latency
+        self.retry_after = retry_after
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_status(self):
+        with self._lock:
+            self.requests += 1
+            return self.failures.pop(0) if self.failures else 200
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                status = server._next_status()
+                if server.latency:
+                    time.sleep(server.latency)
+                if status != 200:
+                    headers = {"Retry-After": str(server.retry_after)} if server.retry_after is not None else {}
+                    self._send_json(status, {"error": {"message": f"fake error {status}", "type": "server_error"}}, headers)
+                elif body.get("stream"):
+                    self._send_stream(body.get("model"), self._usage(body))
+                else:
+                    self._send_json(200, {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": server.content}, "finish_reason": "stop"}],
+                        "usage": self._usage(body),
+                    })
+
+            def _usage(self, body):
+                prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in body.get("messages", []))
+                completion_tokens = estimate_tokens(server.content)
+                return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens}
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for start in range(0, len(server.content), 16):
+                    chunk = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": server.content[start:start + 16]}, "finish_reason": None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                # Like Groq, the last chunk carries the finish reason and usage
+                chunk["choices"] = [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                chunk["x_groq"] = {"id": "req-fake", "usage": usage}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake Groq API server (point GROQ_BASE_URL at it)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument("--fail", default="", help="Comma-separated HTTP statuses for the first requests, e.g. 503,429")
+    args = parser.parse_args()
+    failures = [int(status) for status in args.fail.split(",") if status]
+    fake = FakeGroqServer(failures=failures, latency=args.latency, port=args.port)
+    print(f"Fake Groq API on {fake.url} (GROQ_BASE_URL={fake.url})")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,32 @@
+import io
+
+from flask import Request
+
+
+class InMemoryRequest(Request):
+    """
+    Request class that keeps multipart uploads in memory.
+
+    Werkzeug spools any upload over 500 KB to a temporary file, which the
+    analysis then reads back. Here each file is parsed straight into a
+    BytesIO; MAX_CONTENT_LENGTH still bounds the total size and is enforced
+    before the body is read.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
+def read_upload(file_storage):
+    """
+    Returns the upload's bytes without another copy when possible.
+
+    For an in-memory upload BytesIO.getvalue() hands back its internal buffer.
+    Hashing, np.frombuffer and io.BytesIO(data) can then all share that one
+    bytes object.
+    """
+    stream = file_storage.stream
+    if isinstance(stream, io.BytesIO):
+        return stream.getvalue()
+    stream.seek(0)
+    return stream.read()
@@ -1,100 +1,556 @@
 import cv2
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageOps
+import io
+import json
 import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 
-def load_face_cascade():
-    cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+from instrumentation import get_logger
+
+log = get_logger(__name__)
+
+FACE_CASCADE_FILE = 'haarcascade_frontalface_default.xml'
+
+def load_face_cascade(cascade_file=FACE_CASCADE_FILE):
+    # Bare file names come from OpenCV's bundled Haar cascades; paths are used as-is
+    cascade_path = cascade_file if os.path.dirname(cascade_file) else cv2.data.haarcascades + cascade_file
     if not os.path.exists(cascade_path):
-        raise FileNotFoundError(f"Haar cascade not found at {cascade_path}")
+        raise FileNotFoundError(f"Cascade not found at {cascade_path}")
     return cv2.CascadeClassifier(cascade_path)
 
-def detect_face(image_array):
+class DetectorRegistry:
+    """
+    Caches loaded OpenCV classifiers so the cascade XML is parsed once per worker.
+    OpenCV classifiers are not safe to share across threads, so each thread
+    keeps its own copy. Load time and reuse counts are tracked for reporting.
+    """
+    def __init__(self, loader=load_face_cascade):
+        self._loader = loader
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._loads = 0
+        self._load_seconds = 0.0
+        self._reuses = 0
+
+    def get(self, name=FACE_CASCADE_FILE, loader=None):
+        detectors = getattr(self._local, 'detectors', None)
+        if detectors is None:
+            detectors = self._local.detectors = {}
+
+        detector = detectors.get(name)
+        if detector is not None:
+            with self._lock:
+                self._reuses += 1
+            return detector
+
+        start = time.perf_counter()
+        detector = (loader or self._loader)(name)
+        elapsed = time.perf_counter() - start
+        detectors[name] = detector
+        with self._lock:
+            self._loads += 1
+            self._load_seconds += elapsed
+        log.info("detector_loaded", detector=name, ms=round(elapsed * 1000, 1))
+        return detector
+
+    def reset(self):
+        """
+        Forgets every loaded detector, so each thread loads its own again.
+        For forked workers: OpenCV handles shouldn't cross a fork.
+        """
+        self._local = threading.local()
+
+    def warm_up(self, names=(FACE_CASCADE_FILE,)):
+        """Loads the given detectors on the calling thread ahead of the first request."""
+        for name in names:
+            self.get(name)
+        return self.stats()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loads": self._loads,
+                "load_seconds": round(self._load_seconds, 4),
+                "reuses": self._reuses,
+            }
+
+detector_registry = DetectorRegistry()
+
+
+# Coarse-to-fine: the cheapest sweep runs first so a clear face can end the pass early
+DETECTION_SCALE_FACTORS = (1.3, 1.2, 1.15, 1.1)
+DETECTION_MIN_NEIGHBORS = 5
+DETECTION_MIN_SIZE = (50, 50)
+# A detection backed by this many neighbouring hits is treated as confident
+CONFIDENT_NEIGHBORS = 12
+NMS_IOU_THRESHOLD = 0.3
+
+def box_iou_matrix(boxes):
+    """
+    Pairwise intersection-over-union for an (N, 4) array of (x, y, w, h) boxes.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    inter_w = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+    inter_h = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+    inter = inter_w * inter_h
+    union = areas[:, None] + areas[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+def non_max_suppression(boxes, iou_threshold=NMS_IOU_THRESHOLD):
+    """
+    Merges overlapping (x, y, w, h) boxes, keeping the largest of each group.
+    Returns an (M, 4) int array sorted by area, largest first.
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return boxes
+
+    order = np.argsort(-(boxes[:, 2] * boxes[:, 3]), kind='stable')
+    boxes = boxes[order]
+    iou = box_iou_matrix(boxes)
+
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in range(len(boxes)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+    return boxes[keep]
+
+def detect_faces_multiscale(gray, cascade, scale_factors=DETECTION_SCALE_FACTORS,
+                            min_neighbors=DETECTION_MIN_NEIGHBORS, min_size=DETECTION_MIN_SIZE,
+                            confident_neighbors=CONFIDENT_NEIGHBORS):
+    """
+    Runs at most one cascade sweep per scale factor, coarse to fine, and stops
+    as soon as a sweep returns a confident face. Returns the merged boxes as an
+    (N, 4) int array, largest first.
+    """
+    pooled = []
+    for scale_factor in scale_factors:
+        detected, neighbors = cascade.detectMultiScale2(
+            gray, scaleFactor=scale_factor, minNeighbors=min_neighbors, minSize=min_size
+        )
+        if len(detected) == 0:
+            continue
+        pooled.append(np.asarray(detected).reshape(-1, 4))
+        log.debug("faces_at_scale", scale_factor=scale_factor, faces=len(detected))
+        if np.max(neighbors) >= confident_neighbors:
+            break
+
+    if not pooled:
+        return np.empty((0, 4), dtype=np.int64)
+    return non_max_suppression(np.concatenate(pooled))
+
+# Long edge (in pixels) the image is shrunk to before detection.
+# Colour sampling still uses the full-resolution image.
+DETECTION_MAX_EDGE = int(os.getenv("DETECTION_MAX_EDGE", "640"))
+
+@contextmanager
+def stage_timer(timings, stage):
+    """Records the wall time of a block in milliseconds under timings[stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+
+def downscale_for_detection(image, max_edge=DETECTION_MAX_EDGE):
+    """
+    Shrinks an image so its long edge is at most max_edge.
+    Returns (small_image, scale) where scale = small / original.
+    """
+    h, w = image.shape[:2]
+    long_edge = max(h, w)
+    if not max_edge or long_edge <= max_edge:
+        return image, 1.0
+    scale = max_edge / long_edge
+    small = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    return small, scale
+
+def map_box_to_full_resolution(box, scale, image_shape):
+    """Scales an (x, y, w, h) box found on the downscaled image back onto the original."""
+    x, y, w, h = (float(v) / scale for v in box)
+    img_h, img_w = image_shape[:2]
+    x0, y0 = max(0, int(round(x))), max(0, int(round(y)))
+    x1, y1 = min(img_w, int(round(x + w))), min(img_h, int(round(y + h)))
+    return x0, y0, x1 - x0, y1 - y0
+
+class FaceDetector:
+    """
+    Common interface for face detection backends.
+    detect() takes an RGB image already shrunk to the detection resolution and
+    returns an (N, 4) int array of (x, y, w, h) boxes, largest first.
+    """
+    name = "base"
+
+    def detect(self, image_rgb, min_size, timings=None):
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Loads the backend's model on the calling thread."""
+
+class CascadeFaceDetector(FaceDetector):
+    """Haar or LBP cascade run through the single-pass multi-scale sweep."""
+    def __init__(self, name, cascade_file):
+        self.name = name
+        self.cascade_file = cascade_file
+
+    def warm_up(self):
+        detector_registry.get(self.cascade_file)
+
+    def detect(self, image_rgb, min_size, timings=None):
+        with stage_timer(timings, "grayscale"):
+            gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
+
+        # Apply image enhancement for better face detection
+        # Histogram equalization
+        with stage_timer(timings, "clahe"):
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            gray_enhanced = clahe.apply(gray)
+
+        with stage_timer(timings, "detect"):
+            cascade = detector_registry.get(self.cascade_file)
+            return detect_faces_multiscale(gray_enhanced, cascade, min_size=min_size)
+
+class YuNetFaceDetector(FaceDetector):
+    """
+    OpenCV's DNN face detector (cv2.FaceDetectorYN) loaded from a local
+    YuNet ONNX file. CPU only; much better than cascades on rotated or
+    poorly lit selfies.
+    """
+    name = "yunet"
+
+    def __init__(self, model_path, score_threshold=0.7, nms_threshold=0.3):
+        self.model_path = model_path
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+
+    def _load(self, model_path):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"YuNet model not found at {model_path}")
+        return cv2.FaceDetectorYN.create(model_path, "", (320, 320), self.score_threshold, self.nms_threshold)
+
+    def warm_up(self):
+        detector_registry.get(self.model_path, self._load)
+
+    def detect(self, image_rgb, min_size, timings=None):
+        with stage_timer(timings, "grayscale"):
+            bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+
+        with stage_timer(timings, "detect"):
+            detector = detector_registry.get(self.model_path, self._load)
+            h, w = bgr.shape[:2]
+            detector.setInputSize((w, h))
+            _, faces = detector.detect(bgr)
+
+        if faces is None or len(faces) == 0:
+            return np.empty((0, 4), dtype=np.int64)
+        boxes = np.round(faces[:, :4]).astype(np.int64)
+        boxes = boxes[(boxes[:, 2] >= min_size[0]) & (boxes[:, 3] >= min_size[1])]
+        return boxes[np.argsort(-(boxes[:, 2] * boxes[:, 3]), kind='stable')]
+
+class FallbackFaceDetector(FaceDetector):
+    """
+    Wraps a backend whose model is a local file. The first warm-up or detect
+    call loads it; if that fails, this and every later call use the bundled
+    Haar cascade instead, whichever path (server, CLI, pool worker) gets there
+    first.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._checked = False
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def _checked_backend(self):
+        if not self._checked:
+            with self._lock:
+                if not self._checked:
+                    try:
+                        self.backend.warm_up()
+                    except (FileNotFoundError, cv2.error) as e:
+                        log.warning("detector_unavailable", detector=self.backend.name, error=str(e), fallback="haar")
+                        self.backend = build_face_detector("haar")
+                    self._checked = True
+        return self.backend
+
+    def warm_up(self):
+        self._checked_backend().warm_up()
+
+    def detect(self, image_rgb, min_size, timings=None):
+        return self._checked_backend().detect(image_rgb, min_size, timings)
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+def build_face_detector(name, fallback=True):
+    """
+    Creates the detection backend called name: 'haar', 'lbp' or 'yunet'.
+    With fallback, a backend whose model file is missing or unreadable
+    degrades to the Haar cascade (see FallbackFaceDetector).
+    """
+    if name == "haar":
+        return CascadeFaceDetector("haar", FACE_CASCADE_FILE)
+    if name == "lbp":
+        # pip builds of OpenCV don't ship LBP cascades, so this is a local file
+        backend = CascadeFaceDetector("lbp", os.getenv(
+            "LBP_CASCADE_PATH", os.path.join(MODELS_DIR, "lbpcascade_frontalface_improved.xml")))
+    elif name == "yunet":
+        backend = YuNetFaceDetector(os.getenv(
+            "YUNET_MODEL_PATH", os.path.join(MODELS_DIR, "face_detection_yunet_2023mar.onnx")))
+    else:
+        raise ValueError(f"Unknown face detector {name!r}; expected haar, lbp or yunet")
+    return FallbackFaceDetector(backend) if fallback else backend
+
+FACE_DETECTOR_BACKENDS = ("haar", "lbp", "yunet")
+face_detector = build_face_detector(os.getenv("FACE_DETECTOR", "haar"))
+
+def warm_up_detectors():
+    """Preloads the configured face detector (or its Haar fallback). Call once at app startup."""
+    face_detector.warm_up()
+    return detector_registry.stats()
+
+def locate_face(image_array, max_edge=DETECTION_MAX_EDGE, timings=None, detector=None):
+    """
+    Finds the largest face in an RGB image array. Detection runs on a
+    downscaled copy; the returned (x, y, w, h) box is in full-resolution
+    coordinates, or None if no face was found.
+    """
+    detector = detector or face_detector
+    with stage_timer(timings, "downscale"):
+        small, scale = downscale_for_detection(image_array, max_edge)
+
+    # Keep the minimum face size the same fraction of the photo
+    min_side = max(24, int(round(DETECTION_MIN_SIZE[0] * scale)))
+    faces = detector.detect(small, (min_side, min_side), timings)
+
+    log.debug("faces_detected", detector=detector.name, faces=len(faces), shape=image_array.shape)
+
+    if len(faces) == 0:
+        return None
+
+    # Boxes come back largest first
+    return map_box_to_full_resolution(faces[0], scale, image_array.shape)
+
+def detect_face(image_array, max_edge=DETECTION_MAX_EDGE, timings=None):
     """
     Detects face in the image array (RGB) with improved detection sensitivity.
     Returns the face ROI (Region of Interest) or None if no face found.
     """
-    print(f"  📸 Image shape: {image_array.shape}")
-    gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-    
-    # Apply image enhancement for better face detection
-    # Histogram equalization
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    gray_enhanced = clahe.apply(gray)
-    
-    face_cascade = load_face_cascade()
-    
-    # Try multiple scale factors for better detection
-    faces = []
-    for scale_factor in [1.1, 1.15, 1.2, 1.3]:
-        detected = face_cascade.detectMultiScale(gray_enhanced, scale_factor, 5, minSize=(50, 50))
-        if len(detected) > 0:
-            faces.extend(detected)
-            print(f"  🔍 Faces detected at scale {scale_factor}: {len(detected)}")
-    
-    # Remove duplicates
-    if len(faces) > 0:
-        faces = np.array(faces)
-        # Keep only unique faces (remove overlapping detections)
-        unique_faces = []
-        for face in faces:
-            is_duplicate = False
-            for unique_face in unique_faces:
-                # Check if faces overlap
-                x1, y1, w1, h1 = face
-                x2, y2, w2, h2 = unique_face
-                overlap = (abs(x1 - x2) < w1/2) and (abs(y1 - y2) < h1/2)
-                if overlap:
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                unique_faces.append(face)
-        faces = unique_faces
-    
-    print(f"  🔍 Total unique faces detected: {len(faces)}")
-    
-    if len(faces) == 0:
+    box = locate_face(image_array, max_edge, timings)
+    if box is None:
         return None
-    
-    # Return the largest face
-    largest_face = max(faces, key=lambda rect: rect[2] * rect[3])
-    x, y, w, h = largest_face
-    print(f"  ✅ Largest face dimensions: x={x}, y={y}, w={w}, h={h}")
-    
+
+    return crop_face_roi(image_array, box)
+
+def crop_face_roi(image_array, box):
+    """Cuts the inner face region out of a detected (x, y, w, h) box."""
+    x, y, w, h = box
     # Extract slightly smaller region to avoid background/hair
     margin = int(w * 0.15)
     face_roi = image_array[y+margin:y+h-margin, x+margin:x+w-margin]
     return face_roi
 
+# Reference colors for skin tones (Approximate RGB)
+DEFAULT_SKIN_PALETTE = {
+    "Fair": (255, 224, 189),
+    "Medium": (234, 192, 134),
+    "Olive": (198, 145, 95),
+    "Deep": (100, 50, 40)
+}
+
+# sRGB (D65) -> CIE XYZ, and the D65 white point
+_SRGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041]
+], dtype=np.float32)
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+
+def rgb_to_lab(rgb):
+    """
+    Converts an (..., 3) array of 0-255 sRGB values to CIELAB (D65).
+    """
+    c = np.asarray(rgb, dtype=np.float32) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = (linear @ _SRGB_TO_XYZ.T) / _D65_WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
+
+class SkinToneClassifier:
+    """
+    Nearest-reference skin tone classifier using CIE76 ΔE in CIELAB.
+
+    palette maps a shade name to an RGB tuple, or to {"rgb": [...], "tone": ...}
+    when several shades should report one of the app's tone categories
+    (Fair, Medium, Olive, Deep). Any number of shades is supported.
+    """
+    def __init__(self, palette=None):
+        palette = palette or DEFAULT_SKIN_PALETTE
+        self.shades = tuple(palette)
+        self.tones = tuple(
+            entry.get("tone", name) if isinstance(entry, dict) else name
+            for name, entry in palette.items()
+        )
+        rgb = [entry["rgb"] if isinstance(entry, dict) else entry for entry in palette.values()]
+        self.reference_lab = rgb_to_lab(np.array(rgb, dtype=np.float32))
+        self._reference_sq = np.sum(self.reference_lab ** 2, axis=1)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def distances(self, samples):
+        """ΔE from each of N RGB samples to each of K references, as an (N, K) array."""
+        lab = rgb_to_lab(np.asarray(samples, dtype=np.float32).reshape(-1, 3))
+        # |x - p|^2 = |x|^2 + |p|^2 - 2 x.p avoids an (N, K, 3) intermediate
+        sq = np.sum(lab ** 2, axis=1)[:, None] + self._reference_sq[None, :] - 2.0 * (lab @ self.reference_lab.T)
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def classify(self, samples):
+        """
+        Classifies an (N, 3) array of RGB samples in one call.
+        Returns a dict of arrays: 'index', 'shade', 'tone', 'distance' (ΔE to
+        the winner), 'confidence' (0-1, margin over the runner-up) and 'distances'.
+        """
+        distances = self.distances(samples)
+        index = np.argmin(distances, axis=1)
+        rows = np.arange(len(distances))
+        best = distances[rows, index]
+        if distances.shape[1] > 1:
+            runner_up = np.partition(distances, 1, axis=1)[:, 1]
+            confidence = np.where(runner_up > 0, 1.0 - best / np.maximum(runner_up, 1e-6), 0.0)
+        else:
+            confidence = np.ones_like(best)
+        return {
+            "index": index,
+            "shade": np.array(self.shades)[index],
+            "tone": np.array(self.tones)[index],
+            "distance": best,
+            "confidence": confidence,
+            "distances": distances
+        }
+
+_palette_path = os.getenv("SKIN_TONE_PALETTE")
+skin_tone_classifier = SkinToneClassifier.from_file(_palette_path) if _palette_path else SkinToneClassifier()
+
+def classify_skin_tones(samples, classifier=None):
+    """Vectorized classification of many RGB samples (e.g. a batch of faces)."""
+    return (classifier or skin_tone_classifier).classify(samples)
+
+def classify_skin_tone_detailed(rgb_color, classifier=None):
+    """
+    Classifies one RGB color and returns (tone, confidence, {shade: ΔE}).
+    """
+    classifier = classifier or skin_tone_classifier
+    result = classifier.classify([rgb_color])
+    tone = str(result["tone"][0])
+    confidence = float(result["confidence"][0])
+    distances = {shade: round(float(d), 2) for shade, d in zip(classifier.shades, result["distances"][0])}
+    log.debug("skin_tone_classified", rgb=tuple(rgb_color), tone=tone,
+              delta_e=round(float(result["distance"][0]), 1), confidence=round(confidence, 2))
+    return tone, confidence, distances
+
 def classify_skin_tone(rgb_color):
     """
     Classifies skin tone based on the closest match to reference colors.
     rgb_color: tuple (R, G, B)
     """
-    # Reference colors for skin tones (Approximate RGB)
-    references = {
-        "Fair": (255, 224, 189),
-        "Medium": (234, 192, 134),
-        "Olive": (198, 145, 95),
-        "Deep": (100, 50, 40)
-    }
-    
-    min_dist = float('inf')
-    detected_tone = "Medium"
-    
-    r, g, b = rgb_color
-    print(f"  🎨 Average RGB color: ({r}, {g}, {b})")
-    
-    for tone, ref_rgb in references.items():
-        # Euclidean distance
-        dist = np.sqrt((r - ref_rgb[0])**2 + (g - ref_rgb[1])**2 + (b - ref_rgb[2])**2)
-        print(f"    - {tone}: distance = {dist:.2f}")
-        if dist < min_dist:
-            min_dist = dist
-            detected_tone = tone
-    
-    print(f"  🎯 Best match: {detected_tone}")
-    return detected_tone
+    return classify_skin_tone_detailed(rgb_color)[0]
+
+# Skin colour estimation: how the face ROI is reduced to one RGB value
+SKIN_COLOR_METHOD = os.getenv("SKIN_COLOR_METHOD", "median")
+SKIN_COLOR_METHODS = ("mean", "median", "trimmed", "kmeans")
+# The ROI is shrunk to this long edge before masking; colour statistics barely change
+SKIN_SAMPLE_MAX_EDGE = 96
+# Below this share of skin pixels the mask is ignored and the whole ROI is used
+MIN_SKIN_FRACTION = 0.1
+
+# YCrCb skin cluster (Chai & Ngan) and the skin hue band in OpenCV HSV (H is 0-179)
+_SKIN_YCRCB_LOW = np.array([0, 133, 77], dtype=np.uint8)
+_SKIN_YCRCB_HIGH = np.array([255, 173, 127], dtype=np.uint8)
+_SKIN_HSV_LOW = np.array([0, 15, 40], dtype=np.uint8)
+_SKIN_HSV_HIGH = np.array([25, 200, 255], dtype=np.uint8)
+
+def skin_mask(roi_rgb):
+    """
+    Boolean mask of likely skin pixels in an RGB image: inside the YCrCb skin
+    cluster and in the skin hue band. Drops hair, eyes, lips, glasses and most
+    background.
+    """
+    ycrcb = cv2.cvtColor(roi_rgb, cv2.COLOR_RGB2YCrCb)
+    hsv = cv2.cvtColor(roi_rgb, cv2.COLOR_RGB2HSV)
+    mask = cv2.inRange(ycrcb, _SKIN_YCRCB_LOW, _SKIN_YCRCB_HIGH)
+    mask &= cv2.inRange(hsv, _SKIN_HSV_LOW, _SKIN_HSV_HIGH)
+    return mask.astype(bool)
+
+def _trimmed_mean(pixels, trim=0.2):
+    # Drop the darkest and brightest pixels (shadows, specular highlights)
+    luma = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    low, high = np.quantile(luma, [trim, 1 - trim])
+    kept = pixels[(luma >= low) & (luma <= high)]
+    return (kept if len(kept) else pixels).mean(axis=0)
+
+def _dominant_cluster(pixels, k=3, max_samples=2000):
+    if len(pixels) > max_samples:
+        step = len(pixels) // max_samples
+        pixels = pixels[::step]
+    if len(pixels) < k:
+        return pixels.mean(axis=0)
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+    _, labels, centers = cv2.kmeans(pixels, k, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+    return centers[np.bincount(labels.ravel(), minlength=k).argmax()]
+
+def estimate_skin_color(face_roi, method=None, max_edge=SKIN_SAMPLE_MAX_EDGE):
+    """
+    Estimates the skin colour of a face ROI.
+    method: 'mean' (plain ROI mean, the old behaviour), 'median', 'trimmed'
+    (luminance-trimmed mean) or 'kmeans' (centre of the largest cluster).
+    All but 'mean' only use pixels that pass skin_mask.
+    Returns (rgb_tuple, skin_fraction).
+    """
+    method = method or SKIN_COLOR_METHOD
+    if method not in SKIN_COLOR_METHODS:
+        raise ValueError(f"Unknown skin colour method {method!r}; expected one of {SKIN_COLOR_METHODS}")
+
+    h, w = face_roi.shape[:2]
+    if max_edge and max(h, w) > max_edge:
+        scale = max_edge / max(h, w)
+        face_roi = cv2.resize(face_roi, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+    pixels = face_roi.reshape(-1, 3).astype(np.float32)
+    if method == "mean":
+        return tuple(int(c) for c in pixels.mean(axis=0)), 1.0
+
+    mask = skin_mask(face_roi).ravel()
+    skin_fraction = float(mask.mean())
+    if skin_fraction >= MIN_SKIN_FRACTION:
+        pixels = pixels[mask]
+
+    if method == "median":
+        color = np.median(pixels, axis=0)
+    elif method == "trimmed":
+        color = _trimmed_mean(pixels)
+    else:
+        color = _dominant_cluster(pixels)
+    return tuple(int(c) for c in color), skin_fraction
 
 def detect_face_shape(face_roi):
     """
@@ -105,8 +561,6 @@ def detect_face_shape(face_roi):
         h, w = face_roi.shape[:2]
         aspect_ratio = w / h if h > 0 else 1
         
-        print(f"  👤 Face dimensions: width={w}, height={h}, ratio={aspect_ratio:.2f}")
-        
         # Classify based on aspect ratio
         if aspect_ratio < 0.7:
             face_shape = "Oblong"
@@ -119,59 +573,330 @@ def detect_face_shape(face_roi):
         else:
             face_shape = "Square"
         
-        print(f"  🔷 Detected face shape: {face_shape}")
+        log.debug("face_shape_from_box", width=w, height=h, ratio=round(aspect_ratio, 2), face_shape=face_shape)
         return face_shape
     except Exception as e:
-        print(f"  ⚠️  Could not detect face shape: {str(e)}")
+        log.warning("face_shape_failed", error=str(e))
         return "Oval"  # Default to Oval
 
-def analyze_skin_tone(image_file):
+# Optional 68-point Facemark LBF model (needs opencv-contrib); without it the
+# face outline is traced from the skin mask instead
+FACEMARK_MODEL_PATH = os.getenv("FACEMARK_MODEL_PATH", os.path.join(MODELS_DIR, "lbfmodel.yaml"))
+# Long edge (px) the head region is shrunk to before tracing its outline
+GEOMETRY_MAX_EDGE = 128
+# Detector boxes stop around the eyebrows, so the head region extends them
+# upwards to take in the forehead: (left/right, top, bottom) as box fractions
+GEOMETRY_PADDING = (0.12, 0.35, 0.08)
+
+def head_region(image_array, box, padding=GEOMETRY_PADDING):
+    """
+    Returns (region, (x, y, w, h)) where region is the detected box grown to
+    take in the forehead and jaw, and the box is given in region coordinates.
+    """
+    x, y, w, h = (int(v) for v in box)
+    img_h, img_w = image_array.shape[:2]
+    side, top, bottom = padding
+    x0 = max(0, x - int(w * side))
+    y0 = max(0, y - int(h * top))
+    x1 = min(img_w, x + w + int(w * side))
+    y1 = min(img_h, y + h + int(h * bottom))
+    return image_array[y0:y1, x0:x1], (x - x0, y - y0, w, h)
+
+def _load_facemark(model_path):
+    if not hasattr(cv2, "face"):
+        raise FileNotFoundError("cv2.face is unavailable (install opencv-contrib-python)")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Facemark model not found at {model_path}")
+    facemark = cv2.face.createFacemarkLBF()
+    facemark.loadModel(model_path)
+    return facemark
+
+def _landmark_geometry(region, box, model_path=FACEMARK_MODEL_PATH):
+    """Forehead, cheekbone and jaw widths and face length from 68 LBF landmarks."""
+    facemark = detector_registry.get(model_path, _load_facemark)
+    gray = cv2.cvtColor(region, cv2.COLOR_RGB2GRAY)
+    ok, landmarks = facemark.fit(gray, np.array([box], dtype=np.int32))
+    if not ok or len(landmarks) == 0:
+        return None
+    points = landmarks[0].reshape(-1, 2)
+    width = lambda a, b: float(np.linalg.norm(points[a] - points[b]))
+    brow_y = points[17:27, 1].mean()
+    nose_y, chin_y = points[33, 1], points[8, 1]
+    # Rule of thirds: hairline-to-brow is about as long as brow-to-nose-base
+    length = (chin_y - nose_y) + 2 * (nose_y - brow_y)
+    return {
+        "method": "landmarks",
+        "forehead_width": width(17, 26),
+        "cheekbone_width": width(1, 15),
+        "jaw_width": width(4, 12),
+        "face_length": float(length),
+    }
+
+def _contour_geometry(region, box, max_edge=GEOMETRY_MAX_EDGE):
+    """
+    Traces the face outline from the skin mask of the head region and
+    measures its width at forehead, cheekbone and jaw height. Hair above the
+    forehead isn't skin, so the top of the mask approximates the hairline.
+    """
+    h, w = region.shape[:2]
+    scale = min(1.0, max_edge / max(h, w))
+    if scale < 1.0:
+        region = cv2.resize(region, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+    mask = skin_mask(region).astype(np.uint8)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+    # Keep only the blob under the detector box centre
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if count < 2:
+        return None
+    bx, by, bw, bh = (v * scale for v in box)
+    cx = min(labels.shape[1] - 1, int(bx + bw / 2))
+    cy = min(labels.shape[0] - 1, int(by + bh / 2))
+    label = labels[cy, cx] or 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    face = labels == label
+
+    rows = np.flatnonzero(face.any(axis=1))
+    if len(rows) < 8:
+        return None
+    # Row spans ignore holes left by eyes, brows and mouth
+    cols = np.arange(face.shape[1])
+    first = np.where(face, cols, face.shape[1]).min(axis=1)
+    last = np.where(face, cols, -1).max(axis=1)
+    spans = np.clip(last - first + 1, 0, None).astype(np.float32)
+
+    # The chin sits near the bottom of the detector box; the neck below it is skin too
+    top = rows[0]
+    bottom = min(rows[-1], int(by + bh))
+    length = bottom - top
+    if length < 8:
+        return None
+
+    def width_at(fraction):
+        row = top + int(length * fraction)
+        band = max(1, length // 30)
+        return float(np.median(spans[max(top, row - band):row + band + 1]))
+
+    return {
+        "method": "contour",
+        "forehead_width": width_at(0.2) / scale,
+        "cheekbone_width": width_at(0.45) / scale,
+        "jaw_width": width_at(0.78) / scale,
+        "face_length": float(length) / scale,
+    }
+
+def classify_face_shape(geometry):
+    """
+    Maps facial proportions onto 'Round', 'Oval', 'Square', 'Heart' or
+    'Oblong' using the usual stylist rules: long faces are Oblong, a forehead
+    wider than a narrow jaw is Heart, faces about as wide as long are Round or
+    Square depending on the jaw, and everything else is Oval.
+    """
+    cheek = geometry["cheekbone_width"] or 1.0
+    length_ratio = geometry["face_length"] / cheek
+    forehead_ratio = geometry["forehead_width"] / cheek
+    jaw_ratio = geometry["jaw_width"] / cheek
+
+    if length_ratio >= 1.55:
+        return "Oblong"
+    if forehead_ratio >= 0.98 and jaw_ratio <= 0.8:
+        return "Heart"
+    if length_ratio < 1.3:
+        return "Square" if jaw_ratio >= 0.9 else "Round"
+    if jaw_ratio >= 0.93 and forehead_ratio >= 0.93:
+        return "Square"
+    return "Oval"
+
+def measure_face_shape(image_array, box):
+    """
+    Measures face proportions around an already detected box (no second
+    detection pass) and classifies the face shape. Uses Facemark landmarks
+    when the model is installed, otherwise the skin-mask outline, and falls
+    back to the box aspect ratio if neither works.
+    Returns (face_shape, geometry) where geometry holds the scale-free ratios.
+    """
+    region, local_box = head_region(image_array, box)
+    geometry = None
+    try:
+        geometry = _landmark_geometry(region, local_box)
+    except FileNotFoundError:
+        pass
+    except cv2.error as e:
+        log.warning("landmark_fit_failed", error=str(e))
+    if geometry is None:
+        geometry = _contour_geometry(region, local_box)
+
+    if geometry is None:
+        return detect_face_shape(crop_face_roi(image_array, box)), {"method": "box"}
+
+    face_shape = classify_face_shape(geometry)
+    cheek = geometry["cheekbone_width"] or 1.0
+    ratios = {
+        "method": geometry["method"],
+        "length_to_width": round(geometry["face_length"] / cheek, 3),
+        "forehead_to_cheekbone": round(geometry["forehead_width"] / cheek, 3),
+        "jaw_to_cheekbone": round(geometry["jaw_width"] / cheek, 3),
+    }
+    log.debug("face_shape_measured", face_shape=face_shape, **ratios)
+    return face_shape, ratios
+
+# Photos are decoded no larger than this long edge (px); JPEGs use draft mode
+INGEST_MAX_EDGE = int(os.getenv("INGEST_MAX_EDGE", "1600"))
+# Uploads whose header declares more pixels than this are refused before decoding
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "50000000"))
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload declares more pixels than MAX_IMAGE_PIXELS."""
+
+def draft_jpeg(image, max_edge):
+    """
+    Lets libjpeg decode an opened JPEG at 1/2, 1/4 or 1/8 scale, never with
+    the long edge below max_edge. The box keeps the image's aspect ratio:
+    draft() only reduces while both sides stay at or above it, so a square
+    box leaves 4:3 photos at full size.
+    """
+    width, height = image.size
+    scale = max_edge / max(width, height)
+    image.draft('RGB', (round(width * scale), round(height * scale)))
+    return image
+
+def load_image_array(image_file, max_edge=INGEST_MAX_EDGE, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Decodes an uploaded image into an RGB NumPy array whose long edge is at
+    most max_edge. Only the header is read before the pixel-count check;
+    JPEGs are decoded at a reduced DCT scale, and EXIF orientation is applied.
+    """
+    image = Image.open(image_file)
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height} ({width * height / 1e6:.0f} MP); the limit is {max_pixels / 1e6:.0f} MP"
+        )
+
+    source_format = image.format
+    if max_edge and source_format == 'JPEG':
+        draft_jpeg(image, max_edge)
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if max_edge and max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.BILINEAR)
+
+    log.debug("image_decoded", format=source_format, source=f"{width}x{height}",
+              decoded=f"{image.size[0]}x{image.size[1]}")
+    return np.asarray(image)
+
+def analyze_skin_tone(image_file, max_edge=DETECTION_MAX_EDGE):
 
     """
     Analyzes the uploaded image file to detect skin tone.
-    Returns a dictionary with results.
+    Returns a dictionary with results, including per-stage timings in ms.
     """
+    timings = {}
     try:
-        print("🔄 Starting image analysis...")
-        # Convert PIL Image to NumPy array
-        image = Image.open(image_file).convert('RGB')
-        print(f"  ✅ Image opened: format={image.format}, size={image.size}")
-        
-        image_array = np.array(image)
+        # Decode straight to a right-sized RGB NumPy array
+        with stage_timer(timings, "decode"):
+            image_array = load_image_array(image_file)
         
-        face_roi = detect_face(image_array)
+        box = locate_face(image_array, max_edge, timings)
         
-        if face_roi is None:
-            print("  ❌ No face detected!")
+        if box is None:
+            log.info("no_face_detected", stage_ms=timings)
             return {
                 "success": False,
-                "message": "No face detected in the image. Please upload a clear photo."
+                "message": "No face detected in the image. Please upload a clear photo.",
+                "timings": timings
             }
         
-        # Calculate average color of the face ROI
-        print("  📊 Calculating average skin color...")
-        avg_color_per_row = np.average(face_roi, axis=0)
-        avg_color = np.average(avg_color_per_row, axis=0)
-        avg_rgb = tuple(avg_color.astype(int))
-        
-        skin_tone = classify_skin_tone(avg_rgb)
-        face_shape = detect_face_shape(face_roi)
+        face_roi = crop_face_roi(image_array, box)
+
+        # Estimate skin color from the skin pixels of the face ROI
+        with stage_timer(timings, "skin_color"):
+            avg_rgb, skin_fraction = estimate_skin_color(face_roi)
+        with stage_timer(timings, "classify"):
+            skin_tone, tone_confidence, _ = classify_skin_tone_detailed(avg_rgb)
+
+        with stage_timer(timings, "face_shape"):
+            face_shape, face_geometry = measure_face_shape(image_array, box)
         
-        print(f"✅ Analysis complete! Skin tone: {skin_tone}, Face shape: {face_shape}\n")
+        log.info("analysis_complete", skin_tone=skin_tone, face_shape=face_shape, stage_ms=timings)
         
         return {
             "success": True,
             "skin_tone": skin_tone,
             "face_shape": face_shape,
             "average_color": avg_rgb,
-            "message": f"Detected skin tone: {skin_tone}, Face shape: {face_shape}"
+            "tone_confidence": round(tone_confidence, 3),
+            "skin_pixel_fraction": round(skin_fraction, 3),
+            "face_geometry": face_geometry,
+            "message": f"Detected skin tone: {skin_tone}, Face shape: {face_shape}",
+            "timings": timings
         }
         
+    except (ImageTooLargeError, Image.DecompressionBombError) as e:
+        log.warning("image_rejected", error=str(e))
+        return {
+            "success": False,
+            "message": f"Image is too large to process. {str(e)}",
+            "timings": timings
+        }
     except Exception as e:
-        print(f"❌ Error in analyze_skin_tone: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error("analysis_failed", exc_info=True, error=str(e))
         return {
             "success": False,
-            "message": f"Error processing image: {str(e)}"
+            "message": f"Error processing image: {str(e)}",
+            "timings": timings
         }
+
+def analyze_image_bytes(image_bytes):
+    """Runs analyze_skin_tone on raw upload bytes. Picklable, for process pools."""
+    return analyze_skin_tone(io.BytesIO(image_bytes))
+
+def _analyze_batch_item(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return analyze_image_bytes(bytes(source))
+    return analyze_skin_tone(source)
+
+def analyze_batch(sources, workers=None, pool=None):
+    """
+    Analyzes many images in parallel across CPU cores.
+    sources: list of raw image bytes or file paths.
+    Returns one analyze_skin_tone result per source, in input order.
+    workers=0 runs everything in the calling process. With pool, an
+    executor the caller keeps (servers share one across requests), the work
+    always goes there; otherwise a process pool is started for this call alone.
+    """
+    sources = list(sources)
+    if workers is None:
+        workers = min(len(sources), os.cpu_count() or 1)
+    if pool is None and (workers <= 1 or len(sources) <= 1):
+        return [_analyze_batch_item(source) for source in sources]
+
+    log.info("batch_analysis", images=len(sources), workers=workers, shared_pool=pool is not None)
+    # Larger chunks cut per-task pickling overhead on big batches
+    chunksize = max(1, len(sources) // (max(workers, 1) * 4))
+    if pool is not None:
+        return list(pool.map(_analyze_batch_item, sources, chunksize=chunksize))
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_up_detectors) as pool:
+        return list(pool.map(_analyze_batch_item, sources, chunksize=chunksize))
+
+def group_by_profile(results, genders):
+    """
+    Groups successful batch results by (skin_tone, gender, face_shape) so each
+    unique profile needs only one recommendation lookup.
+    genders: a single gender for the whole batch, or one per result.
+    Returns {profile: [result indices]} in first-seen order.
+    """
+    if isinstance(genders, str):
+        genders = [genders] * len(results)
+
+    profiles = {}
+    for index, (result, gender) in enumerate(zip(results, genders)):
+        if not result.get("success"):
+            continue
+        profile = (result["skin_tone"], gender, result.get("face_shape", "Oval"))
+        profiles.setdefault(profile, []).append(index)
+    return profiles
@@ -0,0 +1,71 @@
+"""
+Production WSGI entry point, for gunicorn with the bundled settings:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app on, create_app() runs once in the master before the
+workers fork. Everything that is safe to share is loaded then, so workers
+share those pages copy-on-write instead of each loading its own copy: the
+face detector model, the skin tone palette, the product catalogue and its
+text index, the prompt templates and the precomputed guides. Each worker
+then runs init_worker() to rebuild what must not cross a fork: OpenCV
+detector handles, the Groq HTTP connection pool and the log writer thread.
+
+Load times and memory are logged for the master (app_preloaded) and for
+each worker (worker_ready); /api/cache/stats shows a worker's current memory.
+"""
+import gc
+import importlib
+import os
+import time
+
+from instrumentation import configure_logging, get_logger, process_memory
+
+log = get_logger(__name__)
+
+def _timed(steps, name, fn):
+    start = time.perf_counter()
+    result = fn()
+    steps[name] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def create_app():
+    """Imports and preloads the Flask app; returns the WSGI application."""
+    start = time.perf_counter()
+    steps = {}
+    flask_app = _timed(steps, "import_app", lambda: importlib.import_module("app"))
+    # Importing app defers the heavy parts; load them here, before the fork,
+    # rather than in a background thread that would not survive it
+    steps.update(flask_app.warm_up())
+
+    import prompts
+    _timed(steps, "prompts", lambda: [prompts.get_template(mode) for mode in prompts.PROMPT_MODES])
+
+    # Objects that survive startup are never freed, so keep the collector
+    # off them: a GC pass in a worker would otherwise write to every shared
+    # page and copy it
+    _timed(steps, "gc_freeze", lambda: (gc.collect(), gc.freeze()))
+
+    log.info("app_preloaded", ms=round((time.perf_counter() - start) * 1000, 1), steps=steps,
+             products=flask_app.product_catalogue.catalogue.size, guides=len(flask_app.groq_service.store),
+             frozen_objects=gc.get_freeze_count(), **process_memory())
+    return flask_app.app
+
+def init_worker():
+    """Per-worker setup after fork; gunicorn.conf.py calls it from post_fork."""
+    start = time.perf_counter()
+    # The master's log writer thread didn't survive the fork; start this worker's own
+    configure_logging()
+
+    import app as flask_app
+    import groq_transport
+    import utils
+    utils.detector_registry.reset()
+    utils.warm_up_detectors()
+    groq_transport.reset_http_client()
+    flask_app.groq_service.reconnect()
+
+    log.info("worker_ready", pid=os.getpid(), ms=round((time.perf_counter() - start) * 1000, 1),
+             **process_memory())
+
+app = create_app()